@@ -0,0 +1,127 @@
+"""
+Admission control for the scoring endpoints.
+
+Each request is charged its token count, which is roughly what it costs the
+model, so a few 512-token inputs can't take every slot from short statements.
+Requests are admitted while the tokens in flight are within ``capacity``.
+Beyond that they wait in their lane, interactive ahead of bulk and in arrival
+order within a lane. A request is turned away straight away with 429 when its
+lane already has ``max_queue`` waiting, and with 503 once it has waited
+``max_wait`` seconds, rather than queueing until the caller times out.
+"""
+import asyncio
+import collections
+import math
+import time
+from contextlib import asynccontextmanager
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# In priority order
+LANES = (INTERACTIVE, BULK)
+
+
+class Overloaded(Exception):
+    """A request turned away, with the HTTP ``status`` and the seconds to suggest in Retry-After."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, capacity, max_queue, max_wait):
+        # capacity <= 0 admits everything
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiting = {lane: collections.deque() for lane in LANES}
+        # Smoothed seconds an admitted request holds its tokens, for Retry-After
+        self._hold_seconds = None
+
+    def queued(self, lane):
+        return len(self._waiting[lane])
+
+    def retry_after(self):
+        """Whole seconds until the work admitted and waiting now should have drained."""
+        backlog = self.in_flight + sum(cost for queue in self._waiting.values() for cost, _ in queue)
+        return max(1, math.ceil(backlog / self.capacity * (self._hold_seconds or 0)))
+
+    def check(self, lane):
+        """Raise ``Overloaded`` if a request in ``lane`` would be turned away for a full queue."""
+        if self.capacity > 0 and len(self._waiting[lane]) >= self.max_queue:
+            raise Overloaded(429, f"Too many {lane} requests waiting", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self, cost, lane=INTERACTIVE, shed=True):
+        """
+        Hold ``cost`` tokens of capacity for the body of the ``async with``.
+
+        With ``shed=False`` the request waits however long it takes and
+        regardless of the queue length, for work belonging to a request that
+        was already accepted.
+        """
+        if self.capacity <= 0:
+            yield
+            return
+        # A request bigger than the whole capacity runs on its own
+        cost = max(1, min(cost, self.capacity))
+        await self._acquire(cost, lane, shed)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - started
+            self._hold_seconds = held if self._hold_seconds is None else 0.9 * self._hold_seconds + 0.1 * held
+            self._release(cost)
+
+    def _ahead(self, lane):
+        """Whether anything is waiting in ``lane`` or a lane with priority over it."""
+        return any(self._waiting[other] for other in LANES[:LANES.index(lane) + 1])
+
+    async def _acquire(self, cost, lane, shed):
+        if not self._ahead(lane) and self.in_flight + cost <= self.capacity:
+            self.in_flight += cost
+            return
+        if shed:
+            self.check(lane)
+        waiter = (cost, asyncio.get_running_loop().create_future())
+        self._waiting[lane].append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], self.max_wait if shed else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter[1].done() and not waiter[1].cancelled():
+                # Admitted just as it gave up
+                self._release(cost)
+            else:
+                # _dispatch may already have dropped it as cancelled
+                if waiter in self._waiting[lane]:
+                    self._waiting[lane].remove(waiter)
+                # It may have been holding up the requests behind it
+                self._dispatch()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise Overloaded(503, f"Waited over {self.max_wait:g}s to be scored", self.retry_after())
+
+    def _release(self, cost):
+        self.in_flight -= cost
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiting requests in priority order for as long as the next one fits."""
+        for lane in LANES:
+            queue = self._waiting[lane]
+            while queue:
+                cost, future = queue[0]
+                if future.done():
+                    queue.popleft()
+                    continue
+                if self.in_flight + cost > self.capacity:
+                    # Nothing behind it, in this lane or a lower one, jumps ahead
+                    return
+                queue.popleft()
+                self.in_flight += cost
+                future.set_result(None)
@@ -0,0 +1,112 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent requests are queued and gathered into a single padded batch, so the
+model runs one forward pass for many callers instead of one pass per request.
+A batch is dispatched as soon as it is full or the oldest request has waited
+``max_wait_ms``, whichever comes first.
+"""
+import asyncio
+from contextlib import suppress
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=5, executor=None):
+        # predict_batch takes a list of inputs and returns one result per input
+        self.predict_batch = predict_batch
+        # Returns the executor each batch runs on, None for the loop's default
+        self.executor = executor or (lambda: None)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, drain=False):
+        """Stop dispatching; with ``drain=True`` requests already queued are answered first."""
+        if drain and self._worker is not None:
+            await self._queue.join()
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+
+    async def submit(self, item):
+        """Queue ``item`` and wait for its result from the next batch."""
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already waiting before sleeping on the queue
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (client disconnect, timeout) don't need a result
+        live = [(item, future) for item, future in batch if not future.done()]
+        for _ in range(len(batch) - len(live)):
+            self._queue.task_done()
+        return live
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                # The forward pass runs in a thread so the event loop keeps
+                # accepting (and queueing) requests meanwhile
+                results = await loop.run_in_executor(self.executor(), self.predict_batch, items)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            for _ in batch:
+                self._queue.task_done()
+
+
+def length_buckets(lengths, bucket_size, max_tokens=None):
+    """
+    Group indices of ``lengths`` into buckets of similar length.
+
+    Sorting by length before batching means each bucket is padded only to its
+    own longest member instead of the longest input overall. With
+    ``max_tokens`` a bucket is also closed before its lengths add up to more
+    than that, though it always takes at least one input.
+    """
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index])
+    buckets, bucket, tokens = [], [], 0
+    for index in order:
+        if bucket and (len(bucket) == bucket_size or (max_tokens and tokens + lengths[index] > max_tokens)):
+            buckets.append(bucket)
+            bucket, tokens = [], 0
+        bucket.append(index)
+        tokens += lengths[index]
+    return buckets + [bucket] if bucket else buckets
@@ -0,0 +1,104 @@
+"""
+Cascade scoring against the full model alone, on held-out statements:
+average latency per statement and agreement with the full model.
+
+    python -m benchmarks.cascade --teacher model_output --student model_output/student --bands 0.05 0.1 0.2
+
+Statements are the sections of the papers ``training.py`` holds out, scored
+one at a time as requests would be. Agreement is the fraction that end up on
+the same side of the threshold as with the full model. Without ``--student``
+an undistilled student with half the teacher's layers is cut from it, which
+only shows the latency side; without ``--data`` the papers are synthetic.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import default_model_dir, save_results
+from benchmarks.training import write_corpus
+
+
+def timed_scores(score, texts):
+    """Each text scored on its own: the scores and the mean seconds per text."""
+    results, timings = [], []
+    for text in texts:
+        started = time.perf_counter()
+        results.append(score([text])[0])
+        timings.append(time.perf_counter() - started)
+    return results, statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--teacher", help="full model (default: tiny random BERT)")
+    parser.add_argument("--student", help="distilled student (default: a cut-down teacher)")
+    parser.add_argument("--data", help="papers to take held-out statements from (default: synthetic)")
+    parser.add_argument("--limit", type=int, default=200, help="statements to score")
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--bands", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.15, 0.2])
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    import settings
+    from cascade import FULL, Cascade
+    from engine import InferenceEngine, configure_threads
+    from ingest import labelled_records
+    from training import make_student
+
+    configure_threads()
+    teacher = InferenceEngine(default_model_dir(args.teacher))
+    threshold = args.threshold if args.threshold is not None else settings.CASCADE_THRESHOLD
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        data = args.data
+        if data is None:
+            data = workdir / "papers.jsonl"
+            write_corpus(data, 200)
+        texts = [record["text"] for record, _ in zip(labelled_records(data, "eval"), range(args.limit))]
+        if not texts:
+            raise SystemExit(f"No held-out statements in {data}")
+        student_dir = args.student
+        if student_dir is None:
+            student_dir = workdir / "student"
+            layers = max(1, teacher.model.config.num_hidden_layers // 2)
+            make_student(teacher.model_dir, layers).save_pretrained(student_dir, safe_serialization=True)
+            teacher.tokenizer.save_pretrained(student_dir)
+        student = InferenceEngine(student_dir)
+        full_scores, full_seconds = timed_scores(teacher.predict, texts)
+        runs = []
+        for band in args.bands:
+            cascade = Cascade(student, teacher, threshold, band)
+            results, seconds = timed_scores(cascade.score, texts)
+            agree = [
+                (confidence >= threshold) == (full >= threshold)
+                for (confidence, _), full in zip(results, full_scores)
+            ]
+            runs.append({
+                "band": band,
+                "seconds_per_statement": seconds,
+                "speedup": full_seconds / seconds,
+                "escalated": sum(stage == FULL for _, stage in results) / len(results),
+                "agreement": sum(agree) / len(agree),
+                "mean_abs_diff": statistics.mean(
+                    abs(confidence - full) for (confidence, _), full in zip(results, full_scores)
+                ),
+            })
+    save_results(
+        "cascade",
+        {
+            "teacher": str(teacher.model_dir),
+            "student": str(student.model_dir) if args.student else "undistilled",
+            "statements": len(texts),
+            "threshold": threshold,
+            "full_seconds_per_statement": full_seconds,
+            "runs": runs,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
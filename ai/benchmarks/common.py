@@ -0,0 +1,226 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a tiny randomly initialised BERT by default so they work
+offline on a laptop CPU. Pass ``--model-dir`` to a script to measure a real
+checkpoint instead.
+"""
+import json
+import os
+import platform
+import socket
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+import checkpoints
+
+AI_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = AI_DIR / "benchmarks" / "results"
+
+SHORT_TEXT = (
+    "With chronic illness at its highest ever level, many people are turning to "
+    "treatments such as reiki, healing touch, yoga and massage."
+)
+LONG_TEXT = " ".join([SHORT_TEXT] * 40)
+
+
+def numbered(text, number):
+    """``text`` made distinct by a leading number, which truncation keeps, so no cache answers it."""
+    return f"Request {number}: {text}"
+
+
+def make_tiny_checkpoint(path, hidden_size=32, num_layers=2, seed=0):
+    """Save a small random BERT regression model and a matching tokenizer to ``path``."""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    path = Path(path)
+    if (path / "config.json").exists():
+        return path
+    path.mkdir(parents=True, exist_ok=True)
+
+    # A character level vocabulary is enough to tokenize any English text
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += list(string.ascii_lowercase + string.digits + string.punctuation)
+    vocab += ["##" + c for c in string.ascii_lowercase + string.digits]
+    (path / "vocab.txt").write_text("\n".join(vocab))
+    tokenizer = BertTokenizerFast(str(path / "vocab.txt"), do_lower_case=True)
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 2,
+        max_position_embeddings=512,
+        num_labels=1,
+    )
+    BertForSequenceClassification(config).save_pretrained(path, safe_serialization=True)
+    return path
+
+
+def default_model_dir(model_dir=None):
+    """
+    The checkpoint in ``model_dir`` if given (the current version of a
+    versioned one), otherwise a cached tiny checkpoint in the temp dir.
+    """
+    if model_dir:
+        return checkpoints.resolve(model_dir)
+    return make_tiny_checkpoint(os.path.join(tempfile.gettempdir(), "basicapp-tiny-bert"))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post_json(url, payload, timeout=60):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+class ServerUrl(str):
+    process = None
+
+
+@contextmanager
+def serve(model_dir, env=None, args=(), timeout=300, command=("-m", "uvicorn", "aimodel:app")):
+    """
+    Run ``uvicorn aimodel:app`` (or ``python <command>``) in a subprocess and
+    yield its base url once it answers. The server process is ``url.process``.
+    """
+    port = free_port()
+    url = ServerUrl(f"http://127.0.0.1:{port}")
+    server = subprocess.Popen(
+        [sys.executable, *command, "--port", str(port), *args],
+        cwd=AI_DIR,
+        env=dict(os.environ, MODEL_DIR=str(model_dir), **(env or {})),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving a request")
+            try:
+                post_json(f"{url}/predict_confidence", {"text": SHORT_TEXT})
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.perf_counter() - started > timeout:
+                    raise TimeoutError(f"No response within {timeout}s")
+                time.sleep(0.05)
+        url.process = server
+        yield url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = [value * 1000 for value in latencies]
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def rss_mb(pid=None):
+    """Resident set size of a process in MiB (Linux only, ``None`` elsewhere)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def memory_mb(pid):
+    """
+    RSS, PSS and USS of a process in MiB (Linux only, ``None`` elsewhere).
+
+    PSS divides each shared page between the processes mapping it, so summing
+    it over workers gives their real combined footprint; USS is the memory
+    only this process uses.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss_mb": fields.get("Rss"),
+        "pss_mb": fields.get("Pss"),
+        "uss_mb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def child_pids(pid):
+    """Direct children of a process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=AI_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name, results, output=None):
+    """Write ``results`` to ``benchmarks/results/<name>-<revision>.json`` and print them."""
+    payload = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{name}-{payload['revision'] or 'local'}.json"
+    Path(output).write_text(json.dumps(payload, indent=2))
+    print(json.dumps(payload, indent=2))
+    print(f"Saved results to {output}")
+    return payload
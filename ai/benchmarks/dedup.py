@@ -0,0 +1,82 @@
+"""
+Near-duplicate lookups (dedup.py) as the index fills up: latency, memory, and
+how often each kind of variant of a stored statement reuses its score.
+
+    python -m benchmarks.dedup --entries 100000 1000000 --lookups 2000
+
+Statements are random sentences of 8 to 40 words. Variants that should reuse
+the stored score: different case, punctuation and spacing, and a short
+sentence added at the end (only reused when the statement is long enough to
+stay above the threshold with it). Ones that should not: a negation or a
+changed number, and unrelated statements. No model is needed.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import LONG_TEXT, save_results, summarize
+
+WORDS = sorted(set(LONG_TEXT.lower().replace(",", "").replace(".", "").split()))
+TRAILING = ["The effect lasted a year.", "See the full paper.", "This was widely reported.", "Results were similar in men."]
+FILLER = ["patients", "trial", "treatment", "effect", "placebo", "outcome", "risk", "group", "dose", "study"]
+
+
+def make_statement(rng):
+    words = [rng.choice(WORDS + FILLER) for _ in range(rng.randint(8, 40))]
+    words.insert(rng.randrange(len(words)), str(rng.randint(2, 999)))
+    return " ".join(words).capitalize() + "."
+
+
+def variants(statement, rng):
+    words = statement.rstrip(".").split()
+    number = next(word for word in words if word.isdigit())
+    position = rng.randrange(1, len(words))
+    return {
+        "case_punctuation": "  " + statement.upper().replace(" ", ",  ", 1).rstrip(".") + "!",
+        "trailing_sentence": statement + " " + rng.choice(TRAILING),
+        "negated": " ".join(words[:position] + ["not"] + words[position:]) + ".",
+        "changed_number": statement.replace(number, str(int(number) + 1), 1),
+        "unrelated": make_statement(rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=2000, help="stored statements to look up variants of")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    from dedup import NearDuplicateIndex
+
+    runs = []
+    for entries in args.entries:
+        rng = random.Random(0)
+        index = NearDuplicateIndex(entries, args.threshold)
+        statements = [make_statement(rng) for _ in range(entries)]
+        started = time.perf_counter()
+        for number, statement in enumerate(statements):
+            index.add(statement, number / entries)
+        insert_seconds = (time.perf_counter() - started) / entries
+
+        reused, latencies = {}, []
+        for statement in rng.sample(statements, min(args.lookups, entries)):
+            for kind, text in variants(statement, rng).items():
+                started = time.perf_counter()
+                match = index.find(text)
+                latencies.append(time.perf_counter() - started)
+                reused[kind] = reused.get(kind, 0) + (match is not None)
+        lookups = min(args.lookups, entries)
+        runs.append({
+            "entries": entries,
+            "megabytes": index.nbytes / 2**20,
+            "insert_us": insert_seconds * 1e6,
+            "lookup": summarize(latencies),
+            "reused": {kind: count / lookups for kind, count in reused.items()},
+        })
+    save_results("dedup", {"threshold": args.threshold, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Long-document scoring: all sliding windows in batched passes versus one
+forward pass per window.
+
+    python -m benchmarks.document --pages 20
+"""
+import argparse
+import time
+
+from benchmarks.common import LONG_TEXT, default_model_dir, save_results
+
+# Roughly 500 words to a page
+WORDS_PER_PAGE = 500
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to load (default: tiny random BERT)")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    from engine import InferenceEngine, configure_threads
+
+    configure_threads()
+    engine = InferenceEngine(default_model_dir(args.model_dir))
+    words = LONG_TEXT.split()
+    document = " ".join(words[i % len(words)] for i in range(args.pages * WORDS_PER_PAGE))
+    windows = len(engine.predict_long(document))
+    runs = [
+        {
+            "batch_size": batch_size,
+            "seconds": timed(lambda: engine.predict_long(document, batch_size=batch_size), args.repeats),
+        }
+        for batch_size in args.batch_size
+    ]
+    save_results("document", {"pages": args.pages, "windows": windows, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Latency and memory of the inference path, before and after ``InferenceEngine``.
+
+"baseline" reproduces the original code path (model left in train mode,
+autograd on, default torch threads); "engine" uses ``InferenceEngine`` with the
+configured thread counts and each requested model variant (see ``export.py``).
+Each run is in a fresh process so RSS is comparable. Every batch is made of
+texts not seen before, so the engine's token id cache never saves it work.
+
+    python -m benchmarks.engine --batch-size 1 8 --threads 1 2
+    python -m benchmarks.engine --model-dir ./model_output --variants fp32 int8 onnx
+"""
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.common import (
+    LONG_TEXT,
+    SHORT_TEXT,
+    default_model_dir,
+    numbered,
+    rss_mb,
+    save_results,
+    summarize,
+)
+
+
+def measure(mode, model_dir, batch_size, text, iterations, threads, variant="fp32"):
+    import torch
+    from engine import InferenceEngine, configure_threads
+
+    if mode == "baseline":
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+
+        def predict(texts):
+            inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=512)
+            return torch.sigmoid(model(**inputs).logits).squeeze(-1).tolist()
+    else:
+        configure_threads(threads, 1)
+        predict = InferenceEngine(model_dir, variant=variant).predict
+
+    rss_loaded = rss_mb()
+    batches = [
+        [numbered(text, iteration * batch_size + row) for row in range(batch_size)]
+        for iteration in range(iterations + 1)
+    ]
+    predict(batches[0])  # warm up
+    latencies = []
+    for texts in batches[1:]:
+        started = time.perf_counter()
+        predict(texts)
+        latencies.append(time.perf_counter() - started)
+    return {
+        "mode": mode,
+        "variant": variant,
+        "batch_size": batch_size,
+        "threads": torch.get_num_threads(),
+        "rss_loaded_mb": rss_loaded,
+        "rss_peak_mb": rss_mb(),
+        **summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to load (default: tiny random BERT)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--threads", type=int, nargs="+", default=[None])
+    parser.add_argument("--variants", nargs="+", default=["fp32"], help="fp32, int8 and/or onnx")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--long", action="store_true", help="use ~512 token inputs")
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    model_dir = str(default_model_dir(args.model_dir))
+    text = LONG_TEXT if args.long else SHORT_TEXT
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for batch_size in args.batch_size:
+        cases = [("baseline", None, "fp32")] + [
+            ("engine", threads, variant) for threads in args.threads for variant in args.variants
+        ]
+        for mode, threads, variant in cases:
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(
+                    measure, (mode, model_dir, batch_size, text, args.iterations, threads, variant)
+                ))
+    save_results("engine", {"model_dir": model_dir, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Load generator for ``/predict_confidence``: throughput and p50/p99 latency with
+micro-batching on and off, at several concurrency levels.
+
+Every request sends a statement the service hasn't seen, and its score cache
+and near-duplicate index are turned off, so each one reaches the batcher.
+
+    python -m benchmarks.load --concurrency 1 8 32 --requests 400
+    python -m benchmarks.load --batch-sizes 1 16 32 --max-wait-ms 5
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (
+    SHORT_TEXT,
+    default_model_dir,
+    numbered,
+    post_json,
+    save_results,
+    serve,
+    summarize,
+)
+
+# Keeps texts distinct across runs against the same server too
+_request_numbers = itertools.count()
+
+# Service settings that keep scores from being answered without the model
+UNCACHED = {"CACHE_SIZE": "0", "DEDUP_MAX_ENTRIES": "0"}
+
+
+def run_load(url, concurrency, requests, text=SHORT_TEXT):
+    """Fire ``requests`` POSTs of distinct texts from ``concurrency`` threads; return throughput and latencies."""
+
+    def one_request(_):
+        payload = {"text": numbered(text, next(_request_numbers))}
+        started = time.perf_counter()
+        post_json(f"{url}/predict_confidence", payload)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": requests / elapsed,
+        **summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to serve (default: tiny random BERT)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    model_dir = default_model_dir(args.model_dir)
+    results = []
+    for batch_size in args.batch_sizes:
+        env = {
+            **UNCACHED,
+            "BATCH_MAX_SIZE": str(batch_size),
+            "BATCH_MAX_WAIT_MS": str(args.max_wait_ms),
+        }
+        with serve(model_dir, env) as url:
+            for concurrency in args.concurrency:
+                result = run_load(url, concurrency, args.requests)
+                result["batch_max_size"] = batch_size
+                results.append(result)
+    save_results("load", {"model_dir": str(model_dir), "runs": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
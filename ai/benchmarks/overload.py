@@ -0,0 +1,95 @@
+"""
+A burst of interactive ``/predict_confidence`` requests while bulk batches of
+512-token statements are being scored, with admission control on and off.
+
+    python -m benchmarks.overload --concurrency 64 --requests 1000 --bulk 4
+
+Reports the latency of the interactive requests that were answered, how many
+were turned away (429/503, which come back at once instead of timing out) and
+how long the bulk batches took.
+"""
+import argparse
+import collections
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import LONG_TEXT, SHORT_TEXT, default_model_dir, post_json, save_results, serve, summarize
+
+
+def run_burst(url, concurrency, requests, bulk, bulk_size, timeout):
+    statuses = collections.Counter()
+    latencies, bulk_seconds = [], []
+
+    def one_request(index):
+        started = time.perf_counter()
+        try:
+            post_json(f"{url}/predict_confidence", {"text": f"{index} {SHORT_TEXT}"}, timeout=timeout)
+            statuses[200] += 1
+            latencies.append(time.perf_counter() - started)
+        except urllib.error.HTTPError as exc:
+            statuses[exc.code] += 1
+        except OSError:
+            statuses["timeout"] += 1
+
+    def one_batch(index):
+        started = time.perf_counter()
+        texts = [f"{index} {number} {LONG_TEXT}" for number in range(bulk_size)]
+        request = urllib.request.Request(
+            f"{url}/predict_confidence/batch",
+            data=json.dumps({"texts": texts}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        # One NDJSON line per statement
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+        bulk_seconds.append(time.perf_counter() - started)
+
+    batches = [threading.Thread(target=one_batch, args=(index,)) for index in range(bulk)]
+    for thread in batches:
+        thread.start()
+    # Let the bulk work get going first
+    time.sleep(0.2)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+    for thread in batches:
+        thread.join()
+    return {
+        "concurrency": concurrency,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "answered_per_s": statuses[200] / elapsed,
+        **(summarize(latencies) if latencies else {}),
+        "bulk_seconds": max(bulk_seconds) if bulk_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to serve (default: tiny random BERT)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[64])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--bulk", type=int, default=4, help="concurrent bulk batches")
+    parser.add_argument("--bulk-size", type=int, default=64, help="statements per bulk batch")
+    parser.add_argument("--max-tokens", type=int, default=4096, help="ADMISSION_MAX_TOKENS when on")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout, like nginx's")
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    model_dir = default_model_dir(args.model_dir)
+    results = []
+    for max_tokens in (0, args.max_tokens):
+        with serve(model_dir, {"ADMISSION_MAX_TOKENS": str(max_tokens)}) as url:
+            for concurrency in args.concurrency:
+                result = run_burst(url, concurrency, args.requests, args.bulk, args.bulk_size, args.timeout)
+                result["admission_max_tokens"] = max_tokens
+                results.append(result)
+    save_results("overload", {"model_dir": str(model_dir), "runs": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
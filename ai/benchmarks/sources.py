@@ -0,0 +1,118 @@
+"""
+Lookup latency of the source passage index at corpus sizes well beyond ours.
+
+    python -m benchmarks.sources --passages 10000 100000 --dim 768 --nprobe 8 16 32
+
+Writes a synthetic index in the format ``sources.py`` builds and opens it the
+way the service does (memory-mapped). Lookups are timed for single statements
+and batches, exhaustively and after clustering the index at each ``--nprobe``,
+with the clustered search's recall of the exhaustive top-k.
+
+The synthetic embeddings are unit vectors scattered around random topic
+centres, a rough stand-in for the clustered way real passage embeddings fall.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import save_results, summarize
+from sources import EMBEDDINGS, META, OFFSETS, PASSAGES, SourceIndex, build_lists
+
+
+def unit_vectors(rng, centres, count, spread):
+    vectors = centres[rng.integers(len(centres), size=count)]
+    vectors = vectors + spread * rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def write_synthetic_index(path, passages, dim, topics=1000, spread=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    path = Path(path)
+    with open(path / EMBEDDINGS, "wb") as embeddings:
+        # Written in chunks so building a large index doesn't need it all in memory
+        for start in range(0, passages, 10000):
+            unit_vectors(rng, centres, min(10000, passages - start), spread).tofile(embeddings)
+    offsets = []
+    with open(path / PASSAGES, "wb") as lines:
+        for index in range(passages):
+            offsets.append(lines.tell())
+            passage = {"paper_id": f"paper-{index // 50}", "section": "Results", "text": f"Passage {index}"}
+            lines.write(json.dumps(passage).encode() + b"\n")
+        offsets.append(lines.tell())
+    np.save(path / OFFSETS, np.asarray(offsets, dtype=np.int64))
+    (path / META).write_text(json.dumps({"count": passages, "dim": dim, "weights": "synthetic"}))
+    return unit_vectors(rng, centres, 256, spread)
+
+
+def time_lookups(index, queries, batch_size, k, nprobe=None):
+    latencies = []
+    results = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        started = time.perf_counter()
+        if nprobe is None:
+            indices, _ = index.search(batch, k)
+        else:
+            indices, _ = index.search(batch, k, nprobe)
+        [index.passage(passage) for row in indices for passage in row]
+        latencies.append(time.perf_counter() - started)
+        results += [set(row.tolist()) for row in indices]
+    return summarize(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--passages", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=768, help="embedding size (768 for BERT base)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    runs = []
+
+    def record(result, **fields):
+        result.update(fields)
+        runs.append(result)
+        recall = f", recall {result['recall']:.3f}" if "recall" in result else ""
+        print(
+            f"{fields['passages']:>8} passages, {fields['search']:>10}, batch {fields['batch_size']:>3}: "
+            f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms{recall}"
+        )
+
+    for passages in args.passages:
+        with tempfile.TemporaryDirectory() as tmp:
+            queries = write_synthetic_index(tmp, passages, args.dim)
+            index = SourceIndex(tmp)
+            exact = {}
+            for batch_size in args.batch_sizes:
+                result, exact[batch_size] = time_lookups(index, queries, batch_size, args.k)
+                record(result, passages=passages, search="exhaustive", batch_size=batch_size)
+            index.close()
+
+            started = time.perf_counter()
+            meta = build_lists(tmp)
+            build_s = time.perf_counter() - started
+            index = SourceIndex(tmp)
+            for nprobe in args.nprobe:
+                for batch_size in args.batch_sizes:
+                    result, found = time_lookups(index, queries, batch_size, args.k, nprobe)
+                    hits = sum(len(a & b) for a, b in zip(found, exact[batch_size]))
+                    result["recall"] = hits / sum(len(b) for b in exact[batch_size])
+                    record(
+                        result, passages=passages, search=f"nprobe={nprobe}", batch_size=batch_size,
+                        lists=meta["lists"], cluster_build_s=build_s,
+                    )
+            index.close()
+    save_results("sources", {"dim": args.dim, "k": args.k, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Cold start benchmark: time from launching ``uvicorn aimodel:app`` to the first
+successful ``/predict_confidence`` response.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --model-dir ./model_output
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import default_model_dir, save_results, serve
+
+
+def first_response_time(model_dir, timeout):
+    started = time.perf_counter()
+    with serve(model_dir, timeout=timeout):
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to serve (default: tiny random BERT)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    model_dir = default_model_dir(args.model_dir)
+    timings = [first_response_time(model_dir, args.timeout) for _ in range(args.runs)]
+    save_results(
+        "startup",
+        {
+            "model_dir": str(model_dir),
+            "runs_s": timings,
+            "median_s": statistics.median(timings),
+            "max_s": max(timings),
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
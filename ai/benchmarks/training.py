@@ -0,0 +1,102 @@
+"""
+Training time per epoch on CPU for the options of ``training.py``.
+
+    python -m benchmarks.training --papers 200 --epochs 2
+    python -m benchmarks.training --base-model bert-base-uncased --configs original grouped frozen
+
+Trains on a synthetic corpus of papers with sections of very different
+lengths, which is where padding to the batch and grouping by length matter.
+"original" is the previous fixed setup (batch size 2, batches in random
+order); "student" distils the base model into one with half its layers.
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import LONG_TEXT, default_model_dir, save_results
+
+CONFIGS = {
+    "original": {"batch_size": 2, "group_by_length": False},
+    "batch8": {"batch_size": 8, "group_by_length": False},
+    "grouped": {"batch_size": 8},
+    "accumulated": {"batch_size": 2, "grad_accum": 4},
+    "frozen": {"batch_size": 8, "freeze": "half"},
+    "student": {"batch_size": 8, "distill": True},
+}
+
+
+def write_corpus(path, papers, seed=0):
+    """Papers of 3 to 8 sections, each 5 to 400 words long."""
+    rng = random.Random(seed)
+    words = LONG_TEXT.split()
+    with open(path, "w") as output:
+        for index in range(papers):
+            sections = []
+            for number in range(rng.randint(3, 8)):
+                start = rng.randrange(len(words))
+                length = rng.choice([rng.randint(5, 40), rng.randint(40, 400)])
+                body = " ".join(words[(start + i) % len(words)] for i in range(length))
+                sections.append(f"Section {number}\n{body}")
+            paper = {"id": f"paper-{index}", "label": rng.random(), "text": "\n".join(sections)}
+            output.write(json.dumps(paper) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-model", help="model to fine-tune (default: tiny random BERT)")
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    from transformers import AutoConfig, AutoTokenizer
+
+    from pretokenize import pretokenize
+    from training import train
+
+    base_model = args.base_model or str(default_model_dir())
+    layers = AutoConfig.from_pretrained(base_model).num_hidden_layers
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        write_corpus(workdir / "papers.jsonl", args.papers)
+        counts = pretokenize(workdir / "papers.jsonl", workdir / "tokenized", AutoTokenizer.from_pretrained(base_model))
+        for name in args.configs:
+            options = dict(CONFIGS[name])
+            if options.pop("distill", False):
+                options.update(distill_from=base_model, student_layers=max(1, layers // 2))
+            if options.get("freeze") == "half":
+                options["freeze"] = layers // 2
+            started = time.perf_counter()
+            _, epochs = train(
+                workdir / "tokenized",
+                workdir / name,
+                base_model,
+                epochs=args.epochs,
+                # Run every epoch, the point is to time them
+                patience=args.epochs,
+                publish=False,
+                work_dir=workdir / f"{name}-trainer",
+                **options,
+            )
+            runs.append({
+                "config": name,
+                "options": {key: str(value) for key, value in options.items()},
+                "seconds_per_epoch": statistics.mean(epoch["seconds"] for epoch in epochs),
+                "cpu_seconds_per_epoch": statistics.mean(epoch["cpu_seconds"] for epoch in epochs),
+                "total_seconds": time.perf_counter() - started,
+            })
+    save_results(
+        "training",
+        {"base_model": base_model, "papers": args.papers, "examples": counts, "epochs": args.epochs, "runs": runs},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput and memory of the multi-process server against worker count.
+
+    python -m benchmarks.workers --workers 1 2 4 --concurrency 16
+    python -m benchmarks.workers --modes prefork uvicorn --model-dir model_output
+
+``prefork`` is ``serve.py`` (one shared copy of the weights), ``uvicorn`` is
+``uvicorn --workers N`` where every worker loads its own. Memory is reported
+per worker as RSS, PSS (shared pages split between the processes using them)
+and USS (pages only that worker uses). Every request sends a statement not
+seen before, and the score cache and near-duplicate index are turned off, so
+each one reaches the model.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import (
+    LONG_TEXT,
+    SHORT_TEXT,
+    child_pids,
+    default_model_dir,
+    memory_mb,
+    save_results,
+    serve,
+)
+from benchmarks.load import UNCACHED, run_load
+
+MODES = {
+    "prefork": lambda workers: (("serve.py",), ["--workers", str(workers)]),
+    "uvicorn": lambda workers: (("-m", "uvicorn", "aimodel:app"), ["--workers", str(workers)]),
+}
+
+
+def worker_pids(server):
+    """The serving processes under ``server``, skipping multiprocessing helpers."""
+    pids = []
+    for pid in child_pids(server.pid):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+                if b"resource_tracker" in cmdline.read():
+                    continue
+        except OSError:
+            continue
+        pids.append(pid)
+    return pids
+
+
+def measure_memory(server):
+    # uvicorn with a single worker serves from the process it was started as
+    pids = worker_pids(server) or [server.pid]
+    workers = [memory_mb(pid) for pid in pids]
+    workers = [worker for worker in workers if worker]
+    if not workers:
+        return {}
+    supervisor = memory_mb(server.pid) if pids != [server.pid] else None
+    return {
+        "supervisor": supervisor,
+        "worker_processes": len(workers),
+        "mean_worker_rss_mb": statistics.fmean(worker["rss_mb"] for worker in workers),
+        "mean_worker_uss_mb": statistics.fmean(worker["uss_mb"] for worker in workers),
+        "total_pss_mb": sum(worker["pss_mb"] for worker in workers) + (supervisor or {}).get("pss_mb", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to serve (default: tiny random BERT)")
+    parser.add_argument("--modes", nargs="+", default=["prefork", "uvicorn"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--long", action="store_true", help="score 512-token inputs instead of short ones")
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+    for mode in args.modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}, expected one of {sorted(MODES)}")
+
+    model_dir = default_model_dir(args.model_dir)
+    text = LONG_TEXT if args.long else SHORT_TEXT
+    results = []
+    for mode in args.modes:
+        for workers in args.workers:
+            command, server_args = MODES[mode](workers)
+            with serve(model_dir, UNCACHED, server_args, command=command) as url:
+                # Let every worker finish starting before measuring
+                deadline = time.perf_counter() + 60
+                while workers > 1 and len(worker_pids(url.process)) < workers and time.perf_counter() < deadline:
+                    time.sleep(0.1)
+                run_load(url, args.concurrency, args.concurrency * 2, text)
+                result = run_load(url, args.concurrency, args.requests, text)
+                result.update(mode=mode, workers=workers, **measure_memory(url.process))
+                results.append(result)
+                print(
+                    f"{mode:8} workers={workers}: {result['requests_per_s']:.1f} req/s, "
+                    f"p50 {result['p50_ms']:.1f} ms, total PSS {result.get('total_pss_mb', 0):.0f} MiB"
+                )
+    save_results(
+        "workers",
+        {"model_dir": str(model_dir), "long": args.long, "runs": results},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Content-addressed caching of confidence scores.
+
+Scores are keyed on a hash of the normalised statement and the version of the
+model that produced them, so a new checkpoint never serves a stale score. The
+indices and similarities of the statement's source passages are cached with
+its score once they have been looked up, so a hit needs no forward pass. The
+in-process tier is a size-bounded LRU. An optional shared tier (Redis, set
+``CACHE_REDIS_URL``) lets several service replicas reuse each other's scores.
+
+Redis calls block, so they never run on the event loop: the endpoints look
+entries up with ``aget``/``aget_many``, which wait for the shared tier on
+its own threads, and writes to it are queued there without being waited for.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# ``tag`` says which stage scored the statement (whose source index the ids
+# are from); ``source_ids`` is None until its sources have been looked up
+CachedScore = namedtuple("CachedScore", "confidence tag source_ids source_scores")
+
+
+def normalize_text(text):
+    """Unicode-normalise, lowercase and collapse whitespace, so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+def content_key(text, model_version):
+    return f"{model_version}:{text_hash(text)}"
+
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RedisTier:
+    """
+    Shared cache tier. Entries expire after ``ttl`` seconds so Redis stays bounded.
+
+    ``get_many`` and ``set`` block on Redis; ``aget_many`` and ``set_later``
+    run them on the tier's ``threads`` threads instead.
+    """
+
+    def __init__(self, url, ttl=7 * 24 * 3600, prefix="confidence:", threads=4):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="redis")
+
+    def get_many(self, keys):
+        """The values of ``keys``, ``None`` for those not in Redis, in one round trip."""
+        values = self.client.mget([self.prefix + key for key in keys]) if keys else []
+        found = sum(value is not None for value in values)
+        self.hits += found
+        self.misses += len(values) - found
+        return [json.loads(value) if value is not None else None for value in values]
+
+    async def aget_many(self, keys):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.get_many, keys)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def set_later(self, key, value):
+        """Queue a ``set``; replicas see the entry once it is written, nobody waits for it."""
+        self._executor.submit(self.set, key, value).add_done_callback(_log_failure)
+
+    def clear(self):
+        # Shared entries are keyed by model version, old ones simply expire
+        pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("Writing to the shared cache failed: %r", future.exception())
+
+
+class ScoreCache:
+    """Looks up scores in the local LRU first, then the shared tier if there is one."""
+
+    def __init__(self, maxsize=10000, shared=None):
+        self.local = LRUCache(maxsize)
+        self.shared = shared
+        self.model_version = None
+
+    def set_model_version(self, model_version):
+        """Start serving a new model; scores from the previous one are dropped."""
+        if model_version != self.model_version:
+            self.local.clear()
+            self.model_version = model_version
+
+    def _lookup(self, texts, model_version):
+        """Keys of ``texts`` and their entries in the local tier."""
+        keys = [content_key(text, model_version or self.model_version) for text in texts]
+        return keys, [self.local.get(key) for key in keys]
+
+    def _fill(self, keys, values, shared_values):
+        """``values`` with the entries missing locally taken from ``shared_values``."""
+        shared_values = iter(shared_values)
+        for index, (key, value) in enumerate(zip(keys, values)):
+            if value is None:
+                value = next(shared_values)
+                if value is None:
+                    continue
+                # Shared entries written before sources were cached are bare scores
+                value = CachedScore(*value) if isinstance(value, list) else CachedScore(value, 0, None, None)
+                self.local.set(key, value)
+                values[index] = value
+        return values
+
+    def get(self, text, model_version=None):
+        """
+        The ``CachedScore`` of ``text`` from ``model_version``, by default the
+        version being served. Blocks on the shared tier; off the event loop only.
+        """
+        keys, values = self._lookup([text], model_version)
+        if values[0] is None and self.shared is not None:
+            self._fill(keys, values, self.shared.get_many(keys))
+        return values[0]
+
+    async def aget(self, text, model_version=None):
+        """``get`` for the event loop."""
+        return (await self.aget_many([text], model_version))[0]
+
+    async def aget_many(self, texts, model_version=None):
+        """
+        The ``CachedScore`` (or ``None``) of each of ``texts``; those missing
+        locally are looked up in the shared tier together.
+        """
+        keys, values = self._lookup(texts, model_version)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing and self.shared is not None:
+            self._fill(keys, values, await self.shared.aget_many(missing))
+        return values
+
+    def set(self, text, confidence, model_version=None, tag=0, source_ids=None, source_scores=None):
+        """Cache a score; never waits for the shared tier."""
+        key = content_key(text, model_version or self.model_version)
+        value = CachedScore(confidence, tag, source_ids, source_scores)
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set_later(key, list(value))
+
+    def stats(self):
+        stats = {"model_version": self.model_version, "local": self.local.stats()}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
@@ -0,0 +1,61 @@
+"""
+Two-stage cascade scoring.
+
+A small student distilled from the served model (``training.py --distill-from``)
+scores every statement first. Most statements land well away from the decision
+threshold, and the student's score is used for those. Only the ones within
+``band`` of ``threshold``, where the student is most likely to end up on the
+wrong side, are scored again by the full model.
+
+Enable it with ``CASCADE=1`` once a student has been trained into
+``CASCADE_STUDENT_DIR``:
+
+    python training.py --distill-from model_output --student-layers 4 --output-dir model_output/student
+    python -m benchmarks.cascade --student model_output/student
+"""
+import threading
+
+import settings
+
+STUDENT = "student"
+FULL = "full"
+
+
+class Cascade:
+    def __init__(self, student, full, threshold=settings.CASCADE_THRESHOLD, band=settings.CASCADE_BAND):
+        self.student = student
+        self.full = full
+        self.threshold = threshold
+        self.band = band
+        self._lock = threading.Lock()
+        self.scored = self.escalated = 0
+
+    @property
+    def version(self):
+        """Identifies the pair of models; a cascade's scores differ from the full model's alone."""
+        return f"{self.full.version}+{self.student.version}"
+
+    def uncertain(self, score):
+        return abs(score - self.threshold) < self.band
+
+    def score(self, texts):
+        """``(confidence, stage)`` for each text, the stage being ``STUDENT`` or ``FULL``."""
+        results = [(score, STUDENT) for score in self.student.predict(texts)]
+        escalate = [index for index, (score, _) in enumerate(results) if self.uncertain(score)]
+        if escalate:
+            scores = self.full.predict([texts[index] for index in escalate])
+            for index, score in zip(escalate, scores):
+                results[index] = (score, FULL)
+        with self._lock:
+            self.scored += len(texts)
+            self.escalated += len(escalate)
+        return results
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "band": self.band,
+            "scored": self.scored,
+            "escalated": self.escalated,
+            "escalation_ratio": self.escalated / self.scored if self.scored else 0.0,
+        }
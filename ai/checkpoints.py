@@ -0,0 +1,89 @@
+"""
+Versioned checkpoint directories.
+
+    model_output/
+        versions/
+            20261018-142501/    config, weights, tokenizer, exports, sources/
+            20261019-093012/
+        CURRENT                 name of the version to serve
+
+``training.py`` writes every run to a new directory under ``versions/`` and
+then points ``CURRENT`` at it, so a checkpoint is never overwritten while it is
+being served and an older one can be switched back to. A model directory with
+its own ``config.json`` (the layout from before versioning) is served as it is.
+"""
+import os
+import time
+from pathlib import Path
+
+VERSIONS = "versions"
+CURRENT = "CURRENT"
+
+
+def version_dir(model_dir, version):
+    if not version or "/" in version or version.startswith("."):
+        raise ValueError(f"Invalid checkpoint version {version!r}")
+    return Path(model_dir) / VERSIONS / version
+
+
+def list_versions(model_dir):
+    """Names of the complete checkpoints in ``model_dir``, oldest first."""
+    versions = Path(model_dir) / VERSIONS
+    if not versions.is_dir():
+        return []
+    return sorted(path.name for path in versions.iterdir() if (path / "config.json").exists())
+
+
+def current_version(model_dir):
+    try:
+        return (Path(model_dir) / CURRENT).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(model_dir, version=None):
+    """
+    The checkpoint directory to load from ``model_dir``.
+
+    That is ``version`` if given, otherwise the one named in ``CURRENT``, an
+    unversioned checkpoint in ``model_dir`` itself, or the newest version.
+    """
+    model_dir = Path(model_dir)
+    version = version or current_version(model_dir)
+    if version is None:
+        versions = list_versions(model_dir)
+        if (model_dir / "config.json").exists() or not versions:
+            return model_dir
+        version = versions[-1]
+    path = version_dir(model_dir, version)
+    if not (path / "config.json").exists():
+        raise ValueError(f"No checkpoint version {version!r} in {model_dir}")
+    return path
+
+
+def version_of(model_dir, checkpoint):
+    """The version name of ``checkpoint`` if it is one of ``model_dir``'s versions, else ``None``."""
+    checkpoint = Path(checkpoint)
+    return checkpoint.name if checkpoint.parent == Path(model_dir) / VERSIONS else None
+
+
+def new_version(model_dir):
+    """Create and return an empty directory for the next checkpoint, named by UTC time."""
+    name = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    for suffix in [""] + [f"-{n}" for n in range(1, 100)]:
+        path = version_dir(model_dir, name + suffix)
+        try:
+            path.mkdir(parents=True)
+            return path
+        except FileExistsError:
+            continue
+    raise RuntimeError(f"Could not create a new checkpoint version in {model_dir}")
+
+
+def publish(model_dir, version):
+    """Point ``CURRENT`` at ``version``, atomically so a reader never sees a partial name."""
+    resolve(model_dir, version)
+    current = Path(model_dir) / CURRENT
+    temporary = current.with_name(f".{CURRENT}.{os.getpid()}")
+    temporary.write_text(version + "\n")
+    os.replace(temporary, current)
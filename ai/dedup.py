@@ -0,0 +1,168 @@
+"""
+Near-duplicate statements, so trivially different copies of a statement
+(whitespace, case, punctuation, a sentence added at the end) reuse its score
+and sources instead of costing another forward pass.
+
+Statements are normalised and split into overlapping word pairs, and the
+Jaccard similarity of two statements' pairs is estimated from MinHash
+signatures: 64 hash functions, each keeping the smallest hash of any pair,
+stored as 16 bits. Candidates are found with locality-sensitive hashing: the
+signature is cut into 16 bands of 4 values, each band hashed into its own
+table, and statements sharing any band are compared in full. A statement is
+only reused when the estimate reaches ``threshold`` and the two statements
+contain the same negations and numbers, because "does not reduce mortality"
+and "reduces mortality by 30%" are close in words but not in meaning.
+
+Everything lives in fixed-size numpy arrays allocated up front for
+``capacity`` statements, under 300 bytes each, and the oldest statement is
+overwritten once they are full. The arrays start out as zeros, so pages
+nobody has written to yet take no memory. A band table keeps only the latest statement
+per bucket, so an older copy can occasionally be missed; that only costs a
+forward pass. Lookups and inserts take tens of microseconds at any size.
+"""
+import re
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from cache import normalize_text
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+BAND_INDEX = np.arange(BANDS)
+# Coefficients of the hash functions ``(a * x + b) mod PRIME``, fixed so every
+# process computes the same signatures
+PRIME = (1 << 31) - 1
+_coefficients = np.random.default_rng(0x5EED).integers(1, PRIME, size=(2, NUM_HASHES), dtype=np.uint64)
+HASH_A, HASH_B = _coefficients
+# Fibonacci hashing of a band's 64 bits into a table bucket
+MIX = np.uint64(0x9E3779B97F4A7C15)
+
+WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+DIGIT = re.compile(r"\d")
+NEGATIONS = frozenset({"no", "not", "never", "none", "nor", "neither", "without", "cannot", "nothing"})
+
+Match = namedtuple("Match", "confidence tag source_ids source_scores similarity")
+
+
+def words(text):
+    """Lowercase words of ``text``, punctuation and spacing dropped."""
+    return WORD.findall(normalize_text(text).replace("’", "'"))
+
+
+def guard(tokens):
+    """A hash of the negations and numbers in ``tokens``, which two reused statements must share."""
+    kept = sorted({
+        token for token in tokens
+        if token in NEGATIONS or token.endswith("n't") or (not token.isalpha() and DIGIT.search(token))
+    })
+    return zlib.crc32(" ".join(kept).encode())
+
+
+def signature(tokens):
+    """The MinHash signature of the word pairs of ``tokens`` (single words if there is only one)."""
+    shingles = [f"{first} {second}" for first, second in zip(tokens, tokens[1:])] or tokens
+    hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), np.uint64, len(shingles))
+    # Reduced mod PRIME first so the products fit in 64 bits
+    permuted = (HASH_A * (hashes[:, None] % np.uint64(PRIME)) + HASH_B) % np.uint64(PRIME)
+    return permuted.min(axis=0).astype(np.uint16)
+
+
+class NearDuplicateIndex:
+    def __init__(self, capacity, threshold=0.8, sources=3):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.signatures = np.zeros((capacity, NUM_HASHES), dtype=np.uint16)
+        self.guards = np.zeros(capacity, dtype=np.uint32)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.tags = np.zeros(capacity, dtype=np.uint8)
+        # Passage index + 1, 0 for none
+        self.source_ids = np.zeros((capacity, sources), dtype=np.int32)
+        self.source_scores = np.zeros((capacity, sources), dtype=np.float32)
+        # Slot + 1 of the latest statement in each bucket of each band, 0 for none
+        self._bucket_bits = max(1, (capacity - 1).bit_length())
+        self.tables = np.zeros((BANDS, 1 << self._bucket_bits), dtype=np.uint32)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        arrays = [self.signatures, self.guards, self.confidences, self.tags, self.source_ids, self.source_scores]
+        return sum(array.nbytes for array in arrays) + self.tables.nbytes
+
+    def _buckets(self, sig):
+        bands = sig.reshape(BANDS, ROWS).astype(np.uint64)
+        keys = bands[:, 0] | bands[:, 1] << np.uint64(16) | bands[:, 2] << np.uint64(32) | bands[:, 3] << np.uint64(48)
+        return (keys * MIX) >> np.uint64(64 - self._bucket_bits)
+
+    def find(self, text):
+        """The ``Match`` for the most similar statement stored, if one is similar enough."""
+        tokens = words(text)
+        if not tokens:
+            return None
+        sig, key = signature(tokens), guard(tokens)
+        with self._lock:
+            slots = self.tables[BAND_INDEX, self._buckets(sig)]
+            slots = np.unique(slots[slots > 0]) - 1
+            if len(slots):
+                slots = slots[self.guards[slots] == key]
+            if len(slots):
+                similarities = (self.signatures[slots] == sig).mean(axis=1)
+                best = int(similarities.argmax())
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    slot = slots[best]
+                    ids = self.source_ids[slot]
+                    return Match(
+                        float(self.confidences[slot]),
+                        int(self.tags[slot]),
+                        (ids[ids > 0] - 1).tolist(),
+                        self.source_scores[slot][ids > 0].tolist(),
+                        float(similarities[best]),
+                    )
+            self.misses += 1
+            return None
+
+    def add(self, text, confidence, source_ids=(), source_scores=(), tag=0):
+        """
+        Store a scored statement, with the indices and similarities of its
+        sources and a caller-defined ``tag``.
+        """
+        tokens = words(text)
+        if not tokens:
+            return
+        sig, key = signature(tokens), guard(tokens)
+        sources = min(len(source_ids), self.source_ids.shape[1])
+        with self._lock:
+            slot = self._next
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            self.signatures[slot] = sig
+            self.guards[slot] = key
+            self.confidences[slot] = confidence
+            self.tags[slot] = tag
+            self.source_ids[slot] = 0
+            self.source_ids[slot, :sources] = np.asarray(source_ids[:sources]) + 1
+            self.source_scores[slot, :sources] = source_scores[:sources]
+            # Buckets still pointing at the statement this one replaced fail
+            # the comparison against its signature
+            self.tables[BAND_INDEX, self._buckets(sig)] = slot + 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
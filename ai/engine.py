@@ -0,0 +1,455 @@
+"""
+Inference engine for the confidence model.
+
+``InferenceEngine`` owns the tokenizer and model for serving: the model is put
+in eval mode (dropout off), its parameters are frozen and every forward pass
+runs under ``torch.inference_mode()`` so no autograd graph is recorded. Torch's
+thread pools are sized to the CPUs the container is actually allowed to use
+rather than the host's core count.
+
+The weights can be served as the fp32 checkpoint or as one of the CPU variants
+written by ``export.py`` (``settings.MODEL_VARIANT``).
+"""
+import hashlib
+import os
+import threading
+from array import array
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+import checkpoints
+import settings
+from cache import LRUCache, normalize_text
+from metrics import BATCH_SIZE, STAGE_SECONDS, TOKEN_LENGTH
+from profiling import region
+
+
+def cpu_quota():
+    """Number of CPUs this process may use, honouring cgroup CPU limits."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = period = None
+    try:
+        # cgroup v2, e.g. "200000 100000" or "max 100000"
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            quota = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text().strip()
+            period = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text().strip()
+        except OSError:
+            pass
+    if quota not in (None, "max", "-1"):
+        cpus = min(cpus, max(1, int(quota) // int(period)))
+    return cpus
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Size torch's intra-op and inter-op thread pools.
+
+    These are process wide. The inter-op pool can only be sized before torch
+    first uses it, later calls keep the existing size.
+    """
+    intra_op_threads = intra_op_threads or cpu_quota()
+    torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            pass
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+# Where export.py writes each variant, relative to the model directory
+INT8_WEIGHTS = Path("int8") / "model.pt"
+ONNX_MODEL = Path("onnx") / "model.onnx"
+VARIANTS = ("fp32", "int8", "onnx")
+
+
+def quantize_int8(model):
+    """Dynamic INT8 quantization of every Linear layer (weights int8, activations quantized on the fly)."""
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8_model(model_dir):
+    config = AutoConfig.from_pretrained(model_dir)
+    model = quantize_int8(AutoModelForSequenceClassification.from_config(config).eval())
+    model.load_state_dict(torch.load(Path(model_dir) / INT8_WEIGHTS, weights_only=True))
+    return model
+
+
+class OnnxModel:
+    """Calls an exported ONNX graph with the same keyword interface as the torch model."""
+
+    def __init__(self, path):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("MODEL_VARIANT=onnx requires the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.inter_op_num_threads = torch.get_num_interop_threads()
+        self.session = onnxruntime.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        feed = {name: inputs[name].numpy() for name in self.input_names if name in inputs}
+        (logits,) = self.session.run(["logits"], feed)
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+# How per-window scores of a long document are combined into one confidence
+REDUCERS = {
+    "mean": lambda scores, lengths: sum(scores) / len(scores),
+    "max": lambda scores, lengths: max(scores),
+    "length_weighted": lambda scores, lengths: (
+        sum(score * length for score, length in zip(scores, lengths)) / sum(lengths)
+    ),
+}
+
+
+def text_key(text):
+    """Cache key of a text's token ids."""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def embedding_key(text):
+    """
+    Cache key of a text's embedding, on the normalised text like the score
+    cache, so a statement whose score is cached under a variant of it finds
+    its embedding too.
+    """
+    return text_key(normalize_text(text))
+
+
+def weight_files(model_dir, variant="fp32"):
+    """The files ``variant`` is loaded from, besides the config."""
+    model_dir = Path(model_dir)
+    if variant == "int8":
+        return [model_dir / INT8_WEIGHTS]
+    # fp32 weights sit in the checkpoint directory itself, exports in their own
+    directory = model_dir / ONNX_MODEL.parent if variant == "onnx" else model_dir
+    suffixes = (".onnx", ".data") if variant == "onnx" else (".safetensors", ".bin")
+    return sorted(path for path in directory.glob("*") if path.suffix in suffixes)
+
+
+def checkpoint_version(model_dir, variant="fp32"):
+    """
+    Short identifier of the weights ``variant`` is served from in ``model_dir``.
+
+    Derived from the config and the size and modification time of the
+    variant's weight files, so it changes whenever a new checkpoint is written
+    without having to hash hundreds of megabytes. Exporting another variant
+    leaves it as it was.
+    """
+    model_dir = Path(model_dir)
+    digest = hashlib.sha256(variant.encode())
+    digest.update((model_dir / "config.json").read_bytes())
+    for path in weight_files(model_dir, variant):
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path.relative_to(model_dir)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+class InferenceEngine:
+    def __init__(
+        self,
+        model_dir=settings.MODEL_DIR,
+        device=None,
+        max_length=settings.MAX_LENGTH,
+        variant=settings.MODEL_VARIANT,
+    ):
+        # A versioned model directory is resolved to the checkpoint it points at
+        model_dir = checkpoints.resolve(model_dir)
+        if not (model_dir / "config.json").exists():
+            raise RuntimeError(
+                f"No trained model found in {model_dir}, run `python training.py` first"
+            )
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown model variant {variant!r}, expected one of {VARIANTS}")
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.variant = variant
+        self.version = checkpoint_version(model_dir, variant)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        if not self.tokenizer.is_fast:
+            raise RuntimeError(
+                f"The tokenizer in {model_dir} is not a fast (Rust) tokenizer, "
+                "install the tokenizers package or save a tokenizer.json with the model"
+            )
+        # Token ids of recently seen texts (e.g. boilerplate sections), stored
+        # compactly as uint16 when the vocabulary fits
+        self.token_cache = LRUCache(settings.TOKENIZER_CACHE_SIZE)
+        self._id_type = "H" if len(self.tokenizer) <= 2 ** 16 else "i"
+        self._input_names = self.tokenizer.model_input_names
+        # Pooled embeddings of recently scored texts, so looking up sources for
+        # a statement that was just scored needs no second forward pass
+        self.embedding_cache = LRUCache(settings.EMBEDDING_CACHE_SIZE)
+        self._hidden = threading.local()
+        # Builds the normaliser and vocabulary lookups before the first request.
+        # A single encode doesn't start the Rust thread pool, which must not be
+        # running if serve.py forks after loading.
+        self.tokenizer.backend_tokenizer.encode("warm up")
+        if variant == "fp32":
+            self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            # safetensors checkpoints are memory-mapped rather than read into a copy
+            model = AutoModelForSequenceClassification.from_pretrained(
+                model_dir, use_safetensors=True
+            )
+        else:
+            # The quantized and ONNX variants are CPU only
+            self.device = torch.device("cpu")
+            if not (model_dir / (INT8_WEIGHTS if variant == "int8" else ONNX_MODEL)).exists():
+                raise RuntimeError(
+                    f"No {variant} export found in {model_dir}, run `python export.py {variant}` first"
+                )
+            if variant == "onnx":
+                self.model = OnnxModel(model_dir / ONNX_MODEL)
+                return
+            model = load_int8_model(model_dir)
+        model.requires_grad_(False)
+        self.model = model.to(self.device).eval()
+        # Keeps the encoder's last hidden state from each forward pass, rather
+        # than asking for output_hidden_states and holding every layer's
+        self.model.base_model.register_forward_hook(self._keep_hidden_state)
+
+    @property
+    def can_embed(self):
+        return not isinstance(self.model, OnnxModel)
+
+    def _keep_hidden_state(self, module, args, output):
+        # Thread local, batches are scored concurrently from executor threads
+        self._hidden.state = output[0]
+
+    def share_memory(self):
+        """
+        Move the weights into shared memory so forked workers all read one copy.
+
+        Without this they are still shared copy-on-write after a fork, but any
+        page that gets written to (or touched by the allocator) is duplicated.
+        ONNX sessions own their memory and are left as they are.
+        """
+        if isinstance(self.model, torch.nn.Module):
+            self.model.share_memory()
+
+    def encode(self, texts):
+        """
+        Truncated token ids of each text, from ``token_cache`` where possible.
+
+        Texts that aren't cached are tokenized together in one call to the fast
+        tokenizer.
+        """
+        keys = [text_key(text) for text in texts]
+        ids = [self.token_cache.get(key) for key in keys]
+        misses = [index for index, value in enumerate(ids) if value is None]
+        if misses:
+            encoded = self.tokenizer(
+                [texts[index] for index in misses],
+                truncation=True,
+                max_length=self.max_length,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )["input_ids"]
+            for index, token_ids in zip(misses, encoded):
+                ids[index] = array(self._id_type, token_ids)
+                self.token_cache.set(keys[index], ids[index])
+        return ids
+
+    def collate(self, ids):
+        """Right-pad token id sequences into a batch of model inputs."""
+        lengths = [len(token_ids) for token_ids in ids]
+        input_ids = np.full((len(ids), max(lengths)), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for row, (token_ids, length) in enumerate(zip(ids, lengths)):
+            input_ids[row, :length] = token_ids
+            attention_mask[row, :length] = 1
+        inputs = {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask),
+        }
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = torch.zeros_like(inputs["input_ids"])
+        return inputs
+
+    def tokenize(self, texts, padding=True):
+        """Padded model inputs, or with ``padding=False`` just the unpadded ``input_ids``."""
+        with STAGE_SECONDS.time(stage="tokenize"), region("tokenize"):
+            ids = self.encode(texts)
+            encodings = self.collate(ids) if padding else {"input_ids": ids}
+        for token_ids in ids:
+            TOKEN_LENGTH.observe(len(token_ids))
+        return encodings
+
+    def score_inputs(self, inputs, embed=False):
+        """
+        Run the model on a padded batch of tokenized inputs.
+
+        With ``embed=True`` returns ``(scores, embeddings)``, the embeddings
+        (see ``embed``) pooled from the same forward pass.
+        """
+        with torch.inference_mode():
+            with STAGE_SECONDS.time(stage="h2d"), region("h2d"):
+                inputs = {key: val.to(self.device) for key, val in inputs.items()}
+            BATCH_SIZE.observe(len(inputs["input_ids"]))
+            try:
+                with STAGE_SECONDS.time(stage="forward"), region("forward"):
+                    outputs = self.model(**inputs)
+                    if self.device.type == "cuda":
+                        # Kernels run asynchronously, wait for them so the time is
+                        # charged to the forward pass rather than the copy back
+                        torch.cuda.synchronize(self.device)
+                with STAGE_SECONDS.time(stage="postprocess"), region("postprocess"):
+                    scores = torch.sigmoid(
+                        outputs.logits
+                    ).squeeze(-1).tolist()  # Use sigmoid for regression output in confidence
+                    if not embed:
+                        return scores
+                    return scores, mean_pool(self._hidden.state, inputs["attention_mask"])
+            finally:
+                self._hidden.state = None
+
+    def predict(self, texts):
+        """
+        Score a list of texts in one padded forward pass.
+
+        Their embeddings come out of the same pass and are kept in
+        ``embedding_cache``.
+        """
+        inputs = self.tokenize(texts)
+        if not self.can_embed:
+            return self.score_inputs(inputs)
+        scores, embeddings = self.score_inputs(inputs, embed=True)
+        self._keep_embeddings(texts, embeddings)
+        return scores
+
+    def _keep_embeddings(self, texts, embeddings):
+        for text, embedding in zip(texts, embeddings):
+            # A copy, so a cached row doesn't keep the whole batch's array alive
+            self.embedding_cache.set(embedding_key(text), embedding.copy())
+
+    def embed(self, texts):
+        """
+        L2-normalised embeddings of ``texts``: the model's last hidden state
+        mean-pooled over each text's tokens, as a float32 array.
+
+        Texts scored recently are served from ``embedding_cache``; the rest are
+        run through the model together.
+        """
+        if not self.can_embed:
+            raise RuntimeError("Embeddings need the fp32 or int8 model, the ONNX export only has logits")
+        keys = [embedding_key(text) for text in texts]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        misses = [index for index, value in enumerate(embeddings) if value is None]
+        if misses:
+            _, computed = self.score_inputs(
+                self.tokenize([texts[index] for index in misses]), embed=True
+            )
+            for index, embedding in zip(misses, computed):
+                embeddings[index] = embedding
+                self.embedding_cache.set(keys[index], embedding.copy())
+        return np.stack(embeddings)
+
+    def score_bucket(self, encodings, indices, texts=None):
+        """
+        Pad and score the subset ``indices`` of an unpadded batch encoding.
+
+        Given the ``texts`` that were encoded, their embeddings are kept in
+        ``embedding_cache`` like ``predict`` does.
+        """
+        with STAGE_SECONDS.time(stage="tokenize"), region("tokenize"):
+            inputs = self.collate([encodings["input_ids"][index] for index in indices])
+        if texts is None or not self.can_embed:
+            return self.score_inputs(inputs)
+        scores, embeddings = self.score_inputs(inputs, embed=True)
+        self._keep_embeddings([texts[index] for index in indices], embeddings)
+        return scores
+
+    def windows(self, text, stride=settings.LONG_DOC_STRIDE):
+        """
+        Split a document into windows of ``max_length`` tokens overlapping by
+        ``stride`` tokens (at most half a window).
+
+        Returns the unpadded encoding of the windows, like ``tokenize`` with
+        ``padding=False``, and the character offsets of each window's tokens.
+        """
+        with STAGE_SECONDS.time(stage="tokenize"), region("tokenize"):
+            encodings = self.tokenizer(
+                text,
+                truncation=True,
+                max_length=self.max_length,
+                stride=min(stride, self.max_length // 2),
+                return_overflowing_tokens=True,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+        for token_ids in encodings["input_ids"]:
+            TOKEN_LENGTH.observe(len(token_ids))
+        return {"input_ids": encodings["input_ids"]}, encodings["offset_mapping"]
+
+    def score_windows(self, text, windows, indices):
+        """Score the windows ``indices`` of ``text`` in one padded forward pass."""
+        indices = list(indices)
+        if 0 not in indices or not self.can_embed:
+            return self.score_bucket(windows, indices)
+        # The first window is the text truncated to max_length, which is what
+        # embed() would run for its source lookup
+        with STAGE_SECONDS.time(stage="tokenize"), region("tokenize"):
+            inputs = self.collate([windows["input_ids"][index] for index in indices])
+        scores, embeddings = self.score_inputs(inputs, embed=True)
+        self.embedding_cache.set(embedding_key(text), embeddings[indices.index(0)].copy())
+        return scores
+
+    @staticmethod
+    def window_sections(offsets, scores):
+        """One section per window with its character span, token count and score."""
+        sections = []
+        for window_offsets, score in zip(offsets, scores):
+            # Special tokens have empty (0, 0) offsets
+            spans = [(start, end) for start, end in window_offsets if end > start]
+            sections.append({
+                "start": spans[0][0] if spans else 0,
+                "end": spans[-1][1] if spans else 0,
+                "tokens": len(window_offsets),
+                "confidence": score,
+            })
+        return sections
+
+    def predict_long(self, text, stride=settings.LONG_DOC_STRIDE, batch_size=settings.BULK_BATCH_SIZE):
+        """
+        Score a document longer than ``max_length`` tokens.
+
+        All its ``windows`` are scored in batches of ``batch_size``. Returns one
+        section per window with its character span.
+        """
+        windows, offsets = self.windows(text, stride)
+        scores = []
+        for start in range(0, len(offsets), batch_size):
+            scores += self.score_windows(text, windows, range(start, min(start + batch_size, len(offsets))))
+        return self.window_sections(offsets, scores)
+
+
+def mean_pool(hidden, attention_mask):
+    """Mean of ``hidden`` over unmasked tokens, L2-normalised, as a numpy array."""
+    mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return torch.nn.functional.normalize(pooled, dim=-1).float().cpu().numpy()
+
+
+def reduce_sections(sections, reducer="mean"):
+    """Combine per-window section scores into one confidence with ``REDUCERS[reducer]``."""
+    scores = [section["confidence"] for section in sections]
+    lengths = [section["tokens"] for section in sections]
+    return REDUCERS[reducer](scores, lengths)
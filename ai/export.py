@@ -0,0 +1,122 @@
+"""
+Export CPU serving variants of the trained checkpoint.
+
+    python export.py                 # int8 and onnx, then check parity
+    python export.py int8 --tolerance 0.01
+    python export.py onnx --model-dir ./model_output --no-check
+
+Each variant is written next to the fp32 weights of the current checkpoint in
+``settings.MODEL_DIR`` and served by setting ``MODEL_VARIANT``. The parity check scores a sample of the
+training corpus with fp32 and the variant and fails if any score drifts by
+more than ``--tolerance``.
+
+The ONNX variant needs ``pip install onnx onnxruntime`` (not part of the base
+image).
+"""
+import argparse
+import inspect
+import itertools
+import sys
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+import checkpoints
+import settings
+from engine import INT8_WEIGHTS, ONNX_MODEL, InferenceEngine, quantize_int8
+from ingest import iter_records
+
+
+def load_fp32(model_dir):
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir, use_safetensors=True)
+    return model.eval()
+
+
+def export_int8(model_dir):
+    path = Path(model_dir) / INT8_WEIGHTS
+    path.parent.mkdir(exist_ok=True)
+    torch.save(quantize_int8(load_fp32(model_dir)).state_dict(), path)
+    return path
+
+
+def export_onnx(model_dir, opset_version=17):
+    path = Path(model_dir) / ONNX_MODEL
+    path.parent.mkdir(exist_ok=True)
+    model = load_fp32(model_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    example = tokenizer(["An example statement", "Another one"], return_tensors="pt", padding=True)
+    # Graph inputs are named in the order of the forward() signature
+    input_names = [name for name in inspect.signature(model.forward).parameters if name in example]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        model,
+        (),
+        path,
+        kwargs=dict(example),
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset_version,
+        dynamo=False,
+    )
+    return path
+
+
+def parity_texts(limit=64):
+    """Paragraphs of the training corpus."""
+    paragraphs = (
+        paragraph
+        for record in iter_records(settings.TRAINING_DATA)
+        for paragraph in record["text"].split("\n")
+        if len(paragraph.split()) > 5
+    )
+    return list(itertools.islice(paragraphs, limit))
+
+
+def check_parity(model_dir, variant, texts, batch_size=8):
+    """Largest and mean absolute difference between fp32 and ``variant`` scores."""
+    reference = InferenceEngine(model_dir, variant="fp32", device=torch.device("cpu"))
+    candidate = InferenceEngine(model_dir, variant=variant)
+    diffs = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        diffs += [
+            abs(expected - actual)
+            for expected, actual in zip(reference.predict(batch), candidate.predict(batch))
+        ]
+    return {"max_abs_diff": max(diffs), "mean_abs_diff": sum(diffs) / len(diffs), "count": len(diffs)}
+
+
+EXPORTERS = {"int8": export_int8, "onnx": export_onnx}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("variants", nargs="*", help="any of int8, onnx (default: both)")
+    parser.add_argument("--model-dir", default=settings.MODEL_DIR)
+    parser.add_argument("--no-check", action="store_true", help="skip the parity check")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+    unknown = set(args.variants) - set(EXPORTERS)
+    if unknown:
+        parser.error(f"unknown variants {sorted(unknown)}, expected int8 or onnx")
+    # Exports are written next to the weights of the served checkpoint version
+    args.model_dir = checkpoints.resolve(args.model_dir)
+
+    failed = False
+    for variant in args.variants or sorted(EXPORTERS):
+        path = EXPORTERS[variant](args.model_dir)
+        print(f"Exported {variant} to {path}")
+        if args.no_check:
+            continue
+        parity = check_parity(args.model_dir, variant, parity_texts())
+        ok = parity["max_abs_diff"] <= args.tolerance
+        failed = failed or not ok
+        print(f"{variant} parity vs fp32: {parity} {'OK' if ok else 'FAILED'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
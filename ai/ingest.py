@@ -0,0 +1,192 @@
+"""
+Streaming ingestion of scientific papers.
+
+Papers are read lazily from a directory of ``.txt``/``.md`` files, a JSONL file
+(one paper per line, e.g. ``data/papers.jsonl`` or ``requests.jsonl``) or a
+directory mixing both. Each paper is cleaned, split into its sections
+(Introduction, Methods, Funding Statement, Conflict of interest, ...) and
+yielded one section record at a time, so only the paper being processed is
+ever held in memory.
+
+    python ingest.py data/papers.jsonl > sections.jsonl
+    python ingest.py papers/ --min-words 20 | curl -H "Content-Type: application/x-ndjson" \\
+        --data-binary @- http://localhost:8001/predict_confidence/batch
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+# Headings recognised regardless of their shape
+SECTION_HEADINGS = {
+    "abstract",
+    "introduction",
+    "background",
+    "methods",
+    "materials and methods",
+    "results",
+    "discussion",
+    "conclusion",
+    "conclusions",
+    "limitations",
+    "keywords",
+    "funding",
+    "funding statement",
+    "conflict of interest",
+    "conflicts of interest",
+    "data availability statement",
+    "author contributions",
+    "acknowledgments",
+    "acknowledgements",
+    "publisher's note",
+    "references",
+}
+TEXT_SUFFIXES = {".txt", ".md"}
+
+# "Keywords: chronic disease, ..." style headings sharing a line with their text
+INLINE_HEADING = re.compile(
+    r"^(%s):\s*(.+)$" % "|".join(re.escape(name) for name in SECTION_HEADINGS), re.IGNORECASE
+)
+
+HTML_TAG = re.compile(r"<[^>]+>")
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+# Heading hashes, backticks and emphasis markers (but not snake_case underscores)
+MARKDOWN_MARKUP = re.compile(r"^#+\s*|`+|(?<!\w)[*_]{1,3}(?=\S)|(?<=\S)[*_]{1,3}(?!\w)")
+# Lines left behind by copying papers out of journal web pages
+BOILERPLATE_LINE = re.compile(
+    r"^(open in a new tab|figure \d+\.?|table \d+\.?|(https?://|www\.)\S+)$", re.IGNORECASE
+)
+
+
+def read_jsonl(path):
+    with open(path) as lines:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {
+                "id": record.get("id") or record.get("request_id") or f"{path.name}:{line_number}",
+                "text": record.get("text") or record.get("body") or "",
+                "label": record.get("label"),
+            }
+
+
+def read_papers(source):
+    """Yield ``{"id", "text", "label"}`` for every paper in ``source``, one at a time."""
+    source = Path(source)
+    paths = sorted(source.rglob("*")) if source.is_dir() else [source]
+    for path in paths:
+        if path.suffix == ".jsonl":
+            yield from read_jsonl(path)
+        elif path.suffix in TEXT_SUFFIXES or not source.is_dir():
+            name = str(path.relative_to(source)) if source.is_dir() else path.name
+            yield {"id": name, "text": path.read_text(), "label": None}
+
+
+def clean_text(text):
+    """Strip HTML/markdown markup and page boilerplate, normalising whitespace per line."""
+    text = HTML_TAG.sub(" ", text)
+    text = MARKDOWN_LINK.sub(r"\1", text)
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(MARKDOWN_MARKUP.sub("", line).split())
+        line = line.lstrip("-• ").strip()
+        if not BOILERPLATE_LINE.match(line):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def is_heading(line):
+    name = line.rstrip(":").strip().lower()
+    if name in SECTION_HEADINGS:
+        return True
+    # Short capitalised lines without closing punctuation, e.g. "Model design"
+    words = line.split()
+    return (
+        0 < len(words) <= 15
+        and line[0].isupper()
+        and line[-1] not in ".?!,;"
+        and not line[0].isdigit()
+    )
+
+
+def split_sections(text):
+    """Yield ``(heading, body)`` pairs of a cleaned paper; text before the first heading is "Preamble"."""
+    heading, body = "Preamble", []
+    for line in text.splitlines():
+        if not line:
+            continue
+        inline = INLINE_HEADING.match(line)
+        if inline:
+            if body:
+                yield heading, "\n".join(body)
+            heading, body = inline.group(1), [inline.group(2)]
+        elif is_heading(line):
+            if body:
+                yield heading, "\n".join(body)
+            heading, body = line.rstrip(":"), []
+        else:
+            body.append(line)
+    if body:
+        yield heading, "\n".join(body)
+
+
+def iter_records(source, min_words=0):
+    """Yield one ``{"paper_id", "section", "text", "label"}`` record per paper section in ``source``."""
+    for paper in read_papers(source):
+        for section, body in split_sections(clean_text(paper["text"])):
+            if len(body.split()) >= min_words:
+                yield {
+                    "paper_id": paper["id"],
+                    "section": section,
+                    "text": body,
+                    "label": paper["label"],
+                }
+
+
+def held_out_papers(source, eval_fraction=0.1):
+    """
+    Ids of the labelled papers in ``source`` held out for evaluation.
+
+    Papers are ordered by a hash of their id and the first ``eval_fraction`` of
+    them (at least one, and never all) are held out, so the split is
+    deterministic and doesn't depend on the order papers are stored in. Only
+    the ids are kept in memory.
+    """
+    ids = sorted(
+        {paper["id"] for paper in read_papers(source) if paper["label"] is not None},
+        key=lambda paper_id: hashlib.blake2b(str(paper_id).encode(), digest_size=8).digest(),
+    )
+    if len(ids) < 2:
+        return set()
+    return set(ids[:min(len(ids) - 1, max(1, round(eval_fraction * len(ids))))])
+
+
+def labelled_records(source, split, held_out=None, min_words=5):
+    """
+    Labelled section records of ``source`` for the "train" or "eval" split.
+
+    The split is by paper (see ``held_out_papers``, computed if ``held_out``
+    isn't given): a paper's sections all share its label, so splitting them
+    between training and evaluation would leak the label into the eval score.
+    """
+    if held_out is None:
+        held_out = held_out_papers(source)
+    for record in iter_records(source, min_words):
+        if record["label"] is not None and (record["paper_id"] in held_out) == (split == "eval"):
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", help="directory or JSONL file of papers")
+    parser.add_argument("--min-words", type=int, default=0, help="skip shorter sections")
+    args = parser.parse_args()
+    for record in iter_records(args.source, args.min_words):
+        sys.stdout.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Prometheus-style metrics for the ai-model service.
+
+A small in-process registry rendered in the Prometheus text format by
+``GET /metrics``, so no client library is needed. Histograms are cumulative
+like Prometheus's own; gauges and counters can read their value from a
+callback at scrape time (queue depth, cache hits).
+
+Each process keeps its own metrics: behind ``serve.py`` a scrape is answered
+by whichever worker accepts it, and its series carry that worker's ``pid``.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond tokenization up to multi-second documents
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 384, 512)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self, base_labels):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return lines + list(self.samples(base_labels))
+
+
+class Gauge(Metric):
+    """A value that is set directly or, with ``function``, read at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, function=None):
+        super().__init__(name, help)
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, base_labels):
+        value = self.function() if self.function is not None else self.value
+        yield f"{self.name}{format_labels(base_labels)} {format_value(value)}"
+
+
+class Counter(Gauge):
+    """
+    A total that only goes up, named ``*_total``, so ``rate()`` and
+    ``increase()`` handle its reset when the process restarts.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, function=None):
+        if not name.endswith("_total"):
+            raise ValueError(f"Counter {name} should be named *_total")
+        super().__init__(name, help, function)
+
+    def set(self, value):
+        raise TypeError("Counters only go up, use inc()")
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self):
+        """``(count, sum)`` of each series, keyed by its label values."""
+        with self._lock:
+            return {
+                tuple(value for _, value in key): (sum(counts), total)
+                for key, (counts, total) in self._series.items()
+            }
+
+    def samples(self, base_labels):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            labels = base_labels + key
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = format_labels(labels + (("le", format_value(bound)),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        base_labels = (("pid", os.getpid()),)
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render(base_labels)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "aimodel_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    labelnames=("path", "status"),
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "aimodel_stage_duration_seconds",
+    "Time spent in each stage of scoring: parse, tokenize, h2d, forward, postprocess, serialize.",
+    labelnames=("stage",),
+))
+TOKEN_LENGTH = registry.register(Histogram(
+    "aimodel_input_tokens",
+    "Tokens per scored input, after truncation.",
+    buckets=TOKEN_BUCKETS,
+))
+BATCH_SIZE = registry.register(Histogram(
+    "aimodel_batch_size",
+    "Inputs per forward pass.",
+    buckets=BATCH_BUCKETS,
+))
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording ``REQUEST_SECONDS`` per route.
+
+    The time to the response headers is also sent back as
+    ``Server-Timing: app;dur=<ms>``, which lets a caller tell time spent in
+    this service from time spent getting to it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                # Label by route template so unknown paths can't create series
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(
+                    elapsed,
+                    path=getattr(route, "path", "unmatched"),
+                    status=message["status"],
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"app;dur={elapsed * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,121 @@
+"""
+One-time tokenization of the training corpus into memory-mappable arrays.
+
+    python pretokenize.py data/papers.jsonl data/tokenized
+
+Papers are split into ``train`` and ``eval`` by paper (see
+``ingest.held_out_papers``). For each split the output directory holds:
+
+- ``input_ids.bin``  every example's token ids back to back (uint16 when the
+  vocabulary fits, otherwise int32), unpadded
+- ``offsets.npy``    int64 start of each example in ``input_ids.bin``, plus a
+  final end offset
+- ``labels.npy``     float32 label of each example
+- ``meta.json``      dtype, tokenizer and settings the arrays were built with
+
+Attention masks are not stored: without padding every stored token is
+attended to, so a mask is all ones up to the example's length. Sections longer
+than ``max_length`` become several overlapping windows (``stride`` tokens of
+overlap) instead of being truncated.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+from transformers import AutoTokenizer
+
+import settings
+from ingest import held_out_papers, labelled_records
+
+META = "meta.json"
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_split(records, tokenizer, output_dir, max_length, stride, chunk_size=256):
+    """Tokenize ``records`` (dicts with "text" and "label") into ``output_dir``; returns the example count."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stride = min(stride, max_length // 2)
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max else np.int32
+    offsets, labels = [0], []
+    with open(output_dir / "input_ids.bin", "wb") as ids_file:
+        for chunk in _chunks(records, chunk_size):
+            encodings = tokenizer(
+                [record["text"] for record in chunk],
+                truncation=True,
+                max_length=max_length,
+                stride=stride,
+                return_overflowing_tokens=True,
+            )
+            for input_ids, sample in zip(encodings["input_ids"], encodings["overflow_to_sample_mapping"]):
+                ids_file.write(np.asarray(input_ids, dtype=dtype).tobytes())
+                offsets.append(offsets[-1] + len(input_ids))
+                labels.append(chunk[sample]["label"])
+    np.save(output_dir / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    np.save(output_dir / "labels.npy", np.asarray(labels, dtype=np.float32))
+    meta = {
+        "dtype": np.dtype(dtype).name,
+        "examples": len(labels),
+        "tokens": offsets[-1],
+        "tokenizer": tokenizer.name_or_path,
+        "max_length": max_length,
+        "stride": stride,
+    }
+    (output_dir / META).write_text(json.dumps(meta, indent=2))
+    return len(labels)
+
+
+def pretokenize(
+    source,
+    output_dir,
+    tokenizer=None,
+    max_length=settings.MAX_LENGTH,
+    stride=settings.LONG_DOC_STRIDE,
+    eval_fraction=settings.EVAL_FRACTION,
+):
+    """
+    Write the train and eval splits of ``source`` to ``output_dir/train`` and
+    ``output_dir/eval``, holding out ``eval_fraction`` of the papers.
+    """
+    tokenizer = tokenizer or AutoTokenizer.from_pretrained(settings.BASE_MODEL)
+    held_out = held_out_papers(source, eval_fraction)
+    return {
+        split: write_split(
+            labelled_records(source, split, held_out), tokenizer, Path(output_dir) / split, max_length, stride
+        )
+        for split in ("train", "eval")
+    }
+
+
+def is_pretokenized(path):
+    return (Path(path) / "train" / META).exists()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", help="JSONL file or directory of labelled papers")
+    parser.add_argument("output_dir")
+    parser.add_argument("--max-length", type=int, default=settings.MAX_LENGTH)
+    parser.add_argument("--stride", type=int, default=settings.LONG_DOC_STRIDE)
+    parser.add_argument("--eval-fraction", type=float, default=settings.EVAL_FRACTION)
+    args = parser.parse_args()
+    counts = pretokenize(
+        args.source, args.output_dir, max_length=args.max_length, stride=args.stride,
+        eval_fraction=args.eval_fraction,
+    )
+    print(f"Wrote {counts['train']} training and {counts['eval']} evaluation examples to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+On-demand profiling of the inference path, started from ``POST /admin/profile``.
+
+A capture runs the torch profiler for the next ``requests`` scoring requests
+or ``seconds`` seconds, whichever ends first, and writes three files under
+``settings.PROFILE_DIR/<capture id>/``:
+
+    trace.json      Chrome trace (chrome://tracing or ui.perfetto.dev)
+    stacks.txt      folded stacks with self time in microseconds, for
+                    flamegraph.pl or speedscope
+    summary.json    self and total CPU time per operator and per stage
+                    (tokenize, h2d, forward, postprocess, plus parse and
+                    serialize on the event loop), also per request
+
+The torch profiler only records operators on the thread that started it, so
+while a capture runs every forward pass, tokenization and source lookup is
+sent to the profiler's own thread (``Profiler.executor``) instead of the event
+loop's default executor. The micro-batcher runs one batch at a time anyway.
+Concurrent batch and document requests queue behind each other until the
+capture ends.
+
+When nothing is being captured, the overhead is a flag check per request and
+per stage. Each worker under serve.py profiles itself; the id of a capture
+includes its pid.
+
+Two captures, e.g. of different model versions, can be compared with
+
+    python profiling.py compare PROFILE_DIR/<id>/summary.json PROFILE_DIR/<id>/summary.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+import torch
+from torch.profiler import ProfilerActivity, record_function
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TRACE = "trace.json"
+STACKS = "stacks.txt"
+SUMMARY = "summary.json"
+FILES = (TRACE, STACKS, SUMMARY)
+
+# Routes whose requests count towards a capture's ``requests``
+PROFILED_PATHS = ("/predict_confidence",)
+
+# Addresses in frame names ("<built-in method get of ... at 0x7f...>") differ
+# between processes, and would keep stacks of two captures from lining up
+ADDRESS = re.compile(r" at 0x[0-9a-f]+")
+
+# Set while a capture runs, so stages can be annotated in the trace
+capturing = False
+_NO_REGION = nullcontext()
+
+
+def region(name):
+    """A named range in the trace while capturing, otherwise nothing."""
+    return record_function(name) if capturing else _NO_REGION
+
+
+def folded_stacks(events):
+    """
+    Self time in microseconds of each call stack in a Chrome trace's complete
+    events, keyed by the stack's frames joined with ``;`` from the root.
+    """
+    stacks = defaultdict(float)
+    threads = defaultdict(list)
+    for event in events:
+        # The profiler's own span ("Trace") would be everybody's parent
+        if event.get("ph") == "X" and event.get("cat") != "Trace" and "dur" in event:
+            threads[event.get("pid"), event.get("tid")].append(event)
+    for thread_events in threads.values():
+        # Parents start no later and last longer than their children
+        thread_events.sort(key=lambda event: (event["ts"], -event["dur"]))
+        open_frames = []
+        for event in thread_events:
+            start, end = event["ts"], event["ts"] + event["dur"]
+            while open_frames and open_frames[-1][0] <= start:
+                open_frames.pop()
+            name = ADDRESS.sub("", event["name"]).replace(";", ",")
+            path = open_frames[-1][1] + ";" + name if open_frames else name
+            stacks[path] += event["dur"]
+            if open_frames:
+                stacks[open_frames[-1][1]] -= event["dur"]
+            open_frames.append((end, path))
+    return {path: self_time for path, self_time in stacks.items() if self_time > 0}
+
+
+def operator_summary(profile, requests):
+    """CPU time per operator and annotated stage of a stopped profile, most self time first."""
+    rows = []
+    for average in profile.key_averages():
+        rows.append({
+            "name": average.key,
+            "region": bool(getattr(average, "is_user_annotation", False)),
+            "calls": average.count,
+            "self_cpu_ms": average.self_cpu_time_total / 1000,
+            "cpu_total_ms": average.cpu_time_total / 1000,
+            "self_cpu_ms_per_request": average.self_cpu_time_total / 1000 / max(requests, 1),
+        })
+    return sorted(rows, key=lambda row: row["self_cpu_ms"], reverse=True)
+
+
+def stage_totals():
+    return {stage: totals for (stage,), totals in STAGE_SECONDS.totals().items()}
+
+
+class Profiler:
+    def __init__(self, directory, keep=20):
+        self.directory = Path(directory)
+        self.keep = keep
+        self.capture = None
+        self.active = False
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+        # Set from the first check until the capture is active, so two
+        # requests can't both start one
+        self._starting = False
+        self._profile = None
+        self._done = None
+        self._task = None
+
+    @property
+    def executor(self):
+        """Where model work goes: the profiler's thread while capturing, else the loop's default (``None``)."""
+        return self._thread if self.active else None
+
+    async def start(self, requests, seconds, info, with_stack=True, record_shapes=False):
+        """
+        Capture the next ``requests`` scoring requests, for at most ``seconds``.
+
+        ``info`` (model version, checkpoint...) is stored with the summary.
+        Returns the capture's state; ``RuntimeError`` if one is running or starting.
+        """
+        if self._starting:
+            raise RuntimeError("A capture is being started")
+        if self.active:
+            raise RuntimeError(f"Capture {self.capture['id']} is still running")
+        self._starting = True
+        try:
+            return await self._start(requests, seconds, info, with_stack, record_shapes)
+        finally:
+            self._starting = False
+
+    async def _start(self, requests, seconds, info, with_stack, record_shapes):
+        loop = asyncio.get_running_loop()
+        started_at = time.time()
+        capture = {
+            "id": time.strftime("%Y%m%d-%H%M%S", time.gmtime(started_at)) + f"-{os.getpid()}",
+            "status": "capturing",
+            "pid": os.getpid(),
+            **info,
+            "max_requests": requests,
+            "max_seconds": seconds,
+            "with_stack": with_stack,
+            "record_shapes": record_shapes,
+            "started_at": started_at,
+            "requests": 0,
+        }
+        profile = torch.profiler.profile(
+            activities=[ProfilerActivity.CPU]
+            + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else []),
+            record_shapes=record_shapes,
+            with_stack=with_stack,
+        )
+        # Started and stopped on the profiler's thread, which is the one it records
+        await loop.run_in_executor(self._thread, profile.start)
+        self.capture, self._profile = capture, profile
+        self._stages = stage_totals()
+        self._started = time.perf_counter()
+        self._done = asyncio.Event()
+        self.active = True
+        global capturing
+        capturing = True
+        self._task = asyncio.create_task(self._finish(seconds))
+        logger.info("Profiling the next %d requests or %gs as %s", requests, seconds, capture["id"])
+        return dict(capture)
+
+    def request_finished(self):
+        """Count a scoring request that finished while capturing."""
+        if not self.active or self._done.is_set():
+            return
+        self.capture["requests"] += 1
+        if self.capture["requests"] >= self.capture["max_requests"]:
+            self._done.set()
+
+    async def _finish(self, seconds):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        capture, profile = self.capture, self._profile
+        self.active = False
+        global capturing
+        capturing = False
+        capture.update(status="writing", seconds=time.perf_counter() - self._started)
+        capture["stages"] = self._stage_deltas(capture["requests"])
+        try:
+            # Queued behind whatever was already sent to the profiler's thread
+            await loop.run_in_executor(self._thread, self._write, profile, capture)
+        except Exception as exc:
+            logger.exception("Writing profile %s failed", capture["id"])
+            capture.update(status="failed", error=str(exc))
+            return
+        finally:
+            self._profile = None
+        capture.update(status="done", finished_at=time.time())
+        logger.info("Profile %s written to %s", capture["id"], self.directory / capture["id"])
+
+    def _stage_deltas(self, requests):
+        stages = {}
+        for stage, (count, total) in stage_totals().items():
+            before_count, before_total = self._stages.get(stage, (0, 0.0))
+            if count > before_count:
+                stages[stage] = {
+                    "count": count - before_count,
+                    "seconds": total - before_total,
+                    "ms_per_request": (total - before_total) * 1000 / max(requests, 1),
+                }
+        return stages
+
+    def _write(self, profile, capture):
+        profile.stop()
+        directory = self.directory / capture["id"]
+        directory.mkdir(parents=True, exist_ok=True)
+        profile.export_chrome_trace(str(directory / TRACE))
+        events = json.loads((directory / TRACE).read_text())["traceEvents"]
+        stacks = sorted(folded_stacks(events).items())
+        (directory / STACKS).write_text("".join(f"{path} {round(self_time)}\n" for path, self_time in stacks))
+        summary = {**capture, "status": "done", "operators": operator_summary(profile, capture["requests"])}
+        (directory / SUMMARY).write_text(json.dumps(summary, indent=2) + "\n")
+        self._prune()
+
+    def _prune(self):
+        for capture_id in self.list()[:-self.keep]:
+            shutil.rmtree(self.directory / capture_id, ignore_errors=True)
+
+    def list(self):
+        """Ids of the captures written, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.name for path in self.directory.iterdir() if (path / SUMMARY).exists())
+
+    def path(self, capture_id, name=SUMMARY):
+        """The file ``name`` of a written capture; ``FileNotFoundError`` if there is none."""
+        if name not in FILES or capture_id not in self.list():
+            raise FileNotFoundError(f"No {name} for capture {capture_id!r}")
+        return self.directory / capture_id / name
+
+    def state(self):
+        return {"capture": self.capture, "captures": self.list()}
+
+
+class ProfilingMiddleware:
+    """ASGI middleware counting the scoring requests that finish while a capture runs."""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.active or scope["type"] != "http" or not scope["path"].startswith(PROFILED_PATHS):
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.request_finished()
+
+
+def compare(before, after, limit=25):
+    """Print stage and operator times per request of two summaries side by side."""
+    print(f"{'':40} {before['model_version']:>14} {after['model_version']:>14}   ms/request")
+    print(f"{'requests':40} {before['requests']:>14} {after['requests']:>14}")
+    for stage in sorted(set(before["stages"]) | set(after["stages"])):
+        times = [summary["stages"].get(stage, {}).get("ms_per_request", 0.0) for summary in (before, after)]
+        print(f"{'stage ' + stage:40} {times[0]:14.3f} {times[1]:14.3f} {times[1] - times[0]:+10.3f}")
+    operators = [
+        {row["name"]: row["self_cpu_ms_per_request"] for row in summary["operators"] if not row["region"]}
+        for summary in (before, after)
+    ]
+    names = sorted(set(operators[0]) | set(operators[1]), key=lambda name: -max(times_of.get(name, 0) for times_of in operators))
+    for name in names[:limit]:
+        times = [times_of.get(name, 0.0) for times_of in operators]
+        print(f"{name[:40]:40} {times[0]:14.3f} {times[1]:14.3f} {times[1] - times[0]:+10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two profiles captured with POST /admin/profile.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare_parser = subparsers.add_parser("compare", help="stage and operator self time per request")
+    compare_parser.add_argument("before", type=Path, help="summary.json of the first capture")
+    compare_parser.add_argument("after", type=Path, help="summary.json of the second capture")
+    compare_parser.add_argument("--limit", type=int, default=25, help="operators to show")
+    args = parser.parse_args()
+    compare(json.loads(args.before.read_text()), json.loads(args.after.read_text()), args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Multi-process server for the confidence model.
+
+    python serve.py --workers 4 --port 8000
+
+``uvicorn --workers N`` would start N interpreters that each load their own
+copy of the checkpoint. Here the parent loads it once, moves the tensors into
+shared memory and then forks the workers, so every worker reads the same
+physical pages and a new worker costs only its interpreter and activations.
+All workers accept connections from one listening socket and the kernel
+spreads requests between them.
+
+The parent never scores anything: torch's OpenMP pool does not survive a fork,
+so it stays single threaded until the workers set their own thread counts. It
+restarts workers that die and stops them all on SIGTERM or SIGINT.
+
+On SIGHUP (sent by ``POST /admin/reload``) the parent loads the checkpoint that
+is now current and forks a new set of workers from it. The old workers are
+stopped gracefully once the new ones have warmed up, so a model is swapped
+without refusing or dropping requests. The parent writes how the reload is
+going to a file every worker reads, so ``GET /admin/model`` reports it
+whichever worker answers.
+
+CUDA can't be used from a forked process either, so on a GPU the model is
+served from a single process and ``--workers`` is ignored.
+"""
+import argparse
+import gc
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import uvicorn
+
+import aimodel
+import checkpoints
+import settings
+from engine import configure_threads, cpu_quota
+
+logger = logging.getLogger("serve")
+
+# Exit status of a worker whose app failed to start; not worth restarting
+STARTUP_FAILURE = 3
+# Handled by the supervisor loop: worker exits, reload, shutdown
+SUPERVISOR_SIGNALS = {signal.SIGCHLD, signal.SIGHUP, signal.SIGTERM, signal.SIGINT}
+
+
+def bind(host, port, backlog=2048):
+    # IPPROTO_TCP explicitly: asyncio only turns on TCP_NODELAY for accepted
+    # sockets that say they are TCP, and without it small responses wait on
+    # delayed ACKs (~40 ms)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, threads, log_level, ready_fd):
+    """Entry point of a forked worker; never returns."""
+    status = STARTUP_FAILURE
+    try:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, SUPERVISOR_SIGNALS)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        configure_threads(threads, settings.TORCH_INTER_OP_THREADS)
+        aimodel.supervisor_pid = os.getppid()
+        aimodel.on_ready = lambda: report_ready(ready_fd)
+        server = uvicorn.Server(uvicorn.Config(aimodel.app, log_level=log_level))
+        server.run(sockets=[sock])
+        if server.started:
+            status = 0
+    except Exception:
+        logger.exception("Worker %s crashed", os.getpid())
+    finally:
+        os._exit(status)
+
+
+def report_ready(ready_fd):
+    try:
+        os.write(ready_fd, b"1")
+    except BrokenPipeError:
+        # Only a reload waits for its workers to be ready
+        pass
+    os.close(ready_fd)
+
+
+def spawn(sock, threads, log_level):
+    """Fork a worker; returns its pid and a pipe it writes to once warmed up."""
+    ready_read, ready_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(ready_read)
+        run_worker(sock, threads, log_level, ready_write)
+    os.close(ready_write)
+    logger.info("Started worker %s", pid)
+    return pid, ready_read
+
+
+def wait_ready(ready_fds, timeout):
+    """Whether every worker reported ready within ``timeout`` seconds; closes the pipes."""
+    deadline = time.monotonic() + timeout
+    pending = set(ready_fds)
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select(list(pending), [], [], remaining)
+            for fd in readable:
+                if not os.read(fd, 1):
+                    # The worker exited before it was ready
+                    return False
+                pending.discard(fd)
+        return True
+    finally:
+        for fd in ready_fds:
+            os.close(fd)
+
+
+def load(intra_op_threads=1):
+    """Load the current checkpoint into this (the parent) process, ready to be shared with workers."""
+    # Let the previous model's objects be collected, then freeze the new ones
+    # so the collector in the workers doesn't write to (and un-share) their pages
+    gc.unfreeze()
+    aimodel.load_model(intra_op_threads=intra_op_threads)
+    aimodel.served.engine.share_memory()
+    gc.collect()
+    gc.freeze()
+
+
+def restore_current(model):
+    """After a failed reload, point ``CURRENT`` back at the version still being served."""
+    version = checkpoints.version_of(settings.MODEL_DIR, model.engine.model_dir)
+    if version is not None:
+        checkpoints.publish(settings.MODEL_DIR, version)
+
+
+def serve(host="0.0.0.0", port=8000, workers=settings.SERVE_WORKERS, log_level="info"):
+    threads = settings.TORCH_INTRA_OP_THREADS or max(1, cpu_quota() // workers)
+    aimodel.load_model(intra_op_threads=1)
+    if aimodel.served.engine.device.type != "cpu":
+        logger.info("Serving from one process on %s", aimodel.served.engine.device)
+        uvicorn.run(aimodel.app, host=host, port=port, log_level=log_level)
+        return 0
+    aimodel.served.engine.share_memory()
+    gc.freeze()
+    sock = bind(host, port)
+    # Inherited by every worker forked from here on
+    state_dir = Path(tempfile.mkdtemp(prefix="aimodel-"))
+    aimodel.reload_state_path = state_dir / "reload.json"
+    logger.info(
+        "Serving model %s on %s:%s with %s workers, %s threads each",
+        aimodel.served.version, host, port, workers, threads,
+    )
+
+    # Signals are taken one at a time by the loop below rather than by handlers
+    signal.pthread_sigmask(signal.SIG_BLOCK, SUPERVISOR_SIGNALS)
+    pids = set()
+    for _ in range(workers):
+        pid, ready_fd = spawn(sock, threads, log_level)
+        os.close(ready_fd)
+        pids.add(pid)
+    retiring = set()
+    stopping = False
+    exit_code = 0
+
+    def stop():
+        for pid in pids | retiring:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload():
+        """
+        Replace every worker with one forked from the newly loaded checkpoint.
+
+        The new workers start accepting on the shared socket alongside the old
+        ones; once they have all warmed up the old ones are sent SIGTERM, which
+        makes uvicorn stop accepting and finish the requests it has.
+        """
+        previous = aimodel.served
+        state = {"status": "loading", "started_at": time.time()}
+        try:
+            state["checkpoint"] = checkpoints.resolve(settings.MODEL_DIR).name
+            aimodel.save_reload_state(aimodel.reload_state_path, state)
+            load()
+        except Exception as exc:
+            logger.exception("Loading the new model failed, keeping model %s", previous.version)
+            restore_current(previous)
+            state.update(status="failed", error=str(exc), finished_at=time.time())
+            aimodel.save_reload_state(aimodel.reload_state_path, state)
+            return
+        logger.info("Reloading: starting %s workers with model %s", workers, aimodel.served.version)
+        spawned = [spawn(sock, threads, log_level) for _ in range(workers)]
+        new_pids = {pid for pid, _ in spawned}
+        if wait_ready([fd for _, fd in spawned], settings.RELOAD_TIMEOUT):
+            retiring.update(pids)
+            pids.clear()
+            pids.update(new_pids)
+            state.update(status="idle", model_version=aimodel.served.version)
+        else:
+            logger.error("The new workers didn't become ready, keeping model %s", previous.version)
+            retiring.update(new_pids)
+            gc.unfreeze()
+            aimodel.serve_model(previous)
+            gc.freeze()
+            restore_current(previous)
+            state.update(status="failed", error="The new workers didn't become ready")
+        state["finished_at"] = time.time()
+        aimodel.save_reload_state(aimodel.reload_state_path, state)
+        for pid in retiring:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    while pids or retiring:
+        info = signal.sigwaitinfo(SUPERVISOR_SIGNALS)
+        if info.si_signo in (signal.SIGTERM, signal.SIGINT):
+            stopping = True
+            stop()
+        elif info.si_signo == signal.SIGHUP:
+            if not stopping:
+                reload()
+        # Reap every worker that has exited; several SIGCHLDs can arrive as one
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pids.clear()
+                retiring.clear()
+                break
+            if pid == 0:
+                break
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            pids.discard(pid)
+            if stopping:
+                continue
+            if os.waitstatus_to_exitcode(status) == STARTUP_FAILURE:
+                logger.error("Worker %s failed to start, shutting down", pid)
+                exit_code = 1
+                stopping = True
+                stop()
+            else:
+                logger.warning(
+                    "Worker %s exited with status %s, restarting it", pid, os.waitstatus_to_exitcode(status)
+                )
+                new_pid, ready_fd = spawn(sock, threads, log_level)
+                os.close(ready_fd)
+                pids.add(new_pid)
+    shutil.rmtree(state_dir, ignore_errors=True)
+    return exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the confidence model from several worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    raise SystemExit(serve(args.host, args.port, args.workers, args.log_level))
+
+
+if __name__ == "__main__":
+    main()
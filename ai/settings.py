@@ -0,0 +1,132 @@
+"""
+Settings for the ai-model service.
+
+Every value can be overridden with an environment variable of the same name,
+so the same image can be used for training and for serving.
+"""
+import os
+from pathlib import Path
+
+# Build paths inside the service like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent
+
+# Pre-trained weights that fine-tuning starts from.
+BASE_MODEL = os.environ.get("BASE_MODEL", "bert-base-uncased")
+
+# Labelled papers to train on: a JSONL file ({"id", "text", "label"} per line)
+# or a directory of them, read by ingest.py.
+TRAINING_DATA = Path(os.environ.get("TRAINING_DATA", BASE_DIR / "data" / "papers.jsonl"))
+
+# Where training writes the pre-tokenized form of TRAINING_DATA.
+TOKENIZED_DATA = Path(os.environ.get("TOKENIZED_DATA", BASE_DIR / "data" / "tokenized"))
+
+# Fraction of the labelled papers held out for evaluation during training.
+EVAL_FRACTION = float(os.environ.get("EVAL_FRACTION", 0.1))
+
+# Directory the training entry point writes to and the service loads from.
+# Each training run is a version under MODEL_DIR/versions, and the service
+# loads the one named in MODEL_DIR/CURRENT (see checkpoints.py).
+MODEL_DIR = Path(os.environ.get("MODEL_DIR", BASE_DIR / "model_output"))
+
+# Source attribution (sources.py): the passage index built for the served
+# checkpoint (by default sources/ inside its directory), how many passages to
+# return per statement, and how many words reference papers are split into
+# per passage.
+SOURCES_INDEX = Path(os.environ["SOURCES_INDEX"]) if os.environ.get("SOURCES_INDEX") else None
+SOURCES_TOP_K = int(os.environ.get("SOURCES_TOP_K", 3))
+SOURCE_PASSAGE_WORDS = int(os.environ.get("SOURCE_PASSAGE_WORDS", 120))
+# Indexes of at least SOURCES_IVF_MIN_PASSAGES passages are clustered when
+# built, and a lookup scans the SOURCES_NPROBE clusters nearest the statement
+# instead of every passage. More probes: better recall, slower lookups.
+SOURCES_IVF_MIN_PASSAGES = int(os.environ.get("SOURCES_IVF_MIN_PASSAGES", 20000))
+SOURCES_NPROBE = int(os.environ.get("SOURCES_NPROBE", 16))
+
+# Longest input (in tokens) the model is given.
+MAX_LENGTH = int(os.environ.get("MAX_LENGTH", 512))
+
+# Dynamic micro-batching of concurrent /predict_confidence requests.
+# BATCH_MAX_SIZE=1 disables batching.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+# Admission control (admission.py), per worker process. Requests are charged
+# their token count, at most ADMISSION_MAX_TOKENS are being scored at once,
+# and up to ADMISSION_MAX_QUEUE requests per priority lane wait for room; more
+# are rejected with 429, and one that waits over ADMISSION_MAX_WAIT_MS with
+# 503. /predict_confidence is interactive and goes ahead of the batch and
+# document endpoints, which are bulk; a request can pick its lane with an
+# X-Priority: interactive|bulk header. ADMISSION_MAX_TOKENS=0 disables it.
+ADMISSION_MAX_TOKENS = int(os.environ.get("ADMISSION_MAX_TOKENS", 4096))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_MAX_WAIT_MS = float(os.environ.get("ADMISSION_MAX_WAIT_MS", 2000))
+
+# Bucket size for /predict_confidence/batch, inputs are sorted by token length
+# and scored this many at a time.
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 32))
+
+# Torch thread pools. Intra-op threads default to the container's CPU quota;
+# inter-op threads default to 1 because requests are already batched.
+TORCH_INTRA_OP_THREADS = int(os.environ.get("TORCH_INTRA_OP_THREADS") or 0) or None
+TORCH_INTER_OP_THREADS = int(os.environ.get("TORCH_INTER_OP_THREADS") or 1)
+
+# Worker processes started by serve.py. They share one copy of the weights,
+# and unless TORCH_INTRA_OP_THREADS is set each gets an equal share of the
+# CPU quota for its intra-op threads.
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", 1))
+
+# Which weights to serve: "fp32" (the checkpoint as trained), or the CPU
+# variants written by export.py, "int8" (dynamic quantization) or "onnx".
+MODEL_VARIANT = os.environ.get("MODEL_VARIANT", "fp32")
+
+# Cascade scoring (cascade.py), on with CASCADE=1: the student distilled into
+# CASCADE_STUDENT_DIR scores every statement first, and only scores within
+# CASCADE_BAND of CASCADE_THRESHOLD are re-scored by the full model. The
+# student's own source index (sources.py build --model-dir) is used for the
+# statements it answers, if it has one.
+CASCADE = os.environ.get("CASCADE", "0") == "1"
+CASCADE_STUDENT_DIR = Path(os.environ.get("CASCADE_STUDENT_DIR", MODEL_DIR / "student"))
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", 0.5))
+CASCADE_BAND = float(os.environ.get("CASCADE_BAND", 0.15))
+
+# Score cache. CACHE_SIZE bounds the in-process LRU (0 disables it);
+# CACHE_REDIS_URL adds a shared tier, e.g. redis://redis:6379/0.
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", 10000))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+# Near-duplicate reuse (dedup.py). A statement whose word pairs are at least
+# DEDUP_THRESHOLD similar (estimated Jaccard) to one of the last
+# DEDUP_MAX_ENTRIES statements scored, with the same negations and numbers,
+# gets that statement's score and sources. Under 300 bytes per entry; 0
+# disables it.
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+DEDUP_MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", 200000))
+
+# Token ids of this many recently scored texts are kept, so repeated sections
+# (funding statements, conflict of interest declarations) aren't re-tokenized.
+# 0 disables it.
+TOKENIZER_CACHE_SIZE = int(os.environ.get("TOKENIZER_CACHE_SIZE", 4096))
+
+# Pooled embeddings of this many recently scored texts are kept (3 KB each for
+# BERT base), so the source lookup reuses the forward pass that scored the
+# statement instead of running a second one. 0 disables it.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096))
+
+# Long-document scoring (/predict_confidence/document): windows of MAX_LENGTH
+# tokens overlapping by LONG_DOC_STRIDE tokens, combined with LONG_DOC_REDUCER
+# ("mean", "max" or "length_weighted") unless the request picks one.
+LONG_DOC_STRIDE = int(os.environ.get("LONG_DOC_STRIDE", 128))
+LONG_DOC_REDUCER = os.environ.get("LONG_DOC_REDUCER", "mean")
+
+# Bearer token for the /admin endpoints (model reload). They are disabled
+# when it is unset.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# How long serve.py waits for the workers of a reloaded model to load and warm
+# up before giving up and keeping the old ones.
+RELOAD_TIMEOUT = float(os.environ.get("RELOAD_TIMEOUT", 300))
+
+# Profiles captured with POST /admin/profile (profiling.py) are written under
+# PROFILE_DIR, keeping the latest PROFILE_KEEP. A capture lasts at most
+# PROFILE_MAX_SECONDS.
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", MODEL_DIR / "profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 300))
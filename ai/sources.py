@@ -0,0 +1,313 @@
+"""
+Source attribution: the reference passages closest to a statement.
+
+Reference papers (the training corpus by default) are split into passages and
+embedded offline with the served checkpoint:
+
+    python sources.py build data/papers.jsonl
+    python sources.py query "Acupuncture relieves lower back pain"
+
+``build`` writes ``settings.SOURCES_INDEX``:
+
+- ``embeddings.f32``: one L2-normalised float32 row per passage
+- ``passages.jsonl``: ``{"paper_id", "section", "text"}`` per passage, with the
+  byte offset of each line (and of the end of the file) in ``offsets.npy``
+- ``meta.json``: passage count, embedding size and the checkpoint it belongs to
+
+The service memory-maps the embeddings instead of reading them, so startup is
+instant and worker processes share the pages. Only the top-k passages are ever
+read from ``passages.jsonl``.
+
+Small indexes are searched exhaustively, one matrix product against every
+passage. That is bound by memory bandwidth (300 MB of embeddings per query at
+100k BERT-base passages), so from ``SOURCES_IVF_MIN_PASSAGES`` passages the
+build also clusters the embeddings (spherical k-means, ``centroids.npy``) and
+stores them grouped by cluster, each cluster a contiguous block of rows
+(``list_offsets.npy``, with ``ids.npy`` mapping rows back to passages). A
+lookup then only scans the ``SOURCES_NPROBE`` clusters nearest the query.
+
+Embeddings from different weights aren't comparable, so an index built for
+another checkpoint is ignored until it is rebuilt.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+import checkpoints
+import settings
+from ingest import iter_records
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS = "embeddings.f32"
+PASSAGES = "passages.jsonl"
+OFFSETS = "offsets.npy"
+META = "meta.json"
+CENTROIDS = "centroids.npy"
+LIST_OFFSETS = "list_offsets.npy"
+IDS = "ids.npy"
+
+
+def weights_fingerprint(model_dir):
+    """
+    Identifies the fp32 weights in ``model_dir``.
+
+    Unlike ``checkpoint_version`` it ignores exported variants, which are
+    derived from the same weights and embed text (near enough) the same way.
+    """
+    model_dir = Path(model_dir)
+    digest = hashlib.sha256((model_dir / "config.json").read_bytes())
+    for path in sorted(model_dir.glob("*")):
+        if path.suffix in (".safetensors", ".bin"):
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+def split_passages(text, words=settings.SOURCE_PASSAGE_WORDS):
+    """Consecutive chunks of at most ``words`` words; a short tail joins the chunk before it."""
+    tokens = text.split()
+    chunks = [tokens[start:start + words] for start in range(0, len(tokens), words)]
+    if len(chunks) > 1 and len(chunks[-1]) < words // 4:
+        tail = chunks.pop()
+        chunks[-1] += tail
+    return [" ".join(chunk) for chunk in chunks]
+
+
+def iter_passages(source, words=settings.SOURCE_PASSAGE_WORDS, min_words=5):
+    for record in iter_records(source, min_words=min_words):
+        for text in split_passages(record["text"], words):
+            yield {"paper_id": record["paper_id"], "section": record["section"], "text": text}
+
+
+def top_k(scores, k):
+    """Positions and values of the ``k`` largest entries of each row of ``scores``, best first."""
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def assign_lists(embeddings, centroids, chunk=65536):
+    """Nearest centroid of every embedding row."""
+    return np.concatenate([
+        np.argmax(np.asarray(embeddings[start:start + chunk]) @ centroids.T, axis=1)
+        for start in range(0, len(embeddings), chunk)
+    ])
+
+
+def train_centroids(embeddings, lists, iterations=10, seed=0):
+    """Spherical k-means on a sample of ``embeddings``; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), lists * 64)
+    sample = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        members, starts = np.unique(assignment[order], return_index=True)
+        # Clusters left empty keep their previous centroid
+        centroids[members] = np.add.reduceat(sample[order], starts)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids
+
+
+def build_lists(path, lists=None, iterations=10, seed=0):
+    """
+    Cluster the embeddings of the index at ``path`` and regroup them by cluster.
+
+    ``lists`` defaults to the square root of the passage count.
+    """
+    path = Path(path)
+    meta = json.loads((path / META).read_text())
+    shape = (meta["count"], meta["dim"])
+    embeddings = np.memmap(path / EMBEDDINGS, dtype=np.float32, mode="r", shape=shape)
+    lists = lists or max(1, int(np.sqrt(meta["count"])))
+    centroids = train_centroids(embeddings, lists, iterations, seed)
+    assignment = assign_lists(embeddings, centroids)
+    ids = np.argsort(assignment, kind="stable")
+    sizes = np.bincount(assignment, minlength=lists)
+    regrouped = path / (EMBEDDINGS + ".tmp")
+    with open(regrouped, "wb") as output:
+        for start in range(0, len(ids), 65536):
+            np.asarray(embeddings[ids[start:start + 65536]]).tofile(output)
+    del embeddings
+    regrouped.replace(path / EMBEDDINGS)
+    np.save(path / CENTROIDS, centroids)
+    np.save(path / LIST_OFFSETS, np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64))
+    np.save(path / IDS, ids.astype(np.int64))
+    meta["lists"] = lists
+    (path / META).write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def build(source, output, engine, words=settings.SOURCE_PASSAGE_WORDS, batch_size=settings.BULK_BATCH_SIZE):
+    """Embed the passages of ``source`` with ``engine`` and write an index to ``output``."""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    offsets = []
+    count = dim = 0
+    with open(output / PASSAGES, "wb") as passages, open(output / EMBEDDINGS, "wb") as embeddings:
+
+        def flush(batch):
+            nonlocal count, dim
+            vectors = engine.embed([passage["text"] for passage in batch])
+            vectors.astype(np.float32).tofile(embeddings)
+            dim = vectors.shape[1]
+            for passage in batch:
+                offsets.append(passages.tell())
+                passages.write(json.dumps(passage).encode() + b"\n")
+            count += len(batch)
+
+        batch = []
+        for passage in iter_passages(source, words):
+            batch.append(passage)
+            if len(batch) == batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        offsets.append(passages.tell())
+    np.save(output / OFFSETS, np.asarray(offsets, dtype=np.int64))
+    meta = {
+        "count": count,
+        "dim": dim,
+        "passage_words": words,
+        "weights": weights_fingerprint(engine.model_dir),
+        "source": str(source),
+    }
+    (output / META).write_text(json.dumps(meta, indent=2))
+    for stale in (CENTROIDS, LIST_OFFSETS, IDS):
+        (output / stale).unlink(missing_ok=True)
+    if count >= settings.SOURCES_IVF_MIN_PASSAGES:
+        meta = build_lists(output)
+    return meta
+
+
+class SourceIndex:
+    _fd = None
+
+    def __init__(self, path):
+        path = Path(path)
+        self.path = path
+        self.meta = json.loads((path / META).read_text())
+        shape = (self.meta["count"], self.meta["dim"])
+        self.embeddings = np.memmap(path / EMBEDDINGS, dtype=np.float32, mode="r", shape=shape)
+        self.offsets = np.load(path / OFFSETS, mmap_mode="r")
+        self.centroids = self.list_offsets = self.ids = None
+        if (path / CENTROIDS).exists():
+            self.centroids = np.load(path / CENTROIDS)
+            self.list_offsets = np.load(path / LIST_OFFSETS)
+            self.ids = np.load(path / IDS, mmap_mode="r")
+        # Read with pread, which doesn't move a file position that threads and
+        # forked workers would otherwise share
+        self._fd = os.open(path / PASSAGES, os.O_RDONLY)
+
+    @classmethod
+    def open(cls, path, model_dir):
+        """The index at ``path`` if it exists and was built for ``model_dir``, otherwise ``None``."""
+        if not (Path(path) / META).exists():
+            logger.warning("No source index in %s, run `python sources.py build` to create one", path)
+            return None
+        index = cls(path)
+        if index.meta["weights"] != weights_fingerprint(model_dir):
+            logger.warning("The source index in %s was built for other weights, rebuild it", path)
+            index.close()
+            return None
+        return index
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        # A replaced model's index is dropped once its last request is done
+        self.close()
+
+    def search(self, queries, k=settings.SOURCES_TOP_K, nprobe=settings.SOURCES_NPROBE):
+        """
+        Passage indices and cosine similarities of the ``k`` nearest passages
+        to each query row, as one pair of arrays per query.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.meta["dim"])
+        k = min(k, len(self))
+        if k == 0:
+            return [np.empty(0, dtype=np.int64)] * len(queries), [np.empty(0)] * len(queries)
+        if self.centroids is None:
+            # Exhaustive: one matrix product for the whole batch
+            return tuple(map(list, top_k(queries @ self.embeddings.T, k)))
+        results = [self._search_lists(query, k, nprobe) for query in queries]
+        return [indices for indices, _ in results], [scores for _, scores in results]
+
+    def _search_lists(self, query, k, nprobe):
+        (lists,), _ = top_k((self.centroids @ query)[None], min(nprobe, len(self.centroids)))
+        # Scan the probed clusters in file order, each a contiguous block of rows
+        ranges = [(self.list_offsets[cluster], self.list_offsets[cluster + 1]) for cluster in np.sort(lists)]
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([self.embeddings[start:end] @ query for start, end in ranges])
+        (positions,), (top_scores,) = top_k(scores[None], min(k, len(rows)))
+        return np.asarray(self.ids[rows[positions]]), top_scores
+
+    def passage(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return json.loads(os.pread(self._fd, end - start, start))
+
+    def passages(self, indices, scores):
+        """The passages at ``indices``, each with its ``score``."""
+        return [{**self.passage(index), "score": float(score)} for index, score in zip(indices, scores)]
+
+    def lookup(self, queries, k=settings.SOURCES_TOP_K):
+        """The ``k`` nearest passages to each query, each with its ``score``."""
+        indices, scores = self.search(queries, k)
+        return [self.passages(row, row_scores) for row, row_scores in zip(indices, scores)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the source passage index.")
+    parser.add_argument("--model-dir", default=settings.MODEL_DIR)
+    parser.add_argument("--index", help="index directory (default: SOURCES_INDEX, or sources/ in the checkpoint)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="embed reference papers into an index")
+    build_parser.add_argument("source", nargs="?", default=settings.TRAINING_DATA)
+    build_parser.add_argument("--passage-words", type=int, default=settings.SOURCE_PASSAGE_WORDS)
+    query_parser = commands.add_parser("query", help="print the nearest passages to a statement")
+    query_parser.add_argument("text")
+    query_parser.add_argument("-k", type=int, default=settings.SOURCES_TOP_K)
+    args = parser.parse_args()
+
+    from engine import InferenceEngine
+
+    args.model_dir = checkpoints.resolve(args.model_dir)
+    if args.index is None:
+        model_dir_given = args.model_dir != checkpoints.resolve(settings.MODEL_DIR)
+        args.index = (
+            settings.SOURCES_INDEX if settings.SOURCES_INDEX and not model_dir_given
+            else args.model_dir / "sources"
+        )
+
+    engine = InferenceEngine(args.model_dir, variant="fp32")
+    if args.command == "build":
+        meta = build(args.source, args.index, engine, args.passage_words)
+        print(f"Indexed {meta['count']} passages from {args.source} into {args.index}")
+    else:
+        index = SourceIndex.open(args.index, args.model_dir)
+        if index is None:
+            raise SystemExit(1)
+        for passage in index.lookup(engine.embed([args.text]), args.k)[0]:
+            print(json.dumps(passage))
+
+
+if __name__ == "__main__":
+    main()
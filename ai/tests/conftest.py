@@ -0,0 +1,28 @@
+import pytest
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+WORDS = (
+    "reiki heals chronic back pain yoga cures asthma in adults homeopathy does not reduce mortality "
+    "by the of a and trial patients randomised placebo controlled study showed effect"
+).split()
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory):
+    """A two-layer BERT regressor saved the way training.py saves a checkpoint, built without a download."""
+    model_dir = tmp_path_factory.mktemp("tiny-bert")
+    vocab = model_dir / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS]) + "\n")
+    BertTokenizerFast(str(vocab)).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=5 + len(WORDS),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        num_labels=1,
+    )
+    BertForSequenceClassification(config).save_pretrained(model_dir, safe_serialization=True)
+    return model_dir
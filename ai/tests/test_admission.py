@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from admission import BULK, INTERACTIVE, AdmissionController, Overloaded
+
+
+async def hold(controller, cost, lane, release, admitted, name, shed=True):
+    async with controller.admit(cost, lane, shed=shed):
+        admitted.append(name)
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_requests_within_capacity_are_admitted_at_once():
+    async def run():
+        controller = AdmissionController(capacity=100, max_queue=4, max_wait=1)
+        release, admitted = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, 40, INTERACTIVE, release, admitted, n)) for n in range(2)]
+        await settle()
+        assert admitted == [0, 1] and controller.in_flight == 80
+        release.set()
+        await asyncio.gather(*tasks)
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_interactive_requests_go_ahead_of_bulk():
+    async def run():
+        controller = AdmissionController(capacity=100, max_queue=4, max_wait=5)
+        first, rest, admitted = asyncio.Event(), asyncio.Event(), []
+        running = asyncio.create_task(hold(controller, 100, INTERACTIVE, first, admitted, "running"))
+        await settle()
+        waiting = [
+            asyncio.create_task(hold(controller, 50, BULK, rest, admitted, "bulk")),
+            asyncio.create_task(hold(controller, 50, INTERACTIVE, rest, admitted, "interactive")),
+        ]
+        await settle()
+        assert (controller.queued(BULK), controller.queued(INTERACTIVE)) == (1, 1)
+        first.set()
+        await settle()
+        assert admitted == ["running", "interactive", "bulk"]
+        rest.set()
+        await asyncio.gather(running, *waiting)
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_shed_with_429_and_retry_after():
+    async def run():
+        controller = AdmissionController(capacity=10, max_queue=1, max_wait=5)
+        release, admitted = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, 10, INTERACTIVE, release, admitted, n)) for n in range(2)]
+        await settle()
+        with pytest.raises(Overloaded) as shed:
+            async with controller.admit(10):
+                pass
+        assert shed.value.status == 429
+        assert shed.value.retry_after >= 1
+        # Work of an accepted request queues however long the queue is
+        unshed = asyncio.create_task(hold(controller, 10, INTERACTIVE, release, admitted, "unshed", shed=False))
+        await settle()
+        assert controller.queued(INTERACTIVE) == 2
+        release.set()
+        await asyncio.gather(*tasks, unshed)
+        assert admitted == [0, 1, "unshed"]
+
+    asyncio.run(run())
+
+
+def test_waiting_too_long_is_shed_with_503():
+    async def run():
+        controller = AdmissionController(capacity=10, max_queue=4, max_wait=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, 10, INTERACTIVE, release, [], "running"))
+        await settle()
+        with pytest.raises(Overloaded) as shed:
+            async with controller.admit(5):
+                pass
+        assert shed.value.status == 503
+        assert controller.queued(INTERACTIVE) == 0
+        release.set()
+        await running
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def run():
+        controller = AdmissionController(capacity=10, max_queue=4, max_wait=5)
+        first, rest, admitted = asyncio.Event(), asyncio.Event(), []
+        running = asyncio.create_task(hold(controller, 6, INTERACTIVE, first, admitted, "running"))
+        await settle()
+        # Doesn't fit next to the running request, and holds up the one behind it
+        big = asyncio.create_task(hold(controller, 10, INTERACTIVE, rest, admitted, "big"))
+        small = asyncio.create_task(hold(controller, 4, INTERACTIVE, rest, admitted, "small"))
+        await settle()
+        assert admitted == ["running"]
+        big.cancel()
+        await settle()
+        assert big.cancelled()
+        assert admitted == ["running", "small"] and controller.in_flight == 10
+        first.set()
+        rest.set()
+        await asyncio.gather(running, small)
+        assert controller.in_flight == 0 and controller.queued(INTERACTIVE) == 0
+
+    asyncio.run(run())
+
+
+def test_oversized_request_runs_alone_and_zero_capacity_admits_everything():
+    async def run():
+        controller = AdmissionController(capacity=10, max_queue=1, max_wait=1)
+        async with controller.admit(1000):
+            assert controller.in_flight == 10
+        unlimited = AdmissionController(capacity=0, max_queue=0, max_wait=0)
+        async with unlimited.admit(1000), unlimited.admit(1000):
+            assert unlimited.in_flight == 0
+
+    asyncio.run(run())
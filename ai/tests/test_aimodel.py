@@ -0,0 +1,94 @@
+import asyncio
+import os
+import signal
+import time
+
+import httpx
+import pytest
+
+import aimodel
+import settings
+from admission import AdmissionController
+
+STATEMENT = "reiki heals chronic back pain"
+PAPER = " ".join(["randomised placebo controlled trial of yoga in adults with asthma"] * 20)
+
+
+@pytest.fixture
+def served(tiny_model_dir, monkeypatch):
+    model = aimodel.ServedModel(tiny_model_dir, cascade=False)
+    # Windows of 16 tokens, so a paper spans many buckets
+    model.engine.max_length = 16
+    monkeypatch.setattr(aimodel, "served", model)
+    monkeypatch.setattr(aimodel, "cache", aimodel.ScoreCache(0))
+    monkeypatch.setattr(settings, "ADMISSION_MAX_TOKENS", 32)
+    monkeypatch.setattr(settings, "BULK_BATCH_SIZE", 2)
+    return model
+
+
+async def call(client, path, **payload):
+    started = time.perf_counter()
+    response = await client.post(path, json=payload)
+    return response, time.perf_counter() - started
+
+
+def test_document_windows_leave_room_for_interactive_requests(served, monkeypatch):
+    admission = AdmissionController(capacity=32, max_queue=8, max_wait=0.2)
+    monkeypatch.setattr(aimodel, "admission", admission)
+    score_windows = served.engine.score_windows
+
+    def slow_score_windows(text, windows, indices):
+        indices = list(indices)
+        time.sleep(0.01 * len(indices))
+        return score_windows(text, windows, indices)
+
+    monkeypatch.setattr(served.engine, "score_windows", slow_score_windows)
+
+    async def run():
+        await served.batcher.start()
+        transport = httpx.ASGITransport(app=aimodel.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                document = asyncio.create_task(call(client, "/predict_confidence/document", text=PAPER))
+                await asyncio.sleep(0.1)
+                interactive = await call(client, "/predict_confidence", text=STATEMENT)
+                return await document, interactive
+        finally:
+            await served.batcher.stop()
+
+    (document, document_seconds), (interactive, interactive_seconds) = asyncio.run(run())
+    assert document.status_code == 200
+    sections = document.json()["sections"]
+    assert len(sections) > 10 and all(section["tokens"] <= 16 for section in sections)
+    # Admitted between two buckets of the paper, long before it was done
+    assert interactive.status_code == 200, interactive.text
+    assert interactive_seconds < document_seconds / 2
+    assert admission.in_flight == 0
+
+
+def test_workers_report_the_supervisors_reload_state(served, tiny_model_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "token")
+    monkeypatch.setattr(settings, "MODEL_DIR", tiny_model_dir)
+    monkeypatch.setattr(aimodel, "supervisor_pid", 1)
+    monkeypatch.setattr(aimodel, "reload_state_path", tmp_path / "reload.json")
+    signals = []
+    monkeypatch.setattr(aimodel.os, "kill", lambda pid, signum: signals.append((pid, signum)))
+
+    async def run():
+        transport = httpx.ASGITransport(app=aimodel.app)
+        headers = {"Authorization": "Bearer token"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            started = await client.post("/admin/reload")
+            # Another worker sees the reload the first one asked for
+            again = await client.post("/admin/reload")
+            # The supervisor finishes it
+            aimodel.save_reload_state(aimodel.reload_state_path, {"status": "idle", "model_version": "v2"})
+            return started, again, await client.get("/admin/model")
+
+    started, again, info = asyncio.run(run())
+    assert started.status_code == 202
+    assert signals == [(1, signal.SIGHUP)]
+    assert again.status_code == 409
+    assert info.json()["reload"] == {"status": "idle", "model_version": "v2"}
+    assert info.json()["pid"] == os.getpid()
+    assert aimodel.reload_state == {"status": "idle"}
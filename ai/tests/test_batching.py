@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from batching import MicroBatcher, length_buckets
+
+
+class Recorder:
+    """``predict_batch`` that doubles its inputs and remembers the batches it got."""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.error is not None:
+            raise self.error
+        return [item * 2 for item in items]
+
+
+async def submit_all(batcher, items):
+    await batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(item) for item in items))
+    finally:
+        await batcher.stop()
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=3, max_wait_ms=10_000)
+    started = time.perf_counter()
+    assert asyncio.run(submit_all(batcher, [1, 2, 3, 4, 5, 6])) == [2, 4, 6, 8, 10, 12]
+    assert time.perf_counter() - started < 5
+    assert predict.batches == [[1, 2, 3], [4, 5, 6]]
+
+
+def test_partial_batch_is_dispatched_after_max_wait():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=50)
+    started = time.perf_counter()
+    assert asyncio.run(submit_all(batcher, [1, 2])) == [2, 4]
+    assert 0.05 <= time.perf_counter() - started < 5
+    assert predict.batches == [[1, 2]]
+
+
+def test_failed_batch_fails_every_caller():
+    batcher = MicroBatcher(Recorder(RuntimeError("out of memory")), max_batch_size=2, max_wait_ms=1)
+
+    async def run():
+        await batcher.start()
+        try:
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    assert [str(result) for result in asyncio.run(run())] == ["out of memory"] * 2
+
+
+def test_callers_that_gave_up_are_left_out_of_the_batch():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=50)
+
+    async def run():
+        await batcher.start()
+        abandoned = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        try:
+            return await batcher.submit(2)
+        finally:
+            await batcher.stop(drain=True)
+
+    assert asyncio.run(run()) == 4
+    assert predict.batches == [[2]]
+
+
+def test_submit_before_start_is_an_error():
+    with pytest.raises(RuntimeError):
+        asyncio.run(MicroBatcher(Recorder()).submit(1))
+
+
+def test_buckets_hold_inputs_of_similar_length():
+    lengths = [40, 3, 12, 5, 41, 11]
+    assert length_buckets(lengths, 2) == [[1, 3], [5, 2], [0, 4]]
+
+
+def test_buckets_are_closed_at_max_tokens():
+    lengths = [10, 10, 10, 30, 100]
+    # 10 + 10 + 10 fit, 30 would not; 100 is over on its own but still gets a bucket
+    assert length_buckets(lengths, 8, max_tokens=35) == [[0, 1, 2], [3], [4]]
+    assert sorted(sum(length_buckets(lengths, 8, max_tokens=35), [])) == list(range(len(lengths)))
+
+
+def test_no_inputs_no_buckets():
+    assert length_buckets([], 4) == []
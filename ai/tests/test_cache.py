@@ -0,0 +1,80 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CachedScore, LRUCache, RedisTier, ScoreCache, content_key, normalize_text
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def shared_tier():
+    # Skips RedisTier.__init__, which needs the redis package and a server
+    tier = RedisTier.__new__(RedisTier)
+    tier.client, tier.ttl, tier.prefix = FakeRedis(), 60, "confidence:"
+    tier.hits = tier.misses = 0
+    tier._executor = ThreadPoolExecutor(max_workers=1)
+    return tier
+
+
+def test_normalisation_ignores_case_width_and_spacing():
+    assert normalize_text("  Reiki\tHEALS\n back  pain ") == "reiki heals back pain"
+    assert normalize_text("ＲＥＩＫＩ") == "reiki"
+    assert content_key("Reiki heals", "v1") == content_key("reiki   heals", "v1")
+    assert content_key("Reiki heals", "v1") != content_key("Reiki heals", "v2")
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_lru_of_size_zero_stores_nothing():
+    lru = LRUCache(maxsize=0)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+
+
+def test_scores_are_kept_per_model_version():
+    cache = ScoreCache(maxsize=10)
+    cache.set_model_version("v1")
+    cache.set("Reiki heals", 0.3, tag=1, source_ids=[4], source_scores=[0.9])
+    assert cache.get("REIKI  heals") == CachedScore(0.3, 1, [4], [0.9])
+    assert cache.get("Reiki heals", "v0") is None
+    cache.set_model_version("v2")
+    assert cache.get("Reiki heals", "v1") is None
+
+
+def test_shared_tier_fills_the_local_one():
+    tier = shared_tier()
+    writer, reader = ScoreCache(maxsize=10, shared=tier), ScoreCache(maxsize=10, shared=tier)
+    writer.set_model_version("v1")
+    reader.set_model_version("v1")
+    writer.set("Reiki heals", 0.3, tag=1)
+    tier._executor.submit(lambda: None).result()
+    # Written before sources were cached with scores
+    tier.client.data["confidence:" + content_key("Yoga cures asthma", "v1")] = json.dumps(0.7)
+
+    async def lookup():
+        return await reader.aget_many(["reiki heals", "yoga cures asthma", "Homeopathy works"])
+
+    assert asyncio.run(lookup()) == [CachedScore(0.3, 1, None, None), CachedScore(0.7, 0, None, None), None]
+    assert len(reader.local) == 2
+    assert tier.stats()["hits"] == 2
+    assert reader.get("Reiki heals") == CachedScore(0.3, 1, None, None)
+    assert tier.stats()["hits"] == 2
@@ -0,0 +1,50 @@
+import pytest
+
+import checkpoints
+
+
+def make_version(model_dir, version):
+    path = checkpoints.version_dir(model_dir, version)
+    path.mkdir(parents=True)
+    (path / "config.json").write_text("{}")
+    return path
+
+
+def test_current_version_is_served(tmp_path):
+    make_version(tmp_path, "20261018-142501")
+    newer = make_version(tmp_path, "20261019-093012")
+    assert checkpoints.resolve(tmp_path) == newer
+    checkpoints.publish(tmp_path, "20261018-142501")
+    assert checkpoints.current_version(tmp_path) == "20261018-142501"
+    # Written under another name and renamed over CURRENT
+    assert sorted(path.name for path in tmp_path.iterdir()) == [checkpoints.CURRENT, checkpoints.VERSIONS]
+    assert checkpoints.resolve(tmp_path) == checkpoints.version_dir(tmp_path, "20261018-142501")
+    assert checkpoints.resolve(tmp_path, "20261019-093012") == newer
+
+
+def test_unversioned_checkpoint_is_served_as_it_is(tmp_path):
+    (tmp_path / "config.json").write_text("{}")
+    make_version(tmp_path, "20261018-142501")
+    assert checkpoints.resolve(tmp_path) == tmp_path
+
+
+def test_incomplete_versions_are_not_listed_or_published(tmp_path):
+    make_version(tmp_path, "20261018-142501")
+    checkpoints.version_dir(tmp_path, "20261019-093012").mkdir()
+    assert checkpoints.list_versions(tmp_path) == ["20261018-142501"]
+    with pytest.raises(ValueError):
+        checkpoints.publish(tmp_path, "20261019-093012")
+    assert checkpoints.current_version(tmp_path) is None
+
+
+@pytest.mark.parametrize("version", ["", "../elsewhere", ".hidden"])
+def test_version_names_stay_inside_the_model_directory(tmp_path, version):
+    with pytest.raises(ValueError):
+        checkpoints.version_dir(tmp_path, version)
+
+
+def test_new_versions_never_share_a_directory(tmp_path):
+    first, second = checkpoints.new_version(tmp_path), checkpoints.new_version(tmp_path)
+    assert first != second and first.is_dir() and second.is_dir()
+    assert checkpoints.version_of(tmp_path, second) == second.name
+    assert checkpoints.version_of(tmp_path, tmp_path) is None
@@ -0,0 +1,61 @@
+import pytest
+
+from dedup import NearDuplicateIndex
+
+STATEMENT = (
+    "In a randomised placebo controlled trial of 412 adults, weekly acupuncture sessions "
+    "reduced the severity of chronic lower back pain over twelve weeks of treatment"
+)
+
+
+@pytest.fixture
+def index():
+    index = NearDuplicateIndex(capacity=64, threshold=0.8)
+    index.add(STATEMENT, 0.7, source_ids=[5, 9], source_scores=[0.9, 0.8], tag=1)
+    return index
+
+
+def test_trivially_different_copy_reuses_the_score_and_sources(index):
+    match = index.find("  in a RANDOMISED placebo-controlled trial of 412 adults, weekly acupuncture sessions "
+                       "reduced the severity of chronic lower back pain over twelve weeks of treatment!")
+    assert match is not None
+    assert (match.confidence, match.tag, match.source_ids) == (pytest.approx(0.7), 1, [5, 9])
+    assert match.source_scores == pytest.approx([0.9, 0.8])
+    assert match.similarity >= 0.8
+
+
+def test_different_statement_is_not_reused(index):
+    assert index.find("Homeopathic remedies cure seasonal allergies in children within a week") is None
+    assert index.stats()["misses"] == 1
+
+
+def test_negations_and_numbers_must_match(index):
+    assert index.find(STATEMENT.replace("reduced", "did not reduce")) is None
+    assert index.find(STATEMENT.replace("412", "41")) is None
+
+
+def test_threshold_decides_how_close_is_close_enough():
+    extended = STATEMENT + ", and patients preferred it to physiotherapy"
+    loose, strict = NearDuplicateIndex(64, threshold=0.5), NearDuplicateIndex(64, threshold=0.99)
+    for index in (loose, strict):
+        index.add(STATEMENT, 0.7)
+    match = loose.find(extended)
+    assert match is not None and 0.5 <= match.similarity < 0.99
+    assert strict.find(extended) is None
+    assert strict.find(STATEMENT.upper()) is not None
+
+
+def test_oldest_statement_is_overwritten_when_full():
+    index = NearDuplicateIndex(capacity=2)
+    statements = [f"Statement number {word} about an unproven remedy for insomnia" for word in ("one", "two", "three")]
+    for confidence, statement in enumerate(statements):
+        index.add(statement, confidence / 10)
+    assert len(index) == 2
+    assert index.find(statements[0]) is None
+    assert index.find(statements[2]).confidence == pytest.approx(0.2)
+
+
+def test_text_without_words_is_ignored(index):
+    index.add("...", 0.5)
+    assert len(index) == 1
+    assert index.find("!!!") is None
@@ -0,0 +1,48 @@
+import pytest
+import torch
+
+from engine import INT8_WEIGHTS, ONNX_MODEL, InferenceEngine, checkpoint_version, reduce_sections
+
+
+def test_sections_are_reduced_by_the_chosen_reducer():
+    sections = [{"confidence": 0.2, "tokens": 10}, {"confidence": 0.8, "tokens": 30}]
+    assert reduce_sections(sections) == pytest.approx(0.5)
+    assert reduce_sections(sections, "max") == 0.8
+    assert reduce_sections(sections, "length_weighted") == pytest.approx(0.65)
+
+
+def test_unknown_reducer_is_an_error():
+    with pytest.raises(KeyError):
+        reduce_sections([{"confidence": 0.5, "tokens": 1}], "median")
+
+
+def test_exporting_a_variant_keeps_the_version_of_the_others(tmp_path):
+    (tmp_path / "config.json").write_text("{}")
+    (tmp_path / "model.safetensors").write_bytes(b"fp32")
+    fp32 = checkpoint_version(tmp_path)
+    for path, content in ((INT8_WEIGHTS, b"int8"), (ONNX_MODEL, b"onnx")):
+        (tmp_path / path).parent.mkdir()
+        (tmp_path / path).write_bytes(content)
+    assert checkpoint_version(tmp_path) == fp32
+    int8 = checkpoint_version(tmp_path, "int8")
+    assert int8 != fp32
+    (tmp_path / INT8_WEIGHTS).write_bytes(b"int8, exported again")
+    assert checkpoint_version(tmp_path, "int8") != int8
+    assert checkpoint_version(tmp_path) == fp32
+    (tmp_path / "model.safetensors").write_bytes(b"fp32, trained again")
+    assert checkpoint_version(tmp_path) != fp32
+
+
+def test_long_document_is_scored_in_overlapping_windows(tiny_model_dir):
+    engine = InferenceEngine(tiny_model_dir, device=torch.device("cpu"), max_length=16, variant="fp32")
+    text = " ".join(["reiki heals chronic back pain in adults"] * 6)
+    sections = engine.predict_long(text, stride=4, batch_size=2)
+    assert len(sections) > 2
+    assert sections[0]["start"] == 0 and sections[-1]["end"] == len(text)
+    for previous, section in zip(sections, sections[1:]):
+        # Each window starts inside the one before it
+        assert previous["start"] < section["start"] < previous["end"]
+    assert all(section["tokens"] <= 16 for section in sections)
+    assert all(0 < section["confidence"] < 1 for section in sections)
+    # The first window is scored as the statement truncated to max_length would be
+    assert sections[0]["confidence"] == pytest.approx(engine.predict([text])[0])
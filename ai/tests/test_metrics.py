@@ -0,0 +1,32 @@
+import pytest
+
+from metrics import Counter, Registry
+
+
+def test_counter_renders_as_a_total():
+    registry = Registry()
+    hits = registry.register(Counter("cache_hits_total", "Hits.", lambda: 3))
+    misses = registry.register(Counter("cache_misses_total", "Misses."))
+    misses.inc()
+    misses.inc(2)
+    lines = registry.render().splitlines()
+    assert "# TYPE cache_hits_total counter" in lines
+    assert "# TYPE cache_misses_total counter" in lines
+    assert any(line.startswith("cache_hits_total{pid=") and line.endswith(" 3.0") for line in lines)
+    assert any(line.startswith("cache_misses_total{pid=") and line.endswith(" 3.0") for line in lines)
+    with pytest.raises(TypeError):
+        hits.set(0)
+
+
+def test_counter_name_needs_total_suffix():
+    with pytest.raises(ValueError):
+        Counter("cache_hits", "Hits.")
+
+
+def test_service_exports_cache_counters():
+    import aimodel
+
+    text = aimodel.registry.render()
+    assert "# TYPE aimodel_cache_hits_total counter" in text
+    assert "# TYPE aimodel_cache_misses_total counter" in text
+    assert "# TYPE aimodel_cache_hits gauge" not in text
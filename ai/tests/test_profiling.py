@@ -0,0 +1,60 @@
+import asyncio
+import json
+import threading
+
+import pytest
+import torch
+
+from profiling import SUMMARY, Profiler, folded_stacks
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+def test_stacks_are_folded_by_self_time():
+    events = [
+        {"ph": "X", "name": "forward", "ts": 0, "dur": 100, "pid": 1, "tid": 1},
+        {"ph": "X", "name": "aten::linear", "ts": 10, "dur": 60, "pid": 1, "tid": 1},
+        {"ph": "X", "name": "aten::addmm", "ts": 20, "dur": 40, "pid": 1, "tid": 1},
+        {"ph": "X", "name": "<built-in method at 0x7f00aa>", "ts": 80, "dur": 10, "pid": 1, "tid": 1},
+        {"ph": "X", "name": "Trace", "cat": "Trace", "ts": 0, "dur": 1000, "pid": 1, "tid": 1},
+    ]
+    assert folded_stacks(events) == {
+        "forward": 30,
+        "forward;aten::linear": 20,
+        "forward;aten::linear;aten::addmm": 40,
+        "forward;<built-in method>": 10,
+    }
+
+
+def test_one_capture_at_a_time_on_the_profiler_thread(tmp_path):
+    profiler = Profiler(tmp_path)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = await asyncio.gather(
+            profiler.start(1, 30, {"model_version": "v1"}, with_stack=False),
+            profiler.start(1, 30, {"model_version": "v1"}, with_stack=False),
+            return_exceptions=True,
+        )
+        assert sum(isinstance(result, RuntimeError) for result in started) == 1
+        # Model work is sent to the profiler's thread, the loop's default executor is left alone
+        assert (await loop.run_in_executor(profiler.executor, thread_name)).startswith("profiler")
+        assert not (await loop.run_in_executor(None, thread_name)).startswith("profiler")
+        await loop.run_in_executor(profiler.executor, torch.ones(4).add, 1)
+        profiler.request_finished()
+        await profiler._task
+        assert profiler.executor is None
+        return profiler.capture
+
+    capture = asyncio.run(run())
+    assert capture["status"] == "done" and capture["requests"] == 1
+    summary = json.loads(profiler.path(capture["id"], SUMMARY).read_text())
+    assert "aten::add" in {row["name"] for row in summary["operators"]}
+    assert profiler.list() == [capture["id"]]
+
+
+def test_unknown_capture_files_are_not_served(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Profiler(tmp_path).path("20261018-000000-1", "../secrets")
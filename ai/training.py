@@ -0,0 +1,323 @@
+"""
+Fine-tuning entry point for the confidence model.
+
+Run ``python training.py`` to train on the labelled papers in
+``settings.TRAINING_DATA`` and write the model and tokenizer to a new checkpoint
+version in ``settings.MODEL_DIR`` (see ``checkpoints.py``), which becomes the
+current one. The serving app in ``aimodel.py`` only loads that checkpoint, it
+never trains; ``POST /admin/reload`` switches a running service over to it.
+
+    python training.py --batch-size 8 --grad-accum 4 --epochs 10 --patience 2
+    python training.py --freeze-layers 8
+    python training.py --distill-from model_output --student-layers 4 --output-dir model_output/student
+
+Papers are streamed section by section through ``ingest.iter_records`` and
+tokenized once into memory-mapped arrays (see ``pretokenize.py``), so neither
+the corpus nor its tokenized form has to fit in memory and epochs don't repeat
+tokenization. ``TRAINING_DATA`` may also point at an already pre-tokenized
+directory to skip that step.
+
+Batches are padded only to their own longest example and, by default, built
+from examples of similar length. Training runs for at most ``--epochs``
+epochs, evaluating on the held-out papers after each one, and stops once the
+evaluation loss hasn't improved for ``--patience`` epochs; the best epoch's
+weights are the ones saved.
+
+``--freeze-layers N`` trains only the top of the encoder. ``--distill-from``
+trains a smaller student instead: ``--student-layers`` of the teacher's layers
+(evenly spaced, like DistilBERT's initialisation) fitted to a blend of the
+labels and the teacher's outputs.
+"""
+import argparse
+import copy
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from transformers import (
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+    DataCollatorWithPadding,
+    EarlyStoppingCallback,
+    Trainer,
+    TrainerCallback,
+    TrainingArguments,
+)
+from torch.utils.data import DataLoader, Dataset
+
+import checkpoints
+import settings
+from engine import configure_threads
+from pretokenize import META, is_pretokenized, pretokenize
+
+# Encoder layer index in a parameter name, e.g. "bert.encoder.layer.7.output.dense.weight"
+LAYER_INDEX = re.compile(r"\.layer\.(\d+)\.")
+
+
+# Define a dataset class
+class ScientificDataset(Dataset):
+    """
+    Training examples pre-tokenized by ``pretokenize.py``.
+
+    Token ids are memory-mapped, so examples are read straight from the page
+    cache rather than re-tokenized or held in memory. Examples are unpadded;
+    ``DataCollatorWithPadding`` pads each batch to its own longest example.
+    ``teacher_logits``, when given, are added to each example for distillation.
+    """
+
+    def __init__(self, path, teacher_logits=None):
+        path = Path(path)
+        meta = json.loads((path / META).read_text())
+        self.input_ids = np.memmap(path / "input_ids.bin", dtype=meta["dtype"], mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.labels = np.load(path / "labels.npy", mmap_mode="r")
+        self.teacher_logits = teacher_logits
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        input_ids = self.input_ids[self.offsets[idx]:self.offsets[idx + 1]].astype(np.int64)
+        example = {
+            "input_ids": input_ids,
+            "attention_mask": np.ones_like(input_ids),
+            "labels": float(self.labels[idx]),  # Adjust for regression
+        }
+        if self.teacher_logits is not None:
+            example["teacher_logits"] = float(self.teacher_logits[idx])
+        return example
+
+
+class DistillationTrainer(Trainer):
+    """
+    Fits the student to ``alpha`` times the squared error to the labels plus
+    ``1 - alpha`` times the squared error to the teacher's logits.
+    """
+
+    def __init__(self, *args, alpha=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+        # Evaluation batches have no teacher logits and are scored on the labels alone
+        teacher_logits = inputs.pop("teacher_logits", None)
+        labels = inputs.pop("labels")
+        outputs = model(**inputs)
+        logits = outputs.logits.squeeze(-1)
+        loss = torch.nn.functional.mse_loss(logits, labels.to(logits.dtype))
+        if teacher_logits is not None:
+            loss = self.alpha * loss + (1 - self.alpha) * torch.nn.functional.mse_loss(
+                logits, teacher_logits.to(logits.dtype)
+            )
+        return (loss, outputs) if return_outputs else loss
+
+
+class EpochTimer(TrainerCallback):
+    """Records the wall-clock and process CPU seconds of every epoch."""
+
+    def __init__(self):
+        self.epochs = []
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._started = (time.perf_counter(), time.process_time())
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        wall, cpu = self._started
+        self.epochs.append({
+            "epoch": round(state.epoch),
+            "seconds": time.perf_counter() - wall,
+            "cpu_seconds": time.process_time() - cpu,
+        })
+
+
+def freeze_layers(model, layers):
+    """Stop training the embeddings and the bottom ``layers`` encoder layers."""
+    for name, parameter in model.base_model.named_parameters():
+        match = LAYER_INDEX.search(f".{name}")
+        if "embeddings" in name or (match and int(match.group(1)) < layers):
+            parameter.requires_grad_(False)
+
+
+def make_student(teacher_dir, layers):
+    """
+    A copy of the teacher with only ``layers`` of its encoder layers, evenly
+    spaced from the first to the last.
+    """
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_dir)
+    total = teacher.config.num_hidden_layers
+    if not 0 < layers < total:
+        raise ValueError(f"A student needs between 1 and {total - 1} layers, got {layers}")
+    kept = [round(index * (total - 1) / (layers - 1)) for index in range(layers)] if layers > 1 else [total - 1]
+    config = copy.deepcopy(teacher.config)
+    config.num_hidden_layers = layers
+    student = AutoModelForSequenceClassification.from_config(config)
+    renumber = {teacher_index: student_index for student_index, teacher_index in enumerate(kept)}
+    state = {}
+    for name, value in teacher.state_dict().items():
+        match = LAYER_INDEX.search(name)
+        if match is None:
+            state[name] = value
+        elif int(match.group(1)) in renumber:
+            state[LAYER_INDEX.sub(f".layer.{renumber[int(match.group(1))]}.", name, count=1)] = value
+    student.load_state_dict(state)
+    return student
+
+
+def teacher_logits(teacher_dir, dataset, tokenizer, batch_size=64):
+    """The teacher's logit for every example of ``dataset``, computed once before training."""
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_dir).eval()
+    loader = DataLoader(dataset, batch_size=batch_size, collate_fn=DataCollatorWithPadding(tokenizer))
+    logits = []
+    with torch.inference_mode():
+        for batch in loader:
+            batch.pop("labels")
+            logits.append(teacher(**batch).logits.squeeze(-1).numpy())
+    return np.concatenate(logits).astype(np.float32)
+
+
+def train(
+    source=settings.TRAINING_DATA,
+    output_dir=settings.MODEL_DIR,
+    base_model=settings.BASE_MODEL,
+    epochs=10,
+    batch_size=8,
+    grad_accum=1,
+    learning_rate=5e-5,
+    patience=2,
+    group_by_length=True,
+    freeze=0,
+    distill_from=None,
+    student_layers=4,
+    alpha=0.5,
+    eval_fraction=settings.EVAL_FRACTION,
+    publish=True,
+    work_dir="./results",
+):
+    """
+    Fine-tune ``base_model`` (or distil ``distill_from`` into a student) and
+    save it as a new checkpoint version in ``output_dir``.
+
+    Returns the checkpoint directory and the per-epoch timings.
+    """
+    configure_threads()
+    if distill_from is not None and Path(distill_from).is_dir():
+        distill_from = checkpoints.resolve(distill_from)
+    # Split into training and evaluation datasets
+    tokenizer = AutoTokenizer.from_pretrained(distill_from or base_model)
+    if not is_pretokenized(source):
+        pretokenize(source, settings.TOKENIZED_DATA, tokenizer, eval_fraction=eval_fraction)
+        source = settings.TOKENIZED_DATA
+    train_dataset = ScientificDataset(Path(source) / "train")
+    eval_dataset = ScientificDataset(Path(source) / "eval")
+    if len(eval_dataset) == 0:
+        raise RuntimeError(
+            f"No held-out examples in {source}, training needs labelled papers to evaluate on"
+        )
+
+    if distill_from is not None:
+        train_dataset.teacher_logits = teacher_logits(distill_from, train_dataset, tokenizer)
+        model = make_student(distill_from, student_layers)
+    else:
+        # Load pre-trained model
+        model = AutoModelForSequenceClassification.from_pretrained(
+            base_model, num_labels=1
+        )  # Set num_labels to 1 for regression
+    if freeze:
+        freeze_layers(model, freeze)
+
+    # Training setup
+    training_args = TrainingArguments(
+        output_dir=work_dir,
+        num_train_epochs=epochs,
+        per_device_train_batch_size=batch_size,
+        # No gradients are kept during evaluation, so it can take bigger batches
+        per_device_eval_batch_size=batch_size * 2,
+        gradient_accumulation_steps=grad_accum,
+        warmup_ratio=0.1,
+        weight_decay=0.01,
+        logging_dir="./logs",
+        logging_steps=10,
+        learning_rate=learning_rate,
+        save_total_limit=2,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        # Batch examples of similar length so dynamic padding stays small
+        group_by_length=group_by_length,
+        dataloader_pin_memory=torch.cuda.is_available(),
+        report_to="none",
+    )
+
+    # Trainer initialization
+    timer = EpochTimer()
+    trainer = DistillationTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer),
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=patience), timer],
+        alpha=alpha,
+    )
+
+    # Train the model
+    trainer.train()
+
+    # Saving the model and tokenizer. Weights are written as safetensors so the
+    # service can memory-map them instead of unpickling a full copy.
+    checkpoint = checkpoints.new_version(output_dir)
+    trainer.model.save_pretrained(checkpoint, safe_serialization=True)
+    tokenizer.save_pretrained(checkpoint)
+    if publish:
+        # Only a complete checkpoint is made current
+        checkpoints.publish(output_dir, checkpoint.name)
+    return checkpoint, timer.epochs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the confidence model.")
+    parser.add_argument("--data", default=settings.TRAINING_DATA, help="papers or a pre-tokenized directory")
+    parser.add_argument("--output-dir", default=settings.MODEL_DIR)
+    parser.add_argument("--base-model", default=settings.BASE_MODEL)
+    parser.add_argument("--epochs", type=int, default=10, help="at most this many, see --patience")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--grad-accum", type=int, default=1, help="batches per optimizer step")
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--patience", type=int, default=2, help="epochs without improvement before stopping")
+    parser.add_argument("--no-group-by-length", action="store_true")
+    parser.add_argument("--eval-fraction", type=float, default=settings.EVAL_FRACTION)
+    parser.add_argument("--freeze-layers", type=int, default=0, help="train only the layers above this many")
+    parser.add_argument("--distill-from", help="teacher model directory; trains a smaller student")
+    parser.add_argument("--student-layers", type=int, default=4)
+    parser.add_argument("--alpha", type=float, default=0.5, help="weight of the labels against the teacher")
+    parser.add_argument("--no-publish", action="store_true", help="don't make the new checkpoint current")
+    args = parser.parse_args()
+    checkpoint, epochs = train(
+        args.data,
+        args.output_dir,
+        args.base_model,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        grad_accum=args.grad_accum,
+        learning_rate=args.lr,
+        patience=args.patience,
+        group_by_length=not args.no_group_by_length,
+        freeze=args.freeze_layers,
+        distill_from=args.distill_from,
+        student_layers=args.student_layers,
+        alpha=args.alpha,
+        eval_fraction=args.eval_fraction,
+        publish=not args.no_publish,
+    )
+    for epoch in epochs:
+        print(f"epoch {epoch['epoch']}: {epoch['seconds']:.1f}s ({epoch['cpu_seconds']:.1f}s CPU)")
+    print(f"Saved {checkpoint}")
+
+
+if __name__ == "__main__":
+    main()
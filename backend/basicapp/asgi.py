@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'basicapp.settings')
 
 application = get_asgi_application()
+
+# Pick up the scoring jobs a previous process left queued or running
+from core.jobs import broker  # noqa: E402
+
+broker.start()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,13 +89,83 @@ WSGI_APPLICATION = 'basicapp.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Uses the Postgres service from docker-compose when POSTGRES_DB is set,
+# SQLite otherwise.
+
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'db'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Several workers write scores concurrently: WAL lets reads carry
+            # on during a write and IMMEDIATE transactions queue for the write
+            # lock instead of failing with "database is locked"
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Confidence scores are cached here. Set CACHE_REDIS_URL to share the cache
+# between gunicorn workers and backend replicas, otherwise each worker keeps
+# its own bounded in-memory cache.
+
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+            'TIMEOUT': 7 * 24 * 3600,
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': 7 * 24 * 3600,
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+
+
+# AI model service
+# Requests go through the pooled client in core/model_client.py.
+
+AI_MODEL_URL = os.environ.get('AI_MODEL_URL', 'http://ai-model:8000')
+AI_MODEL_TIMEOUT = float(os.environ.get('AI_MODEL_TIMEOUT', 30))
+AI_MODEL_MAX_CONNECTIONS = int(os.environ.get('AI_MODEL_MAX_CONNECTIONS', 20))
+AI_MODEL_MAX_CONCURRENCY = int(os.environ.get('AI_MODEL_MAX_CONCURRENCY', 20))
+AI_MODEL_RETRIES = int(os.environ.get('AI_MODEL_RETRIES', 2))
+AI_MODEL_RETRY_BACKOFF = float(os.environ.get('AI_MODEL_RETRY_BACKOFF', 0.2))
+# Seconds between asking the model service which model version it serves.
+# Stored and cached scores are only used if that version produced them, so a
+# reload or rollback takes effect within this time.
+AI_MODEL_VERSION_TTL = float(os.environ.get('AI_MODEL_VERSION_TTL', 10))
+
+# Background paper scoring (core/jobs.py): worker coroutines per backend
+# process, and paragraphs sent to the model service per batch.
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', 2))
+SCORING_JOB_BATCH_SIZE = int(os.environ.get('SCORING_JOB_BATCH_SIZE', 16))
+# Seconds a running job may go without saving progress before a starting
+# backend process takes it to have been abandoned and runs it again. Keep it
+# well above the time one batch takes.
+SCORING_JOB_STALE_AFTER = float(os.environ.get('SCORING_JOB_STALE_AFTER', 300))
 
 
 # Password validation
@@ -128,6 +199,24 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Logging
+# core.timing logs how long each request spent waiting on the model service.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -0,0 +1,191 @@
+"""
+Backend throughput of ``calculate-confidence/`` with a stub standing in for the
+ai-model service.
+
+The stub answers ``/predict_confidence`` after a fixed delay, so the numbers
+show how many requests the backend can keep in flight while it waits on the
+model. Each server mode runs gunicorn with the same number of workers:
+
+- ``wsgi``: sync workers (the original deployment)
+- ``asgi``: uvicorn workers, where the async view awaits the pooled client
+
+    python -m benchmarks.confidence_view --model-latency-ms 200 --concurrency 8 32
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BACKEND_DIR / "benchmarks" / "results"
+CSRF_TOKEN = "b" * 32
+
+SERVER_ARGS = {
+    "wsgi": ["basicapp.wsgi:application"],
+    "asgi": ["-k", "uvicorn_worker.UvicornWorker", "basicapp.asgi:application"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_model(latency):
+    """Serve a fake ai-model on a background thread; returns the server."""
+
+    class StubModel(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(latency)
+            body = json.dumps({"confidence": 0.5, "sources": "", "model_version": "stub"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), StubModel)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def post_statement(url, statement, timeout=120):
+    request = urllib.request.Request(
+        url,
+        data=urllib.parse.urlencode({"uploaded_statement": statement}).encode(),
+        headers={
+            "Cookie": f"csrftoken={CSRF_TOKEN}",
+            "X-CSRFToken": CSRF_TOKEN,
+            "Host": "localhost",
+        },
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def benchmark_env(**overrides):
+    """
+    Environment for a benchmark backend: a freshly migrated throwaway SQLite
+    database unless POSTGRES_DB points at a real one.
+    """
+    env = dict(os.environ, SECRET_KEY="benchmark", **overrides)
+    if "POSTGRES_DB" not in env:
+        env["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="basicapp-bench-"), "db.sqlite3")
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "-v", "0"], cwd=BACKEND_DIR, env=env, check=True
+    )
+    return env
+
+
+def start_backend(mode, workers, model_url):
+    port = free_port()
+    env = benchmark_env(
+        AI_MODEL_URL=model_url,
+        AI_MODEL_MAX_CONNECTIONS="100",
+        AI_MODEL_MAX_CONCURRENCY="100",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+         "--timeout", "120", *SERVER_ARGS[mode]],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/calculate-confidence/"
+    started = time.perf_counter()
+    while True:
+        try:
+            post_statement(url, "warm up")
+            return server, url
+        except (urllib.error.URLError, ConnectionError):
+            if server.poll() is not None or time.perf_counter() - started > 60:
+                server.terminate()
+                raise RuntimeError(f"gunicorn ({mode}) did not start")
+            time.sleep(0.1)
+
+
+def run_load(url, concurrency, requests):
+    def one_request(index):
+        started = time.perf_counter()
+        # Unique statements so the score cache never short-circuits the model call
+        post_statement(url, f"statement {index} {time.time_ns()}")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modes", nargs="+", default=["wsgi", "asgi"], choices=sorted(SERVER_ARGS))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--model-latency-ms", type=float, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    stub = start_stub_model(args.model_latency_ms / 1000)
+    model_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    runs = []
+    try:
+        for mode in args.modes:
+            server, url = start_backend(mode, args.workers, model_url)
+            try:
+                for concurrency in args.concurrency:
+                    runs.append({"mode": mode, **run_load(url, concurrency, args.requests)})
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.shutdown()
+
+    payload = {
+        "benchmark": "confidence_view",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "workers": args.workers,
+        "model_latency_ms": args.model_latency_ms,
+        "results": runs,
+    }
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"confidence_view-{int(time.time())}.json"
+    Path(output).write_text(json.dumps(payload, indent=2))
+    print(json.dumps(payload, indent=2))
+
+
+if __name__ == "__main__":
+    main()
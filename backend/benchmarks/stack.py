@@ -0,0 +1,369 @@
+"""
+End-to-end load test of the serving stack, and of each tier on its own.
+
+    python -m benchmarks.stack --concurrency 1 8 32 --requests 200
+    python -m benchmarks.stack --tiers model stack --inputs long
+    python -m benchmarks.stack --compare results/stack-abc1234.json results/stack-def5678.json
+
+Tiers:
+
+- ``model``: the ai-model service's ``/predict_confidence``, called directly
+- ``backend``: Django's ``calculate-confidence/`` in front of a stub model
+  service that answers at once, so only Django's own cost shows
+- ``stack``: Django in front of the real ai-model service
+- ``nginx``: nginx in front of that (skipped when nginx isn't installed)
+
+The ai-model service runs a tiny randomly initialised BERT unless
+``--model-dir`` is given, so everything runs offline on a CPU. ``short``
+inputs are one sentence; ``long`` ones are cut to 512 tokens by the model.
+Every request sends a distinct statement so no score cache can answer it.
+Memory is the PSS of each tier's processes after its runs (Linux only).
+
+Results are saved as ``benchmarks/results/stack-<git revision>.json``; pass two
+of them to ``--compare`` to see the change in throughput and latency.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from benchmarks.confidence_view import (
+    BACKEND_DIR,
+    RESULTS_DIR,
+    SERVER_ARGS,
+    benchmark_env,
+    free_port,
+    post_statement,
+    start_stub_model,
+)
+
+AI_DIR = BACKEND_DIR.parent / "ai"
+TIERS = ("model", "backend", "stack", "nginx")
+
+SHORT_TEXT = (
+    "With chronic illness at its highest ever level, many people are turning to "
+    "treatments such as reiki, healing touch, yoga and massage."
+)
+INPUTS = {
+    "short": SHORT_TEXT,
+    # Far more than 512 tokens, so every request is a full-length input
+    "long": " ".join([SHORT_TEXT] * 40),
+}
+
+NGINX_CONF = """
+worker_processes 1;
+pid {tmp}/nginx.pid;
+error_log {tmp}/error.log;
+events {{ }}
+http {{
+    access_log off;
+    client_body_temp_path {tmp}/client_body;
+    proxy_temp_path {tmp}/proxy;
+    server {{
+        listen 127.0.0.1:{port};
+        # As in nginx.*.conf, except that /api/ is stripped before proxying
+        location /api/ {{
+            proxy_pass http://127.0.0.1:{backend_port}/;
+            proxy_set_header Host $host;
+            proxy_set_header X-Real-IP $remote_addr;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_set_header X-Forwarded-Proto $scheme;
+        }}
+    }}
+}}
+"""
+
+
+def wait_until_ready(process, check, name, timeout=300):
+    started = time.perf_counter()
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited before it was ready")
+        try:
+            check()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"{name} not ready within {timeout}s")
+            time.sleep(0.1)
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def post_text(url, text, timeout=120):
+    request = urllib.request.Request(
+        url, data=json.dumps({"text": text}).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def tiny_model_dir():
+    """The tiny random checkpoint the ai benchmarks use, created if needed."""
+    return subprocess.check_output(
+        [sys.executable, "-c", "from benchmarks.common import default_model_dir; print(default_model_dir())"],
+        cwd=AI_DIR,
+        text=True,
+    ).strip()
+
+
+@contextmanager
+def model_service(model_dir):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "aimodel:app", "--port", str(port)],
+        cwd=AI_DIR,
+        env=dict(os.environ, MODEL_DIR=str(model_dir)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(process, lambda: post_text(f"{url}/predict_confidence", "warm up"), "ai-model")
+        yield url, process
+    finally:
+        stop(process)
+
+
+@contextmanager
+def backend(model_url, workers):
+    port = free_port()
+    env = benchmark_env(
+        AI_MODEL_URL=model_url,
+        AI_MODEL_MAX_CONNECTIONS="100",
+        AI_MODEL_MAX_CONCURRENCY="100",
+        CORE_LOG_LEVEL="WARNING",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+         "--timeout", "120", *SERVER_ARGS["asgi"]],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/calculate-confidence/"
+    try:
+        wait_until_ready(process, lambda: post_statement(url, "warm up"), "gunicorn")
+        yield url, process, port
+    finally:
+        stop(process)
+
+
+@contextmanager
+def nginx(backend_port):
+    port = free_port()
+    tmp = tempfile.mkdtemp(prefix="basicapp-nginx-")
+    conf = Path(tmp) / "nginx.conf"
+    conf.write_text(NGINX_CONF.format(tmp=tmp, port=port, backend_port=backend_port))
+    process = subprocess.Popen(
+        ["nginx", "-p", tmp, "-c", str(conf), "-g", "daemon off;"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/api/calculate-confidence/"
+    try:
+        wait_until_ready(process, lambda: post_statement(url, "warm up"), "nginx", timeout=30)
+        yield url, process
+    finally:
+        stop(process)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def tree_pss_mb(pid):
+    """PSS of a process and all its descendants in MiB, ``None`` off Linux."""
+    total = 0.0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/smaps_rollup") as smaps:
+                total += next(int(line.split()[1]) for line in smaps if line.startswith("Pss:")) / 1024
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending += [int(child) for child in children.read().split()]
+    except (OSError, StopIteration):
+        return None if total == 0 else total
+    return total
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def run_load(send, text, concurrency, requests):
+    """Send ``requests`` distinct statements from ``concurrency`` threads."""
+    nonce = time.time_ns()
+
+    def one_request(index):
+        started = time.perf_counter()
+        # A unique prefix so no cache answers and truncation keeps it unique
+        send(f"{nonce} {index} {text}")
+        return time.perf_counter() - started
+
+    errors = 0
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one_request, index) for index in range(requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except (urllib.error.URLError, ConnectionError):
+                errors += 1
+    elapsed = time.perf_counter() - started
+    ms = [latency * 1000 for latency in latencies] or [float("nan")]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def run_tier(tier, send, processes, args):
+    runs = []
+    for input_name in args.inputs:
+        for concurrency in args.concurrency:
+            result = run_load(send, INPUTS[input_name], concurrency, args.requests)
+            runs.append({"tier": tier, "input": input_name, **result})
+            print(
+                f"{tier:8} {input_name:5} c={concurrency:<3} {result['requests_per_s']:8.1f} req/s "
+                f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms"
+            )
+    memory = {name: tree_pss_mb(process.pid) for name, process in processes.items()}
+    for run in runs:
+        run["pss_mb"] = memory
+    return runs
+
+
+def benchmark(args):
+    model_dir = args.model_dir or tiny_model_dir()
+    runs = []
+    skipped = {}
+    if "backend" in args.tiers:
+        stub = start_stub_model(0)
+        try:
+            with backend(f"http://127.0.0.1:{stub.server_address[1]}", args.workers) as (url, process, _):
+                runs += run_tier("backend", lambda text: post_statement(url, text), {"backend": process}, args)
+        finally:
+            stub.shutdown()
+
+    if {"model", "stack", "nginx"} & set(args.tiers):
+        with ExitStack() as stack:
+            model_url, model_process = stack.enter_context(model_service(model_dir))
+            processes = {"model": model_process}
+            if "model" in args.tiers:
+                endpoint = f"{model_url}/predict_confidence"
+                runs += run_tier("model", lambda text: post_text(endpoint, text), processes, args)
+            if {"stack", "nginx"} & set(args.tiers):
+                url, process, port = stack.enter_context(backend(model_url, args.workers))
+                processes["backend"] = process
+                if "stack" in args.tiers:
+                    runs += run_tier("stack", lambda text: post_statement(url, text), processes, args)
+                if "nginx" in args.tiers:
+                    if shutil.which("nginx") is None:
+                        skipped["nginx"] = "nginx is not installed"
+                        print("Skipping the nginx tier: nginx is not installed")
+                    else:
+                        nginx_url, nginx_process = stack.enter_context(nginx(port))
+                        processes["nginx"] = nginx_process
+                        runs += run_tier(
+                            "nginx", lambda text: post_statement(nginx_url, text), processes, args
+                        )
+    return {"model_dir": str(model_dir), "workers": args.workers, "runs": runs, "skipped": skipped}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, output=None):
+    payload = {
+        "benchmark": "stack",
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"stack-{payload['revision'] or 'local'}.json"
+    Path(output).write_text(json.dumps(payload, indent=2))
+    print(f"Saved results to {output}")
+    return payload
+
+
+def compare(old_path, new_path):
+    """Print the change in throughput and latency of every run found in both files."""
+    old, new = (json.loads(Path(path).read_text()) for path in (old_path, new_path))
+
+    def key(run):
+        return run["tier"], run["input"], run["concurrency"]
+
+    baseline = {key(run): run for run in old["results"]["runs"]}
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for run in new["results"]["runs"]:
+        before = baseline.get(key(run))
+        if before is None:
+            continue
+        changes = "  ".join(
+            f"{metric} {before[metric]:.1f} -> {run[metric]:.1f} ({(run[metric] / before[metric] - 1):+.0%})"
+            for metric in ("requests_per_s", "p50_ms", "p99_ms")
+            if before[metric]
+        )
+        print(f"{run['tier']:8} {run['input']:5} c={run['concurrency']:<3} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", help="checkpoint to serve (default: tiny random BERT)")
+    parser.add_argument("--tiers", nargs="+", default=list(TIERS))
+    parser.add_argument("--inputs", nargs="+", default=list(INPUTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+    for name, values, known in (("tier", args.tiers, TIERS), ("input", args.inputs, INPUTS)):
+        for value in values:
+            if value not in known:
+                parser.error(f"unknown {name} {value!r}, expected one of {sorted(known)}")
+    save_results(benchmark(args), args.output)
+
+
+if __name__ == "__main__":
+    main()
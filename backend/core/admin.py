@@ -1,3 +1,34 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ModelVersion, Paper, Score, ScoringJob, Statement
+
+
+@admin.register(ModelVersion)
+class ModelVersionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+
+
+@admin.register(Paper)
+class PaperAdmin(admin.ModelAdmin):
+    list_display = ('external_id', 'title', 'created_at')
+    search_fields = ('external_id', 'title')
+
+
+@admin.register(Statement)
+class StatementAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'paper', 'section', 'created_at')
+    search_fields = ('text', 'content_hash')
+
+
+@admin.register(Score)
+class ScoreAdmin(admin.ModelAdmin):
+    list_display = ('statement', 'model_version', 'confidence', 'created_at')
+    list_filter = ('model_version',)
+    list_select_related = ('statement', 'model_version')
+
+
+@admin.register(ScoringJob)
+class ScoringJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'paper', 'status', 'completed', 'total', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('result', 'error')
@@ -0,0 +1,95 @@
+"""
+Shared cache of confidence scores returned by the ai-model service.
+
+Keys are the hash of the normalised statement, normalised the way
+ai/cache.py does it, plus the version of the model that scored it. The
+entries are the backend's own, though. They live in Django's cache, under its
+key prefix and version, and hold only the confidence. They are neither read
+from nor written to the service's cache, even when both use the same Redis.
+Lookups use the version the service is serving (``served_model_version``),
+which is checked regularly whether or not statements miss, so once a new
+checkpoint is loaded every score from the old model stops matching.
+"""
+import hashlib
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .model_client import ModelServiceError, model_client
+
+MODEL_VERSION_KEY = 'confidence:model_version'
+# Present while the version marker is recent enough not to ask the service
+MODEL_VERSION_CHECKED_KEY = 'confidence:model_version_checked'
+HITS_KEY = 'confidence:hits'
+MISSES_KEY = 'confidence:misses'
+
+
+def normalize_text(text):
+    # Must match normalize_text in ai/cache.py
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def content_hash(statement):
+    return hashlib.sha256(normalize_text(statement).encode()).hexdigest()
+
+
+def score_key(statement, model_version):
+    return f'confidence:{model_version}:{content_hash(statement)}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+async def served_model_version():
+    """
+    The version of the model the service is serving, or None if it has never
+    been reached.
+
+    The service is asked at most every ``AI_MODEL_VERSION_TTL`` seconds, so a
+    reload or a rollback is noticed within that time even while every
+    statement is answered without calling the model. While the service can't
+    be reached the version it last reported is used.
+    """
+    # Only the request that adds the key asks, the others use the marker
+    if await cache.aadd(MODEL_VERSION_CHECKED_KEY, True, timeout=settings.AI_MODEL_VERSION_TTL):
+        try:
+            version = await model_client.model_version()
+        except ModelServiceError:
+            pass
+        else:
+            await cache.aset(MODEL_VERSION_KEY, version, timeout=None)
+            return version
+    return await cache.aget(MODEL_VERSION_KEY)
+
+
+def get_cached_confidence(statement, model_version):
+    """The cached confidence for ``statement`` from ``model_version``, or None."""
+    confidence = None
+    if model_version is not None:
+        confidence = cache.get(score_key(statement, model_version))
+    _count(HITS_KEY if confidence is not None else MISSES_KEY)
+    return confidence
+
+
+def set_cached_confidence(statement, confidence, model_version):
+    # A score from a version other than the marker's means the service has
+    # moved on since it was last asked
+    if cache.get(MODEL_VERSION_KEY) != model_version:
+        cache.set(MODEL_VERSION_KEY, model_version, timeout=None)
+    cache.set(score_key(statement, model_version), confidence)
+
+
+def cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        'model_version': cache.get(MODEL_VERSION_KEY),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+    }
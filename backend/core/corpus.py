@@ -0,0 +1,274 @@
+"""
+Bulk scoring of a corpus file, run by ``manage.py score_corpus``.
+
+The file is read as a stream: JSONL papers (``{"id", "title", "text"}`` per
+line, like ai/data/papers.jsonl, or ``{"request_id", "body"}`` the way
+ai/ingest.py also reads them) split into paragraphs the way background jobs
+split them, or plain text with one statement per line. Batches of paragraphs
+go to the model service's batch endpoint from a pool of ``workers``
+coroutines. The queue in front of them is bounded, so the file is never read
+far ahead of the scoring.
+
+One writer stores the scores in bulk, ``write_size`` statements at a time.
+After every write the checkpoint file records the byte offset of the input
+up to which everything has been stored. Running again with the same
+checkpoint carries on from there. Batches scored after that point but not yet
+written are scored again, which is harmless since a statement has one score
+per model version.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+
+from .jobs import split_paragraphs
+from .model_client import model_client
+from .models import Paper
+from .scores import store_scores
+
+JSONL = 'jsonl'
+TEXT = 'text'
+
+# Fields of a JSONL record tried in turn for its id and text.
+# Must match read_jsonl in ai/ingest.py, so both read the same corpora
+ID_FIELDS = ('id', 'request_id')
+TEXT_FIELDS = ('text', 'body')
+
+
+def first_field(record, fields):
+    return next((record[field] for field in fields if record.get(field)), None)
+
+
+def read_statements(line, format, min_words=5):
+    """``(paper, paragraphs)`` of one line of the input; ``paper`` is ``(id, title)`` or ``None``."""
+    if format == TEXT:
+        statement = line.decode().strip()
+        return None, [statement] if statement else []
+    if not line.strip():
+        return None, []
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError(f'expected an object, got {type(record).__name__}')
+    paper_id = first_field(record, ID_FIELDS)
+    paper = (str(paper_id), record.get('title') or '') if paper_id is not None else None
+    return paper, split_paragraphs(str(first_field(record, TEXT_FIELDS) or ''), min_words)
+
+
+def read_batches(path, offset, batch_size, format, min_words=5, skipped=None):
+    """
+    ``(batch, resume_offset)`` pairs from ``path`` starting at byte ``offset``.
+
+    A batch is a list of ``(paper, statement)``. Every statement of a line
+    before ``resume_offset`` is in that batch or an earlier one, so it is
+    where to start again once they have all been stored. ``skipped`` is
+    called with the byte offset of every non-empty line without a statement.
+    """
+    batch = []
+    with open(path, 'rb') as corpus:
+        corpus.seek(offset)
+        for line in corpus:
+            start, offset = offset, offset + len(line)
+            try:
+                paper, statements = read_statements(line, format, min_words)
+            except (ValueError, KeyError) as exc:
+                raise ValueError(f'{path}: unreadable record at byte {start}: {exc}') from exc
+            if not statements and line.strip() and skipped is not None:
+                skipped(start)
+            for statement in statements:
+                if len(batch) == batch_size:
+                    # Cut in the middle of this line, which is read again on resume
+                    yield batch, start
+                    batch = []
+                batch.append((paper, statement))
+    if batch:
+        yield batch, offset
+
+
+class Checkpoint:
+    """How far into an input everything has been stored, kept in a JSON file."""
+
+    def __init__(self, path, input_path):
+        self.path = Path(path)
+        self.input = str(Path(input_path).resolve())
+        self.offset = 0
+        self.statements = 0
+        self.model_versions = {}
+
+    @classmethod
+    def load(cls, path, input_path):
+        checkpoint = cls(path, input_path)
+        if checkpoint.path.exists():
+            state = json.loads(checkpoint.path.read_text())
+            if state['input'] != checkpoint.input:
+                raise ValueError(f'{path} is the checkpoint of {state["input"]}, not {checkpoint.input}')
+            if state['offset'] > os.path.getsize(input_path):
+                raise ValueError(f'{input_path} is shorter than when {path} was written')
+            checkpoint.offset = state['offset']
+            checkpoint.statements = state['statements']
+            checkpoint.model_versions = state['model_versions']
+        return checkpoint
+
+    def save(self):
+        state = {
+            'input': self.input,
+            'offset': self.offset,
+            'statements': self.statements,
+            'model_versions': self.model_versions,
+            'updated_at': time.time(),
+        }
+        # Written whole and renamed, an interrupted write never leaves a broken checkpoint
+        temporary = self.path.with_name(f'.{self.path.name}.{os.getpid()}')
+        temporary.write_text(json.dumps(state, indent=2) + '\n')
+        os.replace(temporary, self.path)
+
+
+def store_results(entries):
+    """Store scored batches, one bulk write per model version and paper."""
+    groups = defaultdict(list)
+    for batch, results in entries:
+        for (paper, statement), result in zip(batch, results):
+            groups[result['model_version'], paper].append((statement, result['confidence'], None))
+    for (model_version, paper), scores in groups.items():
+        if paper is not None:
+            paper, _ = Paper.objects.get_or_create(external_id=paper[0], defaults={'title': paper[1]})
+        store_scores(scores, model_version, paper=paper)
+
+
+class CorpusRun:
+    def __init__(
+        self,
+        path,
+        checkpoint,
+        client=model_client,
+        workers=4,
+        batch_size=32,
+        write_size=512,
+        format=JSONL,
+        min_words=5,
+        report=None,
+        report_every=10.0,
+        flush_every=5.0,
+    ):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.client = client
+        self.workers = workers
+        self.batch_size = batch_size
+        self.write_size = write_size
+        self.format = format
+        self.min_words = min_words
+        self.report = report
+        self.report_every = report_every
+        self.flush_every = flush_every
+        self.size = os.path.getsize(path)
+        self.scored = 0
+        # Records of this run with no text of ``min_words`` words
+        self.skipped = 0
+        self.first_skipped = None
+        self.started = None
+
+    async def run(self):
+        """Score the input from the checkpoint on; returns the statements scored by this run."""
+        self.started = time.perf_counter()
+        self._batches = asyncio.Queue(maxsize=self.workers * 2)
+        self._results = asyncio.Queue()
+        self._stored, self._next_sequence = {}, 0
+        tasks = [asyncio.create_task(self._read())]
+        tasks += [asyncio.create_task(self._score()) for _ in range(self.workers)]
+        writer = asyncio.create_task(self._write())
+        # Nothing is scored once results can't be stored
+        writer.add_done_callback(lambda _: [task.cancel() for task in tasks])
+        reporter = asyncio.create_task(self._report()) if self.report else None
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                # A failed read or scoring request stops the run
+                task.result()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            # Whatever was scored is still stored and checkpointed
+            await self._results.put(None)
+            await writer
+        if self.report:
+            self.report(self.progress())
+        return self.scored
+
+    async def _read(self):
+        sequence = 0
+        batches = read_batches(
+            self.path, self.checkpoint.offset, self.batch_size, self.format, self.min_words, self._skip
+        )
+        for batch, resume_offset in batches:
+            await self._batches.put((sequence, batch, resume_offset))
+            sequence += 1
+        for _ in range(self.workers):
+            await self._batches.put(None)
+
+    def _skip(self, offset):
+        self.skipped += 1
+        if self.first_skipped is None:
+            self.first_skipped = offset
+
+    async def _score(self):
+        while True:
+            item = await self._batches.get()
+            if item is None:
+                return
+            sequence, batch, resume_offset = item
+            results = await self.client.predict_confidence_batch([statement for _, statement in batch])
+            self.scored += len(batch)
+            await self._results.put((sequence, batch, resume_offset, results))
+
+    async def _write(self):
+        buffered = []
+        while True:
+            try:
+                item = await asyncio.wait_for(self._results.get(), self.flush_every)
+            except asyncio.TimeoutError:
+                # Slow scoring still gets stored and checkpointed regularly
+                item = False
+            if item:
+                buffered.append(item)
+                if sum(len(batch) for _, batch, _, _ in buffered) < self.write_size:
+                    continue
+            if buffered:
+                await self._store(buffered)
+                buffered = []
+            if item is None:
+                return
+
+    async def _store(self, entries):
+        await sync_to_async(store_results)([(batch, results) for _, batch, _, results in entries])
+        for sequence, batch, resume_offset, results in entries:
+            self._stored[sequence] = resume_offset
+            self.checkpoint.statements += len(batch)
+            for result in results:
+                version = result['model_version']
+                self.checkpoint.model_versions[version] = self.checkpoint.model_versions.get(version, 0) + 1
+        # Batches finish out of order; the checkpoint only moves past a batch
+        # once it and every batch before it are stored
+        while self._next_sequence in self._stored:
+            self.checkpoint.offset = self._stored.pop(self._next_sequence)
+            self._next_sequence += 1
+        await sync_to_async(self.checkpoint.save)()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_every)
+            self.report(self.progress())
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.started
+        return (
+            f'{self.scored} statements scored in {elapsed:.0f}s ({self.scored / elapsed if elapsed else 0:.1f}/s), '
+            f'{self.checkpoint.statements} stored in total, '
+            f'{self.checkpoint.offset / self.size if self.size else 1:.1%} of {self.path} done'
+        )
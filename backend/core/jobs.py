@@ -0,0 +1,170 @@
+"""
+Background scoring of long papers.
+
+Submitting a paper creates a ``ScoringJob`` and puts its id on a broker; the
+request returns straight away with the job id and clients poll the job for
+progress. Workers split the paper into paragraphs and score them in batches
+through the model service's batch endpoint, saving progress after every batch.
+
+``InProcessBroker`` is a local stand-in for an external broker: a pool of
+worker coroutines on a background event loop inside the web process. It needs
+no other services, which is also what the tests run against. Its queue lives in
+memory, so when it starts it picks up the jobs a previous process left behind
+(see ``pending_jobs``); a worker claims a job before running it, so a job put
+on the queue twice, or by two processes, still only runs once.
+"""
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .model_client import ModelServiceError, model_client
+from .models import ScoringJob
+from .scores import store_scores
+
+logger = logging.getLogger(__name__)
+
+
+def split_paragraphs(text, min_words=5):
+    """Paragraphs of ``text`` worth scoring; headings and stray short lines are skipped."""
+    return [line.strip() for line in text.splitlines() if len(line.split()) >= min_words]
+
+
+async def process_job(job_id, client=model_client, batch_size=None):
+    batch_size = batch_size or settings.SCORING_JOB_BATCH_SIZE
+    job = await ScoringJob.objects.select_related('paper').aget(pk=job_id)
+    paragraphs = split_paragraphs(job.text)
+    job.status = ScoringJob.RUNNING
+    job.total = len(paragraphs)
+    job.completed = 0
+    job.updated_at = timezone.now()
+    claimed = await ScoringJob.objects.filter(pk=job_id, status=ScoringJob.QUEUED).aupdate(
+        status=job.status, total=job.total, completed=job.completed, updated_at=job.updated_at,
+    )
+    if not claimed:
+        # Already taken by another worker, or finished
+        return await ScoringJob.objects.aget(pk=job_id)
+
+    sections = []
+    try:
+        for start in range(0, len(paragraphs), batch_size):
+            batch = paragraphs[start:start + batch_size]
+            results = await client.predict_confidence_batch(batch)
+            await sync_to_async(store_scores)(
+                [(text, result['confidence'], None) for text, result in zip(batch, results)],
+                results[0]['model_version'],
+                paper=job.paper,
+            )
+            sections += [
+                {'index': start + offset, 'text': text[:200], 'confidence': result['confidence']}
+                for offset, (text, result) in enumerate(zip(batch, results))
+            ]
+            job.completed = len(sections)
+            await job.asave(update_fields=['completed', 'updated_at'])
+    except ModelServiceError as exc:
+        job.status = ScoringJob.FAILED
+        job.error = str(exc)
+        await job.asave(update_fields=['status', 'error', 'updated_at'])
+        return job
+
+    scores = [section['confidence'] for section in sections]
+    job.result = {
+        'confidence': sum(scores) / len(scores) if scores else None,
+        'sections': sections,
+    }
+    job.status = ScoringJob.SUCCEEDED
+    await job.asave(update_fields=['status', 'result', 'updated_at'])
+    return job
+
+
+def pending_jobs(stale_after=None):
+    """
+    Ids of the jobs waiting to run, oldest first.
+
+    A RUNNING job whose progress hasn't been saved for ``stale_after`` seconds
+    lost its worker (the process was stopped or crashed) and is put back to
+    QUEUED first, to be run again from the start.
+    """
+    stale_after = settings.SCORING_JOB_STALE_AFTER if stale_after is None else stale_after
+    ScoringJob.objects.filter(
+        status=ScoringJob.RUNNING, updated_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    ).update(status=ScoringJob.QUEUED, updated_at=timezone.now())
+    return list(
+        ScoringJob.objects.filter(status=ScoringJob.QUEUED).order_by('created_at').values_list('pk', flat=True)
+    )
+
+
+class InProcessBroker:
+    """
+    Job queue drained by ``workers`` coroutines running ``handler(job_id)``.
+
+    ``pending`` returns the job ids to queue when the broker starts.
+    """
+
+    def __init__(self, handler, workers=2, pending=None):
+        self.handler = handler
+        self.workers = workers
+        self.pending = pending
+        self._loop = None
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._queue = asyncio.Queue()
+            for _ in range(self.workers):
+                self._loop.create_task(self._work())
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name='scoring-broker', daemon=True).start()
+        ready.wait()
+        for job_id in self.pending() if self.pending else ():
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.handler(job_id)
+            except Exception:
+                logger.exception('Scoring job %s failed', job_id)
+                await sync_to_async(
+                    ScoringJob.objects.filter(pk=job_id).update
+                )(status=ScoringJob.FAILED, error='Internal error')
+            finally:
+                await sync_to_async(close_old_connections)()
+                self._queue.task_done()
+
+    def start(self):
+        """Start the workers and queue the ``pending`` jobs, unless already started."""
+        with self._lock:
+            if self._loop is None:
+                self._start()
+
+    def enqueue(self, job_id):
+        self.start()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    def join(self, timeout=None):
+        """Block until every queued job has been processed."""
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop).result(timeout)
+
+
+broker = InProcessBroker(process_job, workers=settings.SCORING_WORKERS, pending=pending_jobs)
+
+
+def submit_job(text, paper=None):
+    job = ScoringJob.objects.create(text=text, paper=paper)
+    broker.enqueue(job.pk)
+    return job
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from core.corpus import JSONL, TEXT, Checkpoint, CorpusRun
+from core.model_client import ModelServiceError, model_client
+
+
+class Command(BaseCommand):
+    help = (
+        'Score every statement of a corpus file through the model service and store the scores. '
+        'Progress is checkpointed, so running the same command again after an interruption '
+        'carries on where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', type=Path,
+            help='JSONL papers ({"id", "title", "text"} or {"request_id", "body"} per line) or a text file',
+        )
+        parser.add_argument(
+            '--format', choices=[JSONL, TEXT],
+            help='jsonl: papers split into paragraphs; text: one statement per line (default: by extension)',
+        )
+        parser.add_argument('--checkpoint', type=Path, help='progress file (default: <input>.checkpoint.json)')
+        parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the top')
+        parser.add_argument('--workers', type=int, default=4, help='batch requests in flight at once')
+        parser.add_argument('--batch-size', type=int, default=32, help='statements per request')
+        parser.add_argument('--write-size', type=int, default=512, help='statements per database write')
+        parser.add_argument('--min-words', type=int, default=5, help='shorter paragraphs of papers are skipped')
+        parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress lines')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        format = options['format'] or (JSONL if path.suffix in ('.jsonl', '.json') else TEXT)
+        checkpoint_path = options['checkpoint'] or path.with_name(path.name + '.checkpoint.json')
+        if options['restart']:
+            checkpoint_path.unlink(missing_ok=True)
+        try:
+            checkpoint = Checkpoint.load(checkpoint_path, path)
+        except ValueError as exc:
+            raise CommandError(f'{exc}; pass --restart to start over')
+        if checkpoint.offset:
+            self.stdout.write(
+                f'Resuming {path} at byte {checkpoint.offset}, {checkpoint.statements} statements already stored'
+            )
+        run = CorpusRun(
+            path,
+            checkpoint,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            write_size=options['write_size'],
+            format=format,
+            min_words=options['min_words'],
+            report=self.stdout.write,
+            report_every=options['report_every'],
+        )
+        try:
+            async_to_sync(self.score)(run)
+        except (ModelServiceError, ValueError) as exc:
+            raise CommandError(f'{exc}; stored scores are checkpointed in {checkpoint_path}, run again to resume')
+        if run.skipped:
+            self.stderr.write(self.style.WARNING(
+                f'{run.skipped} records of {path} had no text of {options["min_words"]} words or more '
+                f'(the first at byte {run.first_skipped}) and were skipped'
+            ))
+        if not checkpoint.statements:
+            raise CommandError(
+                f'No statements found in {path}; JSONL records need a "text" or "body" field '
+                f'(or pass --format text for one statement per line)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {path}: {checkpoint.statements} statements stored, by model version {checkpoint.model_versions}'
+        ))
+
+    async def score(self, run):
+        try:
+            await run.run()
+        finally:
+            await model_client.aclose()
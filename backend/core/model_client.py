@@ -0,0 +1,160 @@
+"""
+Shared asynchronous client for the ai-model service.
+
+One pooled ``httpx.AsyncClient`` is kept per event loop (one per ASGI worker)
+so connections to the model service are reused with keep-alive instead of
+opened per request. Calls have timeouts, are limited to
+``AI_MODEL_MAX_CONCURRENCY`` in flight per worker, and are retried with
+exponential backoff on connection errors and 429/502/503/504 responses.
+
+Requests say which admission lane of the model service they belong in with
+``X-Priority``: single statements are interactive, batches are bulk. When the
+service turns a bulk request away, its retry waits at least as long as the
+``Retry-After`` the service asked for.
+"""
+import asyncio
+import json
+import random
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .timing import record_model_call
+
+RETRY_STATUSES = {429, 502, 503, 504}
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class ModelServiceError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        # Seconds the model service asked callers to wait before trying again
+        self.retry_after = retry_after
+
+
+def retry_after(response):
+    """The ``Retry-After`` of ``response`` in seconds, if it gave one as a number."""
+    try:
+        return max(0.0, float(response.headers['Retry-After']))
+    except (KeyError, ValueError):
+        return None
+
+
+class ModelClient:
+    def __init__(
+        self,
+        base_url,
+        timeout=30.0,
+        max_connections=20,
+        max_concurrency=20,
+        retries=2,
+        backoff=0.2,
+        transport=None,
+    ):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        # httpx clients and semaphores belong to the loop they were created on
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+            )
+            self._clients[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+        return self._clients[loop]
+
+    async def post(self, path, payload, priority=INTERACTIVE):
+        return (await self._request('POST', path, payload, priority)).json()
+
+    async def get(self, path, priority=INTERACTIVE):
+        return (await self._request('GET', path, None, priority)).json()
+
+    async def _request(self, method, path, payload, priority=INTERACTIVE):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self._send(method, path, payload, priority)
+            return response
+        finally:
+            # Includes waiting for a connection and any retries
+            record_model_call(time.perf_counter() - started, response)
+
+    async def _send(self, method, path, payload, priority):
+        client, semaphore = self._client()
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.request(method, path, json=payload, headers={'X-Priority': priority})
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return response
+                    error = ModelServiceError(
+                        f'{path} returned {response.status_code}', retry_after(response)
+                    )
+                except httpx.TransportError as exc:
+                    error = ModelServiceError(f'{path} failed: {exc!r}')
+                except httpx.HTTPStatusError as exc:
+                    raise ModelServiceError(f'{path} returned {exc.response.status_code}') from exc
+                if attempt < self.retries:
+                    # Exponential backoff with jitter so retries don't arrive in lockstep
+                    delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                    if priority == BULK and error.retry_after:
+                        # A user is waiting on an interactive request, nobody is on bulk ones
+                        delay = max(delay, error.retry_after)
+                    await asyncio.sleep(delay)
+            raise error
+
+    async def predict_confidence(self, text, priority=INTERACTIVE):
+        return await self.post('/predict_confidence', {'text': text}, priority)
+
+    async def model_version(self):
+        """The version of the model the service is scoring with right now."""
+        return (await self.get('/model_version'))['model_version']
+
+    async def predict_confidence_batch(self, texts):
+        """Scores for ``texts``, in order, from one call to the batch endpoint."""
+        response = await self._request('POST', '/predict_confidence/batch', {'texts': texts}, BULK)
+        try:
+            results = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+            results.sort(key=lambda result: result['index'])
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ModelServiceError(f'/predict_confidence/batch returned an unreadable line: {exc!r}') from exc
+        # A stream cut short after the 200 still parses; nothing may be
+        # matched with the wrong statement or silently left out
+        if [result['index'] for result in results] != list(range(len(texts))):
+            raise ModelServiceError(
+                f'/predict_confidence/batch returned {len(results)} results for {len(texts)} statements'
+            )
+        if not all('confidence' in result and 'model_version' in result for result in results):
+            raise ModelServiceError('/predict_confidence/batch returned results without a score')
+        return results
+
+    async def aclose(self):
+        for client, _ in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+model_client = ModelClient(
+    settings.AI_MODEL_URL,
+    timeout=settings.AI_MODEL_TIMEOUT,
+    max_connections=settings.AI_MODEL_MAX_CONNECTIONS,
+    max_concurrency=settings.AI_MODEL_MAX_CONCURRENCY,
+    retries=settings.AI_MODEL_RETRIES,
+    backoff=settings.AI_MODEL_RETRY_BACKOFF,
+)
@@ -1,3 +1,85 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class ModelVersion(models.Model):
+    """A version of the confidence model, as reported by the ai-model service."""
+    name = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Paper(models.Model):
+    external_id = models.CharField(max_length=255, unique=True)
+    title = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title or self.external_id
+
+
+class Statement(models.Model):
+    text = models.TextField()
+    # sha256 of the normalised text, see core.cache.content_hash
+    content_hash = models.CharField(max_length=64, unique=True)
+    paper = models.ForeignKey(
+        Paper, null=True, blank=True, on_delete=models.SET_NULL, related_name='statements'
+    )
+    section = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.text[:80]
+
+
+class Score(models.Model):
+    statement = models.ForeignKey(Statement, on_delete=models.CASCADE, related_name='scores')
+    model_version = models.ForeignKey(ModelVersion, on_delete=models.PROTECT, related_name='scores')
+    confidence = models.FloatField()
+    sources = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['statement', 'model_version'], name='unique_score_per_model_version'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.confidence:.3f} ({self.model_version})'
+
+
+class ScoringJob(models.Model):
+    """A paper queued for scoring in the background, see core/jobs.py."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    paper = models.ForeignKey(Paper, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    text = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def progress(self):
+        return self.completed / self.total if self.total else 0.0
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
@@ -0,0 +1,68 @@
+"""
+Stored confidence scores.
+
+Every score the ai-model service returns is kept, keyed by the statement's
+content hash and the model version that produced it, so a statement is only
+ever scored once per model.
+"""
+from django.db import transaction
+
+from .cache import content_hash
+from .models import ModelVersion, Score, Statement
+
+
+def get_stored_confidence(statement, model_version):
+    """
+    The stored confidence for ``statement`` from ``model_version`` (the one the
+    service is serving, see ``served_model_version``), or None.
+
+    One query: the unique content hash index finds the statement, the unique
+    version name finds the version and the (statement, model_version) unique
+    index finds its score.
+    """
+    if model_version is None:
+        return None
+    return (
+        Score.objects
+        .filter(statement__content_hash=content_hash(statement), model_version__name=model_version)
+        .values_list('confidence', flat=True)
+        .first()
+    )
+
+
+@transaction.atomic
+def store_scores(results, model_version, paper=None, section=''):
+    """
+    Bulk insert scores for many statements.
+
+    ``results`` is an iterable of ``(statement, confidence, sources)``. Known
+    statements are reused, and a statement scored again by the same model
+    version has its score updated.
+    """
+    version, _ = ModelVersion.objects.get_or_create(name=model_version)
+    results = {content_hash(text): (text, confidence, sources) for text, confidence, sources in results}
+    Statement.objects.bulk_create(
+        [
+            Statement(text=text, content_hash=digest, paper=paper, section=section)
+            for digest, (text, _, _) in results.items()
+        ],
+        ignore_conflicts=True,
+    )
+    statement_ids = dict(
+        Statement.objects.filter(content_hash__in=results).values_list('content_hash', 'pk')
+    )
+    Score.objects.bulk_create(
+        [
+            Score(
+                statement_id=statement_ids[digest],
+                model_version=version,
+                confidence=confidence,
+                sources=sources,
+            )
+            for digest, (_, confidence, sources) in results.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['statement', 'model_version'],
+        update_fields=['confidence', 'sources'],
+    )
+    return len(results)
@@ -1,3 +1,412 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import cache_stats, get_cached_confidence, served_model_version, set_cached_confidence
+from .corpus import TEXT, Checkpoint, CorpusRun
+from .jobs import InProcessBroker, pending_jobs, process_job
+from .model_client import ModelClient, ModelServiceError
+from .models import Score, ScoringJob, Statement
+from .scores import get_stored_confidence, store_scores
+from .timing import timing_breakdown, upstream_duration
+
+
+def model_response(confidence=0.8, model_version='v1'):
+    return {'confidence': confidence, 'sources': [], 'model_version': model_version}
+
+
+class ConfidenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_normalised_statements_share_an_entry(self):
+        set_cached_confidence('Yoga cures   Back pain.', 0.4, 'v1')
+        self.assertEqual(get_cached_confidence('yoga cures back pain.', 'v1'), 0.4)
+
+    def test_new_model_version_invalidates_scores(self):
+        set_cached_confidence('yoga cures back pain', 0.4, 'v1')
+        set_cached_confidence('reiki heals', 0.2, 'v2')
+        self.assertIsNone(get_cached_confidence('yoga cures back pain', 'v2'))
+        self.assertEqual(get_cached_confidence('reiki heals', 'v2'), 0.2)
+        self.assertIsNone(get_cached_confidence('reiki heals', None))
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 2)
+
+
+class StoredScoreTests(TestCase):
+    def test_bulk_insert_and_update(self):
+        store_scores([('yoga cures back pain', 0.4, None), ('reiki heals', 0.2, None)], 'v1')
+        store_scores([('Yoga cures back  pain', 0.5, None)], 'v1')
+        self.assertEqual(Statement.objects.count(), 2)
+        self.assertEqual(Score.objects.count(), 2)
+        self.assertEqual(get_stored_confidence('yoga cures back pain', 'v1'), 0.5)
+
+    def test_lookup_is_a_single_query_against_the_served_model(self):
+        store_scores([('yoga cures back pain', 0.4, None)], 'v1')
+        store_scores([('reiki heals', 0.2, None)], 'v2')
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_stored_confidence('yoga cures back pain', 'v2'))
+        self.assertEqual(get_stored_confidence('reiki heals', 'v2'), 0.2)
+        # Rolled back to the older model
+        self.assertEqual(get_stored_confidence('yoga cures back pain', 'v1'), 0.4)
+        self.assertIsNone(get_stored_confidence('reiki heals', 'v1'))
+        self.assertIsNone(get_stored_confidence('reiki heals', None))
+
+
+class ServedModelVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_service_is_asked_once_per_ttl(self):
+        with mock.patch('core.cache.model_client.model_version', return_value='v2') as model_version:
+            self.assertEqual(async_to_sync(served_model_version)(), 'v2')
+            self.assertEqual(async_to_sync(served_model_version)(), 'v2')
+        model_version.assert_called_once()
+
+    def test_rollback_is_noticed_after_the_ttl(self):
+        with mock.patch('core.cache.model_client.model_version', side_effect=['v2', 'v1']):
+            self.assertEqual(async_to_sync(served_model_version)(), 'v2')
+            cache.delete('confidence:model_version_checked')
+            self.assertEqual(async_to_sync(served_model_version)(), 'v1')
+
+    def test_last_known_version_while_the_service_is_unreachable(self):
+        with mock.patch('core.cache.model_client.model_version', side_effect=['v1', ModelServiceError('down')]):
+            self.assertEqual(async_to_sync(served_model_version)(), 'v1')
+            cache.delete('confidence:model_version_checked')
+            self.assertEqual(async_to_sync(served_model_version)(), 'v1')
+
+
+def serving(model_version):
+    """Patch the model version the service reports to the views."""
+    return mock.patch('core.views.served_model_version', return_value=model_version)
+
+
+class CalculateConfidenceViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = serving('v1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('core.views.model_client.predict_confidence', return_value=model_response())
+    def test_repeated_statement_is_served_from_cache(self, post):
+        url = reverse('calculate-confidence')
+        for _ in range(2):
+            response = self.client.post(url, {'uploaded_statement': 'yoga cures back pain'})
+            self.assertEqual(response.json(), {'confidence': 0.8})
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch('core.views.model_client.predict_confidence', side_effect=[model_response(), model_response(0.1, 'v2')])
+    def test_reloaded_model_invalidates_cached_scores_without_a_miss(self, post):
+        url = reverse('calculate-confidence')
+        self.assertEqual(self.client.post(url, {'uploaded_statement': 'yoga cures back pain'}).json(), {'confidence': 0.8})
+        self.assertEqual(self.client.post(url, {'uploaded_statement': 'yoga cures back pain'}).json(), {'confidence': 0.8})
+        with serving('v2'):
+            response = self.client.post(url, {'uploaded_statement': 'yoga cures back pain'})
+        self.assertEqual(response.json(), {'confidence': 0.1})
+        self.assertEqual(post.call_count, 2)
+
+    @mock.patch('core.views.model_client.predict_confidence')
+    def test_stored_score_is_returned_without_calling_the_model(self, post):
+        store_scores([('yoga cures back pain', 0.3, None)], 'v1')
+        response = self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'yoga cures back pain'})
+        self.assertEqual(response.json(), {'confidence': 0.3})
+        post.assert_not_called()
+
+    @mock.patch('core.views.model_client.predict_confidence', return_value=model_response(0.7, 'v1'))
+    def test_new_scores_are_stored(self, post):
+        self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'reiki heals'})
+        self.assertEqual(get_stored_confidence('reiki heals', 'v1'), 0.7)
+
+    @mock.patch('core.views.model_client.predict_confidence', return_value=model_response(0.6, 'v2'))
+    def test_stored_scores_of_other_versions_are_not_used(self, post):
+        store_scores([('yoga cures back pain', 0.3, None)], 'v1')
+        store_scores([('yoga cures back pain', 0.9, None)], 'v3')
+        with serving('v2'):
+            response = self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'yoga cures back pain'})
+        self.assertEqual(response.json(), {'confidence': 0.6})
+        post.assert_called_once()
+
+    def test_missing_statement(self):
+        response = self.client.post(reverse('calculate-confidence'))
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('core.views.model_client.predict_confidence', side_effect=ModelServiceError('down'))
+    def test_model_service_unavailable(self, post):
+        response = self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'reiki heals'})
+        self.assertEqual(response.status_code, 503)
+
+    @mock.patch(
+        'core.views.model_client.predict_confidence',
+        side_effect=ModelServiceError('/predict_confidence returned 429', retry_after=2),
+    )
+    def test_model_service_overloaded_passes_on_retry_after(self, post):
+        response = self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'reiki heals'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+class RequestTimingTests(TestCase):
+    def test_model_service_time_is_split_from_the_hop(self):
+        timings = timing_breakdown(0.1, [(0.04, 0.03)])
+        self.assertAlmostEqual(timings['model-app'], 0.03)
+        self.assertAlmostEqual(timings['model-hop'], 0.01)
+
+    def test_upstream_duration_is_read_from_server_timing(self):
+        response = httpx.Response(200, headers={'Server-Timing': 'db;dur=1, app;dur=12.5'})
+        self.assertEqual(upstream_duration(response), 0.0125)
+        self.assertIsNone(upstream_duration(httpx.Response(200)))
+
+    def test_model_calls_are_reported_in_server_timing(self):
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, json=model_response(), headers={'Server-Timing': 'app;dur=5'})
+        )
+        client = ModelClient('http://ai-model', transport=transport)
+        cache.clear()
+        with mock.patch('core.views.model_client', client), serving('v1'), self.assertLogs('core.timing'):
+            response = self.client.post(reverse('calculate-confidence'), {'uploaded_statement': 'reiki heals'})
+        names = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['total', 'model', 'model-app', 'model-hop'])
+
+
+class ModelClientTests(SimpleTestCase):
+    def client_for(self, statuses):
+        responses = iter(statuses)
+
+        def handler(request):
+            status = next(responses)
+            return httpx.Response(status, json=model_response() if status == 200 else {})
+
+        return ModelClient('http://ai-model', retries=2, backoff=0, transport=httpx.MockTransport(handler))
+
+    def test_batch_results_are_returned_in_order(self):
+        lines = '{"index": 1, "confidence": 0.2, "model_version": "v1"}\n{"index": 0, "confidence": 0.9, "model_version": "v1"}\n'
+        client = ModelClient('http://ai-model', transport=httpx.MockTransport(lambda request: httpx.Response(200, text=lines)))
+        results = async_to_sync(client.predict_confidence_batch)(['a', 'b'])
+        self.assertEqual([result['confidence'] for result in results], [0.9, 0.2])
+
+    def test_short_or_mismatched_batch_responses_are_errors(self):
+        def line(index):
+            return json.dumps({'index': index, 'confidence': 0.5, 'model_version': 'v1'}) + '\n'
+
+        # Cut short, a repeated index, one too many, a truncated line
+        for lines in [line(0), line(0) + line(0), line(0) + line(1) + line(2), line(0) + line(1)[:20]]:
+            with self.subTest(lines=lines):
+                transport = httpx.MockTransport(lambda request: httpx.Response(200, text=lines))
+                client = ModelClient('http://ai-model', transport=transport)
+                with self.assertRaises(ModelServiceError):
+                    async_to_sync(client.predict_confidence_batch)(['a', 'b'])
+
+    def test_retries_transient_errors(self):
+        client = self.client_for([503, 502, 200])
+        self.assertEqual(async_to_sync(client.predict_confidence)('reiki heals'), model_response())
+
+    def test_gives_up_after_retries(self):
+        client = self.client_for([503, 503, 503])
+        with self.assertRaises(ModelServiceError):
+            async_to_sync(client.predict_confidence)('reiki heals')
+
+    def test_requests_carry_their_priority(self):
+        priorities = []
+
+        def handler(request):
+            priorities.append(request.headers['X-Priority'])
+            if request.url.path.endswith('/batch'):
+                return httpx.Response(200, text='{"index": 0, "confidence": 0.5, "model_version": "v1"}\n')
+            return httpx.Response(200, json=model_response())
+
+        client = ModelClient('http://ai-model', transport=httpx.MockTransport(handler))
+        async_to_sync(client.predict_confidence)('reiki heals')
+        async_to_sync(client.predict_confidence_batch)(['reiki heals'])
+        self.assertEqual(priorities, ['interactive', 'bulk'])
+
+    @mock.patch('core.model_client.asyncio.sleep')
+    def test_bulk_retries_wait_for_retry_after(self, sleep):
+        responses = iter([
+            httpx.Response(429, headers={'Retry-After': '3'}),
+            httpx.Response(200, text='{"index": 0, "confidence": 0.5, "model_version": "v1"}\n'),
+        ])
+        client = ModelClient('http://ai-model', backoff=0, transport=httpx.MockTransport(lambda request: next(responses)))
+        async_to_sync(client.predict_confidence_batch)(['reiki heals'])
+        sleep.assert_called_once_with(3.0)
+
+    def test_client_errors_are_not_retried(self):
+        client = self.client_for([422, 200])
+        with self.assertRaises(ModelServiceError):
+            async_to_sync(client.predict_confidence)('reiki heals')
+
+
+PAPER = """Introduction
+Acupuncture relieves chronic lower back pain in adults.
+Patients reported less pain after six weekly sessions.
+Results
+The effect did not differ from sham needling in the trial.
+"""
+
+
+class FakeBatchClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def predict_confidence_batch(self, texts):
+        if self.fail:
+            raise ModelServiceError('/predict_confidence/batch returned 503')
+        self.batches.append(texts)
+        return [{'index': i, 'confidence': 0.5, 'model_version': 'v1'} for i in range(len(texts))]
+
+
+class ScoringJobTests(TestCase):
+    def test_paragraphs_are_scored_in_batches(self):
+        job = ScoringJob.objects.create(text=PAPER)
+        client = FakeBatchClient()
+        job = async_to_sync(process_job)(job.pk, client=client, batch_size=2)
+        self.assertEqual([len(batch) for batch in client.batches], [2, 1])
+        self.assertEqual(job.status, ScoringJob.SUCCEEDED)
+        self.assertEqual((job.completed, job.total, job.progress), (3, 3, 1.0))
+        self.assertEqual(job.result['confidence'], 0.5)
+        self.assertEqual(Score.objects.count(), 3)
+
+    def test_model_service_failure_fails_the_job(self):
+        job = ScoringJob.objects.create(text=PAPER)
+        job = async_to_sync(process_job)(job.pk, client=FakeBatchClient(fail=True))
+        self.assertEqual(job.status, ScoringJob.FAILED)
+        self.assertIn('503', job.error)
+
+    def test_short_batch_response_fails_the_job(self):
+        job = ScoringJob.objects.create(text=PAPER)
+        line = '{"index": 0, "confidence": 0.5, "model_version": "v1"}\n'
+        client = ModelClient('http://ai-model', transport=httpx.MockTransport(lambda request: httpx.Response(200, text=line)))
+        job = async_to_sync(process_job)(job.pk, client=client, batch_size=2)
+        self.assertEqual(job.status, ScoringJob.FAILED)
+        self.assertIn('1 results for 2 statements', job.error)
+        self.assertEqual(Score.objects.count(), 0)
+
+
+class ScorePaperViewTests(TransactionTestCase):
+    def test_job_is_queued_and_can_be_polled(self):
+        client = FakeBatchClient()
+        broker = InProcessBroker(lambda job_id: process_job(job_id, client=client), workers=2)
+        with mock.patch('core.jobs.broker', broker):
+            response = self.client.post(reverse('score-paper'), {'paper_text': PAPER, 'paper_id': 'paper-1'})
+            self.assertEqual(response.status_code, 202)
+            broker.join(timeout=10)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], ScoringJob.SUCCEEDED)
+        self.assertEqual(status['progress'], 1.0)
+        self.assertEqual(Statement.objects.filter(paper__external_id='paper-1').count(), 3)
+
+    def test_missing_paper(self):
+        response = self.client.post(reverse('score-paper'), {})
+        self.assertEqual(response.status_code, 400)
+
+
+class BrokerRecoveryTests(TransactionTestCase):
+    def test_jobs_left_by_a_stopped_process_are_run(self):
+        queued = ScoringJob.objects.create(text=PAPER)
+        abandoned = ScoringJob.objects.create(text=PAPER, status=ScoringJob.RUNNING, total=3, completed=1)
+        ScoringJob.objects.filter(pk=abandoned.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        # Still making progress in another process
+        running = ScoringJob.objects.create(text=PAPER, status=ScoringJob.RUNNING)
+        client = FakeBatchClient()
+        broker = InProcessBroker(lambda job_id: process_job(job_id, client=client), pending=pending_jobs)
+        broker.start()
+        broker.enqueue(queued.pk)  # queued twice, still run once
+        broker.join(timeout=10)
+        for job in (queued, abandoned):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.completed), (ScoringJob.SUCCEEDED, 3))
+        self.assertEqual(len(client.batches), 2)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ScoringJob.RUNNING)
+
+
+class FlakyBatchClient(FakeBatchClient):
+    """Fails every request after the first ``succeed`` of them."""
+
+    def __init__(self, succeed):
+        super().__init__()
+        self.succeed = succeed
+
+    async def predict_confidence_batch(self, texts):
+        if len(self.batches) == self.succeed:
+            raise ModelServiceError('/predict_confidence/batch returned 503')
+        return await super().predict_confidence_batch(texts)
+
+
+class ScoreCorpusTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.corpus = Path(directory.name) / 'papers.jsonl'
+        papers = [
+            {'id': f'paper-{number}', 'title': f'Paper {number}', 'text': PAPER.replace('.', f' (cohort {number}).')}
+            for number in range(4)
+        ]
+        self.corpus.write_text('\n'.join(json.dumps(paper) for paper in papers) + '\n')
+        self.checkpoint = Path(directory.name) / 'papers.checkpoint.json'
+
+    def score(self, client, **options):
+        run = CorpusRun(self.corpus, Checkpoint.load(self.checkpoint, self.corpus), client=client, **options)
+        return async_to_sync(run.run)()
+
+    def test_corpus_is_scored_in_batches_and_checkpointed(self):
+        client = FakeBatchClient()
+        self.assertEqual(self.score(client, workers=2, batch_size=5, write_size=4), 12)
+        self.assertEqual(sorted(len(batch) for batch in client.batches), [2, 5, 5])
+        self.assertEqual(Score.objects.count(), 12)
+        self.assertEqual(Statement.objects.filter(paper__external_id='paper-3').count(), 3)
+        state = json.loads(self.checkpoint.read_text())
+        self.assertEqual(state['offset'], os.path.getsize(self.corpus))
+        self.assertEqual(state['model_versions'], {'v1': 12})
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        with self.assertRaises(ModelServiceError):
+            self.score(FlakyBatchClient(succeed=2), workers=1, batch_size=3, write_size=1)
+        offset = Checkpoint.load(self.checkpoint, self.corpus).offset
+        self.assertEqual(offset, len(self.corpus.read_text().splitlines(keepends=True)[0]) * 2)
+        client = FakeBatchClient()
+        self.assertEqual(self.score(client, workers=1, batch_size=3), 6)
+        self.assertEqual(Score.objects.count(), 12)
+
+    def test_text_corpus_has_one_statement_per_line(self):
+        self.corpus.write_text('Reiki heals\n\nYoga cures back pain\n')
+        self.assertEqual(self.score(FakeBatchClient(), format=TEXT), 2)
+        self.assertEqual(set(Statement.objects.values_list('text', flat=True)), {'Reiki heals', 'Yoga cures back pain'})
+
+    def test_request_id_and_body_records_are_read_like_ai_ingest(self):
+        self.corpus.write_text(json.dumps({'request_id': 'req-1', 'body': PAPER}) + '\n')
+        self.assertEqual(self.score(FakeBatchClient()), 3)
+        self.assertEqual(Statement.objects.filter(paper__external_id='req-1').count(), 3)
+
+    def test_command_fails_when_no_record_has_text(self):
+        self.corpus.write_text(json.dumps({'id': 'paper-1', 'abstract': PAPER}) + '\n')
+        output, errors = StringIO(), StringIO()
+        with mock.patch('core.corpus.model_client.predict_confidence_batch') as predict:
+            with self.assertRaisesMessage(CommandError, 'No statements found'):
+                call_command('score_corpus', str(self.corpus), checkpoint=self.checkpoint, stdout=output, stderr=errors)
+        predict.assert_not_called()
+        self.assertIn('1 records', errors.getvalue())
+
+    def test_command_reports_progress_and_resumes(self):
+        client = FakeBatchClient()
+        output = StringIO()
+        with mock.patch('core.corpus.model_client.predict_confidence_batch', client.predict_confidence_batch):
+            call_command('score_corpus', str(self.corpus), checkpoint=self.checkpoint, stdout=output)
+            call_command('score_corpus', str(self.corpus), checkpoint=self.checkpoint, stdout=output)
+        self.assertIn('12 statements stored', output.getvalue())
+        self.assertIn('Resuming', output.getvalue())
+        self.assertEqual(sum(len(batch) for batch in client.batches), 12)
@@ -0,0 +1,101 @@
+"""
+Request timing for the backend.
+
+``RequestTimingMiddleware`` times every request and, for requests that call the
+model service, how long was spent waiting on it. The model service reports its
+own processing time in a ``Server-Timing`` header, so what is left over is the
+hop between the two: network, nginx and waiting for a pooled connection. The
+breakdown is sent back as a ``Server-Timing`` header (shown in the browser's
+network panel) and logged to ``core.timing``.
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+logger = logging.getLogger(__name__)
+
+_model_calls = contextvars.ContextVar('model_calls', default=None)
+
+
+def record_model_call(elapsed, response=None):
+    """Note a model service call of ``elapsed`` seconds against the current request."""
+    calls = _model_calls.get()
+    if calls is not None:
+        calls.append((elapsed, upstream_duration(response)))
+
+
+def upstream_duration(response):
+    """Seconds the model service says it spent, from ``Server-Timing: app;dur=<ms>``."""
+    if response is None:
+        return None
+    for metric in response.headers.get('server-timing', '').split(','):
+        name, *params = [part.strip() for part in metric.split(';')]
+        if name == 'app':
+            for param in params:
+                if param.startswith('dur='):
+                    try:
+                        return float(param[4:]) / 1000
+                    except ValueError:
+                        return None
+    return None
+
+
+def timing_breakdown(total, calls):
+    """``{name: seconds}`` for the total, time in the model service and the hop to it."""
+    timings = {'total': total}
+    if calls:
+        timings['model'] = sum(elapsed for elapsed, _ in calls)
+        upstream = [duration for _, duration in calls if duration is not None]
+        if len(upstream) == len(calls):
+            timings['model-app'] = sum(upstream)
+            timings['model-hop'] = max(0.0, timings['model'] - timings['model-app'])
+    return timings
+
+
+class RequestTimingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        calls = []
+        token = _model_calls.set(calls)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _model_calls.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, calls)
+
+    async def __acall__(self, request):
+        calls = []
+        token = _model_calls.set(calls)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _model_calls.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, calls)
+
+    def finish(self, request, response, total, calls):
+        timings = timing_breakdown(total, calls)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()
+        )
+        if calls:
+            logger.info(
+                '%s %s %s: %s', request.method, request.path, response.status_code,
+                ' '.join(
+                    f'{name}={seconds * 1000:.1f}ms ({seconds / total:.0%})'
+                    for name, seconds in timings.items() if name != 'total'
+                ) + f' of {total * 1000:.1f}ms',
+            )
+        return response
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import CalculateConfidenceView, get_csrf_token
+from .views import CalculateConfidenceView, ScorePaperView, get_csrf_token, job_status
 
 urlpatterns = [
     path('calculate-confidence/', CalculateConfidenceView.as_view(), name='calculate-confidence'),
+    path('score-paper/', ScorePaperView.as_view(), name='score-paper'),
+    path('jobs/<uuid:job_id>/', job_status, name='job-status'),
     path('get-csrf-token/', get_csrf_token, name='get_csrf_token'),
 ]
\ No newline at end of file
@@ -1,9 +1,17 @@
-import requests
+from asgiref.sync import sync_to_async
 from django.views.generic import TemplateView, View
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.views.decorators.csrf import ensure_csrf_cookie  # Import csrf_exempt for bypassing CSRF for simplicity
 
+from .cache import get_cached_confidence, served_model_version, set_cached_confidence
+from .jobs import submit_job
+from .model_client import ModelServiceError, model_client
+from .models import Paper, ScoringJob
+from .scores import get_stored_confidence, store_scores
+
 @ensure_csrf_cookie
 def get_csrf_token(request):
     # This view does not need to do anything except set the CSRF cookie,
@@ -11,13 +19,63 @@ def get_csrf_token(request):
     return JsonResponse({'message': 'CSRF cookie set'})
 
 class CalculateConfidenceView(View):
-    def post(self, request, *args, **kwargs):
+    # Async so that waiting on the model service doesn't hold a worker
+    async def post(self, request, *args, **kwargs):
         uploaded_statement = request.POST.get("uploaded_statement")
-        uploaded_statement = """With chronic illness at its highest ever level, many people are turning to
-            treatments and activities such as reiki, healing touch, yoga and massage in
-            search of answers to long term medical issues and pain."""
         if uploaded_statement:
-            response = requests.post("http://ai-model:8000/predict_confidence", json={"text": uploaded_statement})
-            confidence = response.json().get("confidence", "An error occurred")
+            # Only scores of the model being served, which may be older than
+            # the newest one stored after a rollback
+            model_version = await served_model_version()
+            confidence = await sync_to_async(get_cached_confidence)(uploaded_statement, model_version)
+            if confidence is not None:
+                return JsonResponse({"confidence": confidence})
+            confidence = await sync_to_async(get_stored_confidence)(uploaded_statement, model_version)
+            if confidence is not None:
+                return JsonResponse({"confidence": confidence})
+            try:
+                result = await model_client.predict_confidence(uploaded_statement)
+            except ModelServiceError as exc:
+                response = JsonResponse({"error": "The model service is unavailable"}, status=503)
+                if exc.retry_after is not None:
+                    response["Retry-After"] = str(round(exc.retry_after))
+                return response
+            confidence = result.get("confidence", "An error occurred")
+            if "confidence" in result and "model_version" in result:
+                await sync_to_async(store_scores)(
+                    [(uploaded_statement, confidence, result.get("sources"))], result["model_version"]
+                )
+                await sync_to_async(set_cached_confidence)(
+                    uploaded_statement, confidence, result["model_version"]
+                )
             return JsonResponse({"confidence": confidence})
-        return JsonResponse({"error": "No statement uploaded"}, status=400)
\ No newline at end of file
+        return JsonResponse({"error": "No statement uploaded"}, status=400)
+
+class ScorePaperView(View):
+    # Long papers are scored in the background; poll the returned status_url
+    def post(self, request, *args, **kwargs):
+        text = request.POST.get("paper_text")
+        if not text:
+            return JsonResponse({"error": "No paper uploaded"}, status=400)
+        paper = None
+        if request.POST.get("paper_id"):
+            paper, _ = Paper.objects.get_or_create(
+                external_id=request.POST["paper_id"],
+                defaults={"title": request.POST.get("title", "")},
+            )
+        job = submit_job(text, paper=paper)
+        return JsonResponse(
+            {"job_id": str(job.pk), "status": job.status, "status_url": reverse("job-status", args=[job.pk])},
+            status=202,
+        )
+
+def job_status(request, job_id):
+    job = get_object_or_404(ScoringJob, pk=job_id)
+    return JsonResponse({
+        "job_id": str(job.pk),
+        "status": job.status,
+        "progress": job.progress,
+        "completed": job.completed,
+        "total": job.total,
+        "result": job.result,
+        "error": job.error,
+    })